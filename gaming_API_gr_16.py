@@ -1,5 +1,90 @@
 from gaming_tools import *
-from random import randint
+from gaming_output import ActionResult, Event, NullSink, ListSink, PrintSink, LoggingSink, JsonLinesSink, \
+    get_sink, set_sink, use_sink
+import contextlib, threading
+
+import gaming_output, gaming_rules
+
+
+_output = threading.local()
+
+
+@contextlib.contextmanager
+def _action(*action):
+    """
+    Run an action as one read-modify-write of the game
+
+    Parameters
+    ----------
+    action : name and arguments of the action, recorded in the game history
+
+    Return
+    ------
+    result : result of the action, filled in by the action (ActionResult)
+
+    Notes
+    -----
+    Events of the action are sent to the sink once the game is written
+    and unlocked, so that other players never wait for the output.  They
+    are never sent if the action, or a batch it runs in, is rolled back.
+    """
+    result = ActionResult(action[0])
+    events = getattr(_output, 'events', None)
+    if events is not None:
+        # Nested action: the outermost one sends the events, unless this one fails
+        mark = len(events)
+        try:
+            with batch(action):
+                yield result
+        except BaseException:
+            del events[mark:]
+            raise
+        return
+
+    _output.events = events = []
+    try:
+        with batch(action):
+            yield result
+    finally:
+        _output.events = None
+    # Only reached if the batch ended normally
+    for event in events:
+        after_batch(gaming_output.emit, event)
+
+
+def _say(result, code, message, *args):
+    """
+    Report something which happened during an action
+
+    Parameters
+    ----------
+    result : result of the action (ActionResult)
+    code : what happened (str)
+    message : the message to show, with % placeholders for args (str)
+    args : values of the message
+    """
+    event = Event(result.action, code, message, args)
+    result.events.append(event)
+    events = getattr(_output, 'events', None)
+    if events is None:
+        gaming_output.emit(event)
+    else:
+        events.append(event)
+
+
+def _fail(result, code, message, *args):
+    """
+    Report why an action could not be done
+
+    Parameters
+    ----------
+    result : result of the action (ActionResult)
+    code : why the action could not be done (str)
+    message : the message to show, with % placeholders for args (str)
+    args : values of the message
+    """
+    result.error = code
+    _say(result, code, message, *args)
 
 
 def kill_creature(killer, creature):
@@ -11,11 +96,27 @@ def kill_creature(killer, creature):
     killer : Name of the killer (str)
     creature : Name of the killed creature (str)
 
+    Return
+    ------
+    result : result of the action, with the reward of the team (ActionResult)
+
     """
-    set_nb_defeated(get_nb_defeated() + 1)
-    set_team_money(get_team_money() + (40 + 10 * get_nb_defeated()))
-    print("%s(%s) killed the creature %s" % (killer, get_character_variety(killer), creature))
-    remove_creature(creature)
+    with _action('kill_creature', killer, creature) as result:
+        character = get_character(killer)
+        # Killer does not exists
+        if character is None:
+            _fail(result, 'unknown_killer', 'This killer does not exists')
+        # Creature does not exists
+        elif not creature_exists(creature):
+            _fail(result, 'unknown_creature', 'This creature does not exist')
+        else:
+            set_nb_defeated(get_nb_defeated() + 1)
+            result.killed = True
+            result.reward = gaming_rules.kill_reward(get_nb_defeated())
+            set_team_money(get_team_money() + result.reward)
+            _say(result, 'creature_killed', "%s(%s) killed the creature %s", killer, character[0], creature)
+            remove_creature(creature)
+    return result
 
 
 def is_lucky(chance):
@@ -30,7 +131,23 @@ def is_lucky(chance):
     ------
     lucky : if you are lucky or not (bool)
     """
-    return randint(0, 100) <= chance
+    return get_rng().chance(chance)
+
+
+def _reaches(attacker_reach, target_reach):
+    """
+    Check if an attacker with some reach can attack a target with some reach
+
+    Parameters
+    ----------
+    attacker_reach : reach of the attacker (str)
+    target_reach : reach of the target (str)
+
+    Return
+    ------
+    result : if the attacker can attack the target (bool)
+    """
+    return attacker_reach == 'long' or attacker_reach == 'short' and target_reach == 'short'
 
 
 def can_attack(attacker_name, target_name):
@@ -41,14 +158,35 @@ def can_attack(attacker_name, target_name):
     :return: if attacker can attack target (bool)
     """
 
-    if character_exists(attacker_name) and creature_exists(target_name):
-        return get_character_reach(attacker_name) == 'long' \
-               or get_character_reach(attacker_name) == 'short' and get_creature_reach(target_name) == 'short'
-    elif creature_exists(attacker_name) and character_exists(target_name):
-        return get_creature_reach(attacker_name) == 'long' \
-               or get_creature_reach(attacker_name) == 'short' and get_character_reach(target_name) == 'short'
-    else:
-        return False
+    attacker, target = get_character(attacker_name), get_creature(target_name)
+    if attacker is not None and target is not None:
+        return _reaches(attacker[1], target[0])
+
+    attacker, target = get_creature(attacker_name), get_character(target_name)
+    if attacker is not None and target is not None:
+        return _reaches(attacker[0], target[1])
+
+    return False
+
+
+def _roll_character(variety):
+    """
+    Draw the reach, strength and life of a new character
+
+    Parameters
+    ----------
+    variety : Variety of the character (str)
+
+    Returns
+    -------
+    stats : reach (str), strength (int) and life (int) of the character (tuple)
+    """
+    rules = gaming_rules.RULES[variety]
+    rng = get_rng()
+    life = rng.randint(*rules.life)
+    strength = rng.randint(*rules.strength)
+
+    return rules.reach, strength, life
 
 
 def create_character(name, variety):
@@ -60,59 +198,148 @@ def create_character(name, variety):
     name : Name of the character (str)
     variety : Variety of the character (str)
 
-    """
-    if not character_exists(name):
-        if variety == 'dwarf' or variety == 'elf' or variety == 'healer' \
-                or variety == 'necromancer' or variety == 'wizard':
-            if variety == 'dwarf':
-                life = randint(10, 50)
-                strength = randint(10, 50)
-            elif variety == 'elf':
-                life = randint(15, 25)
-                strength = randint(15, 25)
-            else:
-                life = randint(5, 15)
-                strength = randint(5, 15)
+    Return
+    ------
+    result : result of the action, with the reach, strength and life of the character (ActionResult)
 
-            # Check if variety is elf or wizard -> long reach
-            if variety == 'elf' or variety == 'wizard':
-                reach = 'long'
-            # If not wizard and not elf -> can only be short reach
-            else:
-                reach = 'short'
+    """
+    with _action('create_character', name, variety) as result:
+        if character_exists(name):
+            _fail(result, 'name_taken', "A character with that name already exists")
+        elif variety not in gaming_rules.RULES:
+            _fail(result, 'unknown_variety', 'This variety does not exists')
+        # The storage of the game cannot hold it (see can_store_character)
+        elif not can_store_character(name, variety):
+            _fail(result, 'not_storable', 'This character can not be stored by the game')
+        else:
+            reach, strength, life = _roll_character(variety)
 
             # Add the new character to the db
             add_new_character(name, variety, reach, strength, life)
             # Add 50 money on each character creation
             set_team_money(get_team_money() + 50)
-            print("New %s created named %s with %d life and %d strength" % (variety, name, life, strength))
-        else:
-            print('This variety does not exists')
-    else:
-        print("A character with that name already exists")
+            result.__dict__.update(name=name, variety=variety, reach=reach, strength=strength, life=life, reward=50)
+            _say(result, 'character_created', "New %s created named %s with %d life and %d strength",
+                 variety, name, life, strength)
+    return result
 
 
-def create_creature():
+def create_characters(characters):
     """
-    Create a new creature with random name, reach, strength and life
+    Create many new characters at once
+
+    Parameters
+    ----------
+    characters : Name and variety of each character (list of tuples)
 
     Returns
     -------
-    creature : the creature name (str)
+    result : result of the action, with the name, variety, reach, strength and life of each
+             created character in created (ActionResult)
+
+    Notes
+    -----
+    All characters are checked before any is created: if a name is already
+    used (in the game or twice in the list), a variety does not exist or a
+    character cannot be stored by the game, nothing is created and the
+    error of the result tells why.  The team receives 50 money per character.
+    """
+    with _action('create_characters', len(characters)) as result:
+        result.created = []
+        names = set()
+        for name, variety in characters:
+            if character_exists(name) or name in names:
+                _fail(result, 'name_taken', "A character named %s already exists", name)
+            elif variety not in gaming_rules.RULES:
+                _fail(result, 'unknown_variety', 'The variety %s does not exists', variety)
+            elif not can_store_character(name, variety):
+                _fail(result, 'not_storable', 'The character %s can not be stored by the game', name)
+            names.add(name)
+
+        if result.ok:
+            for name, variety in characters:
+                reach, strength, life = _roll_character(variety)
+                add_new_character(name, variety, reach, strength, life)
+                result.created.append({'name': name, 'variety': variety, 'reach': reach, 'strength': strength,
+                                       'life': life})
+                _say(result, 'character_created', "New %s created named %s with %d life and %d strength",
+                     variety, name, life, strength)
+
+            # Add 50 money for each character, at once
+            result.reward = 50 * len(result.created)
+            set_team_money(get_team_money() + result.reward)
+    return result
+
+
+def _roll_creature(nb_defeated):
     """
-    name = get_random_creature_name()
-    random_reach = randint(0, 1)
-    strength = randint(1, 10) * (1 + get_nb_defeated())
-    life = randint(1, 10) * (1 + get_nb_defeated())
+    Draw the reach, strength and life of a new creature
+
+    Parameters
+    ----------
+    nb_defeated : Number of creatures defeated by the team (int)
+
+    Returns
+    -------
+    stats : reach (str), strength (int) and life (int) of the creature (tuple)
+    """
+    rng = get_rng()
+    random_reach = rng.randint(0, 1)
+    strength = rng.randint(1, 10) * (1 + nb_defeated)
+    life = rng.randint(1, 10) * (1 + nb_defeated)
 
     if random_reach == 0:
         reach = 'short'
     else:
         reach = 'long'
 
-    print("Added creature %s with %s reach, %d strength and %d life" % (name, reach, strength, life))
-    add_creature(name, reach, strength, life)
-    return name
+    return reach, strength, life
+
+
+def create_creature():
+    """
+    Create a new creature with random name, reach, strength and life
+
+    Returns
+    -------
+    result : result of the action, with the name, reach, strength and life of the creature (ActionResult)
+    """
+    with _action('create_creature') as result:
+        name = get_random_creature_name()
+        reach, strength, life = _roll_creature(get_nb_defeated())
+
+        add_creature(name, reach, strength, life)
+        result.__dict__.update(name=name, reach=reach, strength=strength, life=life)
+        _say(result, 'creature_created', "Added creature %s with %s reach, %d strength and %d life",
+             name, reach, strength, life)
+    return result
+
+
+def create_creatures(nb_creatures):
+    """
+    Create many new creatures at once, with random names, reach, strength and life
+
+    Parameters
+    ----------
+    nb_creatures : Number of creatures to create (int)
+
+    Returns
+    -------
+    result : result of the action, with the name, reach, strength and life of each
+             created creature in created (ActionResult)
+    """
+    with _action('create_creatures', nb_creatures) as result:
+        nb_defeated = get_nb_defeated()
+        result.created = []
+        for i in range(nb_creatures):
+            name = get_random_creature_name()
+            reach, strength, life = _roll_creature(nb_defeated)
+
+            add_creature(name, reach, strength, life)
+            result.created.append({'name': name, 'reach': reach, 'strength': strength, 'life': life})
+            _say(result, 'creature_created', "Added creature %s with %s reach, %d strength and %d life",
+                 name, reach, strength, life)
+    return result
 
 
 def attack(attacker_name, creature_name):
@@ -124,61 +351,164 @@ def attack(attacker_name, creature_name):
     attacker_name : Name of the attacker (str)
     creature_name : Name of the creature to attack (str)
 
-    """
-    # Player does not exists
-    if not character_exists(attacker_name):
-        print('This attacker does not exists')
-    # Creature does not exists
-    elif not creature_exists(creature_name):
-        print('This creature does not exist')
-    # Player is dead
-    elif get_character_life(attacker_name) <= 0:
-        print('You can not attack because you are dead')
-    # Creature is already dead
-    elif get_creature_life(creature_name) <= 0:
-        print('You can not attack this creature because she is dead')
-    # Player does not have enough range
-    elif not can_attack(attacker_name, creature_name):
-        print('You do not have enough reach to attack this creature')
-    # All conditions are true
-    else:
-        character_life = get_character_life(attacker_name)
-        character_strength = get_character_strength(attacker_name)
-        character_variety = get_character_variety(attacker_name)
-
-        creature_life = get_creature_life(creature_name)
-        creature_strength = get_creature_strength(creature_name)
+    Return
+    ------
+    result : result of the action, with the damage dealt and taken, the kill and
+             reward and the new life of the attacker (ActionResult)
 
-        # Player kills creature
-        if creature_life - character_strength <= 0:
-            kill_creature(attacker_name, creature_name)
+    """
+    with _action('attack', attacker_name, creature_name) as result:
+        # Each entity is looked up once
+        attacker = get_character(attacker_name)
+        creature = get_creature(creature_name)
+        # Player does not exists
+        if attacker is None:
+            _fail(result, 'unknown_attacker', 'This attacker does not exists')
+        # Creature does not exists
+        elif creature is None:
+            _fail(result, 'unknown_creature', 'This creature does not exist')
+        # Player is dead
+        elif attacker[3] <= 0:
+            _fail(result, 'attacker_dead', 'You can not attack because you are dead')
+        # Creature is already dead
+        elif creature[2] <= 0:
+            _fail(result, 'creature_dead', 'You can not attack this creature because she is dead')
+        # Player does not have enough range
+        elif not _reaches(attacker[1], creature[0]):
+            _fail(result, 'out_of_reach', 'You do not have enough reach to attack this creature')
+        # All conditions are true
         else:
-            '''
-                Creature still alive
-                Reduce creature life by attacker strength
-            '''
-            print("%s(%s) dealt %d damages to the creature and it has %d points of life left" %
-                  (attacker_name, character_variety, character_strength,
-                   (creature_life - character_strength)))
-            set_creature_life(creature_name, (creature_life - character_strength))
-            if character_life - creature_strength <= 0:
-                '''
-                    Attacker killed
-                    Set attacker life to 0 (can not attack anymore)
-                '''
-                set_character_life(attacker_name, 0)
-                print("%s(%s) has been killed by creature %s" %
-                      (attacker_name, character_variety, creature_name))
+            character_variety, character_reach, character_strength, character_life = attacker
+            creature_reach, creature_strength, creature_life = creature
+
+            result.life = character_life
+
+            # Player kills creature
+            if creature_life - character_strength <= 0:
+                result.damage = creature_life
+                result.killed = True
+                kill = kill_creature(attacker_name, creature_name)
+                result.reward = kill.reward
+                result.events.extend(kill.events)
             else:
                 '''
-                    Attacker still alive
-                    Reduce attacker life by creature strength
+                    Creature still alive
+                    Reduce creature life by attacker strength
                 '''
-                if can_attack(creature_name, attacker_name):
-                    print("%s(%s) lost %d points of life, he still has %d point of life" %
-                          (attacker_name, character_variety, creature_strength,
-                           (character_life - creature_strength)))
-                    set_character_life(attacker_name, (character_life - creature_strength))
+                result.damage = character_strength
+                _say(result, 'damage_dealt', "%s(%s) dealt %d damages to the creature and it has %d points of life left",
+                     attacker_name, character_variety, character_strength, (creature_life - character_strength))
+                set_creature_life(creature_name, (creature_life - character_strength))
+                if character_life - creature_strength <= 0:
+                    '''
+                        Attacker killed
+                        Set attacker life to 0 (can not attack anymore)
+                    '''
+                    set_character_life(attacker_name, 0)
+                    result.damage_taken = character_life
+                    result.died = True
+                    result.life = 0
+                    _say(result, 'attacker_killed', "%s(%s) has been killed by creature %s",
+                         attacker_name, character_variety, creature_name)
+                else:
+                    '''
+                        Attacker still alive
+                        Reduce attacker life by creature strength
+                    '''
+                    if _reaches(creature_reach, character_reach):
+                        _say(result, 'damage_taken', "%s(%s) lost %d points of life, he still has %d point of life",
+                             attacker_name, character_variety, creature_strength, (character_life - creature_strength))
+                        set_character_life(attacker_name, (character_life - creature_strength))
+                        result.damage_taken = creature_strength
+                        result.life = character_life - creature_strength
+    return result
+
+
+def _heal(result, launcher_name, launcher, target_name, target, cost):
+    """
+    Spell adding 10 points of life to a living character
+
+    Parameters
+    ----------
+    result : result of the spell (ActionResult)
+    launcher_name : Name of the character who launch the spell (str)
+    launcher : variety, reach, strength and life of the launcher (tuple)
+    target_name : Name of the character who receives the spell (str)
+    target : variety, reach, strength and life of the target (tuple)
+    cost : money paid by the team (int)
+    """
+    # The target of the spell is dead (can not heal a dead player)
+    if target[3] <= 0:
+        _fail(result, 'target_dead', 'You can not heal a dead character')
+    else:
+        set_character_life(target_name, target[3] + 10)
+        set_team_money(get_team_money() - cost)
+        result.cost = cost
+        result.life = target[3] + 10
+        _say(result, 'healed', "%s(%s) has added 10 points of life to %s(%s)",
+             launcher_name, launcher[0], target_name, target[0])
+
+
+def _halve(result, launcher_name, launcher, target_name, target, cost):
+    """
+    Spell dividing by 2 the life of a living creature
+
+    Parameters
+    ----------
+    result : result of the spell (ActionResult)
+    launcher_name : Name of the character who launch the spell (str)
+    launcher : variety, reach, strength and life of the launcher (tuple)
+    target_name : Name of the creature who receives the spell (str)
+    target : reach, strength and life of the target (tuple)
+    cost : money paid by the team (int)
+    """
+    # The target of the spell is dead (can not attack a dead creature)
+    if target[2] <= 0:
+        _fail(result, 'target_dead', 'That creature is not alive')
+    else:
+        life = target[2] // 2
+        result.damage = target[2] - life
+        set_creature_life(target_name, life)
+        set_team_money(get_team_money() - cost)
+        result.cost = cost
+        # Check if the spell kills the target creature
+        if life // 2 == 0:  # 1 // 2 == 0
+            result.killed = True
+            kill = kill_creature(launcher_name, target_name)
+            result.reward = kill.reward
+            result.events.extend(kill.events)
+        # The spell does not kill the target creature
+        else:
+            _say(result, 'creature_life', "%s creature still has %d points of life", target_name, life)
+
+
+def _resurrect(result, launcher_name, launcher, target_name, target, cost):
+    """
+    Spell bringing a dead character back to life with 10 points of life
+
+    Parameters
+    ----------
+    result : result of the spell (ActionResult)
+    launcher_name : Name of the character who launch the spell (str)
+    launcher : variety, reach, strength and life of the launcher (tuple)
+    target_name : Name of the character who receives the spell (str)
+    target : variety, reach, strength and life of the target (tuple)
+    cost : money paid by the team (int)
+    """
+    # The target of the spell is still alive (can resurrect a player still alive)
+    if target[3] > 0:
+        _fail(result, 'target_alive', '%s(%s) is still alive', target_name, target[0])
+    else:
+        set_character_life(target_name, 10)
+        set_team_money(get_team_money() - cost)
+        result.cost = cost
+        result.life = 10
+        _say(result, 'resurrected', "%s(%s) has resurrected the character %s(%s)",
+             launcher_name, launcher[0], target_name, target[0])
+
+
+# Effect of each spell of gaming_rules.SPELLS
+_SPELLS = {'heal': _heal, 'halve': _halve, 'resurrect': _resurrect}
 
 
 def launch_spell(launcher_name, target_name):
@@ -190,84 +520,38 @@ def launch_spell(launcher_name, target_name):
     launcher_name : Name of the character who launch the spell (str)
     target_name : Name of the creature/player who receives the spell (str)
 
+    Return
+    ------
+    result : result of the action, with its cost and the new life of the target (ActionResult)
+
     """
-    # The launcher of the spell does not exists
-    if not character_exists(launcher_name):
-        print('This character does not exists')
-    # The launcher of the spell is dead
-    elif get_character_life(launcher_name) <= 0:
-        print('This character is dead and can not launch a spell')
-    # The launcher of the spell is a HEALER
-    elif get_character_variety(launcher_name) == 'healer':
-        # The team does not have enough money to launch the spell
-        if get_team_money() < 5:
-            print('Your team does not have enough money')
-        # The target of the spell does not exists or is not a player
-        elif not character_exists(target_name):
-            print('This character does not exists')
-        # The target of the spell is dead (can not heal a dead player)
-        elif get_character_life(target_name) <= 0:
-            print('You can not heal a dead character')
-        else:
-            """
-                Character still alive
-                Add 10 points of life to the target
-                Remove 5 money from team
-            """
-            set_character_life(target_name, get_character_life(target_name) + 10)
-            set_team_money(get_team_money() - 5)
-            print("%s(healer) has added 10 points of life to %s(%s)" %
-                  (launcher_name, target_name, get_character_variety(target_name)))
-    # The launcher of the spell is a WIZARD
-    elif get_character_variety(launcher_name) == ' wizard':
-        # The team does not have enough money to launch the spell
-        if get_team_money() < 20:
-            print('Your team does not have enough money')
-        # The target of the spell does not exists or is not a creature
-        elif not creature_exists(target_name):
-            print('This creature does not exists')
-        # The target of the spell is dead (can not attack a dead creature)
-        elif get_creature_life(target_name) <= 0:
-            print('That creature is not alive')
+    with _action('launch_spell', launcher_name, target_name) as result:
+        launcher = get_character(launcher_name)
+        # The launcher of the spell does not exists
+        if launcher is None:
+            _fail(result, 'unknown_launcher', 'This character does not exists')
+        # The launcher of the spell is dead
+        elif launcher[3] <= 0:
+            _fail(result, 'launcher_dead', 'This character is dead and can not launch a spell')
         else:
-            """
-                Creature still alive
-                Reduce by 2 creature's life
-                Remove 20 money from team
-            """
-            set_creature_life(target_name, get_creature_life(target_name) // 2)
-            set_team_money(get_team_money() - 20)
-            # Check if the spell kills the target creature
-            if get_creature_life(target_name) // 2 == 0:  # 1 // 2 == 0
-                kill_creature(launcher_name, target_name)
-            # The spell does not kill the target creature
+            rules = gaming_rules.get_variety(launcher[0])
+            # The variety of the launcher has no spell
+            if rules is None or rules.spell is None:
+                _fail(result, 'no_spell', "Your variety does not have any spell")
+            # The team does not have enough money to launch the spell
+            elif get_team_money() < rules.cost:
+                _fail(result, 'not_enough_money', 'Your team does not have enough money')
             else:
-                print("%s creature still has %d points of life" %
-                      (target_name, get_creature_life(target_name)))
-    # The launcher of the spell is a NECROMANCER
-    elif get_character_variety(launcher_name) == 'necromancer':
-        # The team does not have enough money to launch the spell
-        if get_team_money() < 75:
-            print('Your team does not have enough money')
-        # The target of the spell does not exists
-        elif not character_exists(target_name):
-            print('This character does not exists')
-        # The target of the spell is still alive (can resurrect a player still alive)
-        elif get_character_life(target_name) > 0:
-            print('%s(%s) is still alive' % (target_name, get_character_variety(target_name)))
-        else:
-            """
-                Character dead
-                Set target life to 10
-                Remove 75 money from team
-            """
-            set_character_life(target_name, 10)
-            set_team_money(get_team_money() - 75)
-            print("%s(necromancer) has resurrected the character %s(%s)" %
-                  (launcher_name, target_name, get_character_variety(target_name)))
-    # Variety =/= from healer, wizard & necromancer
-    else:
-        print("Your variety does not have any spell")
+                if rules.target == 'character':
+                    target = get_character(target_name)
+                else:
+                    target = get_creature(target_name)
+                # The target of the spell does not exists or is not of the right kind
+                if target is None:
+                    _fail(result, 'unknown_target', 'This %s does not exists', rules.target)
+                else:
+                    _SPELLS[rules.spell](result, launcher_name, launcher, target_name, target, rules.cost)
+    return result
 
 
 def evolute(name):
@@ -278,37 +562,88 @@ def evolute(name):
     ----------
     name : Name of the player who wants to evolute (str)
 
+    Return
+    ------
+    result : result of the action, with the new life and strength of the player (ActionResult)
+
     """
-    # Character does not exists or is not a player
-    if not character_exists(name):
-        print('This character does not exists')
-    # Character is dead (can not evolute if he is dead)
-    elif get_character_life(name) <= 0:
-        print('You can not evolute if you are dead')
-    # Team does not have enough money for evolution (< 4)
-    elif get_team_money() < 4:
-        print('Your team does not have enough money for evolution')
-    else:
-        """
-            Evolution of the strength : 25% of luck
-            Evolution of the life : 50% of luck
-        """
-        print("Evolution of %s" % name)
-        set_team_money(get_team_money() - 4)
-
-        if is_lucky(25):
-            new_character_strength = get_character_strength(name) + 4
-            print("%s character has now %d points of strength (+4)" % (name, new_character_strength))
-            set_character_strength(name, new_character_strength)
+    with _action('evolute', name) as result:
+        character = get_character(name)
+        # Character does not exists or is not a player
+        if character is None:
+            _fail(result, 'unknown_character', 'This character does not exists')
+        # Character is dead (can not evolute if he is dead)
+        elif character[3] <= 0:
+            _fail(result, 'character_dead', 'You can not evolute if you are dead')
+        # Team does not have enough money for evolution (< 4)
+        elif get_team_money() < 4:
+            _fail(result, 'not_enough_money', 'Your team does not have enough money for evolution')
         else:
-            print('Your strength has not evolved')
+            """
+                Evolution of the strength : 25% of luck
+                Evolution of the life : 50% of luck
+            """
+            strength, life = character[2:]
+            _say(result, 'evolution', "Evolution of %s", name)
+            set_team_money(get_team_money() - 4)
+            result.cost = 4
+
+            if is_lucky(25):
+                strength += 4
+                _say(result, 'strength_evolved', "%s character has now %d points of strength (+4)", name, strength)
+                set_character_strength(name, strength)
+            else:
+                _say(result, 'strength_not_evolved', 'Your strength has not evolved')
+
+            if is_lucky(50):
+                life += 2
+                _say(result, 'life_evolved', "%s character has now %d points of life (+2)", name, life)
+                set_character_life(name, life)
+            else:
+                _say(result, 'life_not_evolved', 'Your life has not evolved')
+
+            result.strength = strength
+            result.life = life
+    return result
 
-        if is_lucky(50):
-            new_character_life = get_character_life(name) + 2
-            print("%s character has now %d points of life (+2)" % (name, new_character_life))
-            set_character_life(name, new_character_life)
-        else:
-            print('Your life has not evolved')
+
+# Number of arguments of the actions execute_actions can run
+_COMMANDS = {'attack': 2, 'launch_spell': 2, 'evolute': 1}
+
+
+def execute_actions(actions):
+    """
+    Run many attack, launch_spell and evolute commands in order, writing the game once
+
+    Parameters
+    ----------
+    actions : commands to run, each made of the name of the action followed by its arguments,
+              e.g. ('attack', 'Bob', creature_name) (list of tuples)
+
+    Return
+    ------
+    results : result of each command, in order (list of ActionResult)
+
+    Raises
+    ------
+    ValueError : if a command is not a valid attack, launch_spell or evolute (then no command is run)
+
+    Notes
+    -----
+    The commands are one read-modify-write of the game: it is loaded and
+    locked once, each command sees what the previous ones did, and the
+    game is written once at the end.  A failing command (e.g. an attacker
+    out of reach) does not stop the next ones.
+    """
+    commands = [tuple(action) for action in actions]
+    for command in commands:
+        if not command or _COMMANDS.get(command[0]) != len(command) - 1:
+            raise ValueError('command %r is not valid' % (command,))
+
+    with _action('execute_actions', len(commands)):
+        # Looked up by name, so that replaced functions (e.g. profiled ones) are used
+        functions = globals()
+        return [functions[command[0]](*command[1:]) for command in commands]
 
 
 def character_info(character_name):
@@ -319,16 +654,33 @@ def character_info(character_name):
     ----------
     character_name : Name of the character (str)
 
+    Return
+    ------
+    result : result of the action, with the variety, life and strength of the character (ActionResult)
+
     """
+    result = ActionResult('character_info')
     if character_exists(character_name):
-        print(character_name)
-        print('\tVariety : %s' % get_character_variety(character_name))
-        print('\tLife : %d' % get_character_life(character_name))
-        print('\tStrength : %d' % get_character_strength(character_name))
+        result.variety = get_character_variety(character_name)
+        result.life = get_character_life(character_name)
+        result.strength = get_character_strength(character_name)
+        _say(result, 'character_name', character_name)
+        _say(result, 'character_variety', '\tVariety : %s', result.variety)
+        _say(result, 'character_life', '\tLife : %d', result.life)
+        _say(result, 'character_strength', '\tStrength : %d', result.strength)
     else:
-        print('This character does not exists')
+        _fail(result, 'unknown_character', 'This character does not exists')
+    return result
 
 
 def money():
-    """Show the money of the team"""
-    print('Money of the team : %d' % get_team_money())
+    """
+    Show the money of the team
+
+    Return
+    ------
+    result : result of the action, with the money of the team (ActionResult)
+    """
+    result = ActionResult('money', money=get_team_money())
+    _say(result, 'money', 'Money of the team : %d', result.money)
+    return result
@@ -0,0 +1,129 @@
+"""This module runs one action of the gaming API from the command line, for
+scripts and short-lived processes:
+
+    python -m gaming_api attack Bob Python#123
+    python -m gaming_api money
+    python -m gaming_api --json character_info Bob
+
+The game of the current directory is used, stored as chosen by the
+GAMING_STORAGE environment variable.  The API is only imported once the
+command is known to be valid, and the team counters are read without
+loading the characters and creatures, so that a process spends its time
+on the action rather than on starting up."""
+
+
+import sys
+
+
+# Command -> type of each argument of the API function
+COMMANDS = {'create_character': (str, str),
+            'create_creature': (),
+            'attack': (str, str),
+            'launch_spell': (str, str),
+            'evolute': (str,),
+            'kill_creature': (str, str),
+            'character_info': (str,),
+            'money': ()}
+
+USAGE = '''usage: python -m gaming_api [--json] command [arguments...]
+
+commands:
+  create_character name variety
+  create_creature
+  attack attacker creature
+  launch_spell launcher target
+  evolute name
+  kill_creature killer creature
+  character_info name
+  money
+
+options:
+  --json  print the result of the action as JSON instead of its messages
+'''
+
+
+def parse_command(argv):
+    """Parses the command line.
+
+    Parameters
+    ----------
+    argv: command line arguments (list)
+
+    Returns
+    -------
+    command: name of the API function, its arguments and True to print JSON (tuple)
+
+    Raises
+    ------
+    ValueError: if the command or its arguments are not valid
+
+    """
+
+    argv = list(argv)
+    as_json = '--json' in argv
+    if as_json:
+        argv.remove('--json')
+
+    if not argv or argv[0] not in COMMANDS:
+        raise ValueError('unknown command %s' % (argv[0] if argv else 'none'))
+
+    name, values = argv[0], argv[1:]
+    types = COMMANDS[name]
+    if len(values) != len(types):
+        raise ValueError('%s takes %d arguments (%d given)' % (name, len(types), len(values)))
+
+    try:
+        arguments = tuple([convert(value) for convert, value in zip(types, values)])
+    except ValueError:
+        raise ValueError('arguments %s of %s are not valid' % (' '.join(values), name))
+
+    return name, arguments, as_json
+
+
+def main(argv=None):
+    """Runs an action from the command line.
+
+    Parameters
+    ----------
+    argv: command line arguments, sys.argv[1:] if None (list)
+
+    Returns
+    -------
+    status: 0 if the action succeeded, 1 if it failed, 2 if the command is not valid (int)
+
+    """
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if '-h' in argv or '--help' in argv:
+        sys.stdout.write(USAGE)
+        return 0
+
+    try:
+        name, arguments, as_json = parse_command(argv)
+    except ValueError as error:
+        sys.stderr.write('%s%s\n' % (USAGE, error))
+        return 2
+
+    # Imported only now, so that invalid commands and --help stay instant
+    import gaming_API_gr_16
+
+    if as_json:
+        import json
+
+        with gaming_API_gr_16.use_sink(gaming_API_gr_16.NullSink()):
+            result = getattr(gaming_API_gr_16, name)(*arguments)
+        json.dump(result.to_dict(), sys.stdout, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        result = getattr(gaming_API_gr_16, name)(*arguments)
+
+    if not result.ok:
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
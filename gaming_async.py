@@ -0,0 +1,285 @@
+"""This module serves the gaming API to asyncio programs, such as async
+web front ends handling many players at once:
+
+    game = AsyncGame()
+    result = await game.attack('Bob', creature_name)
+
+or, with the default game, 'await attack(...)'.  Actions of a game run one
+at a time in the event loop, on a game kept in memory; writing it to disk
+is done in a background thread, once for all the actions which arrived in
+the meantime, so that the event loop never waits for the disk and many
+players cost a few writes instead of one per action."""
+
+
+import asyncio, concurrent.futures, functools
+
+import gaming_API_gr_16, gaming_storage, gaming_tools
+
+
+class AsyncGame(object):
+    """Game whose API actions are coroutines.
+
+    The game is only written by this object: modifications are kept in
+    memory and written after each group of actions, so other processes
+    must not modify the same game meanwhile.  The game is loaded and
+    written in a background thread, never in the event loop.
+
+    """
+
+    def __init__(self, backend=None, max_delay=0.0):
+        """Creates an asynchronous game.
+
+        Parameters
+        ----------
+        backend: storage of the game, chosen by gaming_storage.open_backend() if None (StorageBackend)
+        max_delay: time to wait for more actions before writing the game, in seconds (float)
+
+        """
+
+        self.session = gaming_tools.GameSession(backend if backend is not None else gaming_storage.open_backend())
+        # Actions never write the game: _flush does, in the executor
+        self.session.set_write_behind(manual=True)
+        self.max_delay = max_delay
+        self.nb_writes = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._lock = None
+        self._flush_task = None
+
+    def _get_lock(self):
+        """Returns the lock serializing actions and writes (asyncio.Lock)."""
+
+        # Created in the event loop which uses it
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        return self._lock
+
+    async def run(self, function, *args):
+        """Runs a function of gaming_API_gr_16 or gaming_tools on the game.
+
+        Parameters
+        ----------
+        function: function to run (function)
+        args: arguments of the function
+
+        Returns
+        -------
+        result: what the function returns
+
+        Notes
+        -----
+        Functions run one at a time and never while the game is written.
+
+        """
+
+        async with self._get_lock():
+            await self._load()
+            with gaming_tools.use_session(self.session):
+                result = function(*args)
+
+        if self.session.dirty and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+        return result
+
+    async def load(self):
+        """Loads the game, if it is not in memory yet.
+
+        Notes
+        -----
+        The first action loads the game otherwise: call it beforehand so
+        that the first players do not wait for it.
+
+        """
+
+        async with self._get_lock():
+            await self._load()
+
+    async def _load(self):
+        """Loads the game in the executor if it is not in memory, the lock being held."""
+
+        if self.session.game_db is None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(self._executor, self.session.get_db)
+
+    async def _flush(self):
+        """Writes the game until no modification is pending."""
+
+        loop = asyncio.get_event_loop()
+        while self.session.dirty:
+            if self.max_delay:
+                await asyncio.sleep(self.max_delay)
+            async with self._get_lock():
+                await loop.run_in_executor(self._executor, self.session.commit)
+                self.nb_writes += 1
+
+    async def flush(self):
+        """Writes pending modifications of the game and waits until they are written."""
+
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._flush()
+
+    async def close(self):
+        """Writes the game and releases its resources."""
+
+        await self.flush()
+        self._executor.shutdown()
+        self.session.backend.close()
+
+    # === API actions ===
+    async def create_character(self, name, variety):
+        """Coroutine of gaming_API_gr_16.create_character."""
+
+        return await self.run(gaming_API_gr_16.create_character, name, variety)
+
+    async def create_characters(self, characters):
+        """Coroutine of gaming_API_gr_16.create_characters."""
+
+        return await self.run(gaming_API_gr_16.create_characters, characters)
+
+    async def create_creature(self):
+        """Coroutine of gaming_API_gr_16.create_creature."""
+
+        return await self.run(gaming_API_gr_16.create_creature)
+
+    async def create_creatures(self, nb_creatures):
+        """Coroutine of gaming_API_gr_16.create_creatures."""
+
+        return await self.run(gaming_API_gr_16.create_creatures, nb_creatures)
+
+    async def attack(self, attacker_name, creature_name):
+        """Coroutine of gaming_API_gr_16.attack."""
+
+        return await self.run(gaming_API_gr_16.attack, attacker_name, creature_name)
+
+    async def launch_spell(self, launcher_name, target_name):
+        """Coroutine of gaming_API_gr_16.launch_spell."""
+
+        return await self.run(gaming_API_gr_16.launch_spell, launcher_name, target_name)
+
+    async def evolute(self, name):
+        """Coroutine of gaming_API_gr_16.evolute."""
+
+        return await self.run(gaming_API_gr_16.evolute, name)
+
+    async def kill_creature(self, killer, creature):
+        """Coroutine of gaming_API_gr_16.kill_creature."""
+
+        return await self.run(gaming_API_gr_16.kill_creature, killer, creature)
+
+    async def execute_actions(self, actions):
+        """Coroutine of gaming_API_gr_16.execute_actions."""
+
+        return await self.run(gaming_API_gr_16.execute_actions, actions)
+
+    async def character_info(self, character_name):
+        """Coroutine of gaming_API_gr_16.character_info."""
+
+        return await self.run(gaming_API_gr_16.character_info, character_name)
+
+    async def money(self):
+        """Coroutine of gaming_API_gr_16.money."""
+
+        return await self.run(gaming_API_gr_16.money)
+
+    # === change feed ===
+    def watch(self, version=None):
+        """Returns an async iterator over the modifications of the game (see watch)."""
+
+        return watch(version, self.session.feed)
+
+
+_game = None
+
+
+def get_game():
+    """Returns the game used by the module-level coroutines.
+
+    Returns
+    -------
+    game: default asynchronous game, created at first use (AsyncGame)
+
+    """
+
+    global _game
+
+    if _game is None:
+        _game = AsyncGame()
+
+    return _game
+
+
+def _default_game_coroutine(name):
+    """Returns a module-level coroutine running an action of the default game."""
+
+    method = getattr(AsyncGame, name)
+
+    @functools.wraps(method)
+    async def coroutine(*args):
+        return await method(get_game(), *args)
+
+    return coroutine
+
+
+create_character = _default_game_coroutine('create_character')
+create_characters = _default_game_coroutine('create_characters')
+create_creature = _default_game_coroutine('create_creature')
+create_creatures = _default_game_coroutine('create_creatures')
+attack = _default_game_coroutine('attack')
+launch_spell = _default_game_coroutine('launch_spell')
+evolute = _default_game_coroutine('evolute')
+kill_creature = _default_game_coroutine('kill_creature')
+execute_actions = _default_game_coroutine('execute_actions')
+character_info = _default_game_coroutine('character_info')
+money = _default_game_coroutine('money')
+
+
+async def watch(version=None, feed=None):
+    """Yields the modifications of a game as they are made.
+
+    Parameters
+    ----------
+    version: last version already seen, the current one if None (int)
+    feed: modifications to follow, those of the default game if None (gaming_feed.ChangeFeed)
+
+    Yields
+    ------
+    change: version and record of each modification, oldest first (tuple)
+
+    Raises
+    ------
+    ValueError: if modifications after version are not kept anymore: the game must be read again
+
+    Examples
+    --------
+    async for version, record in watch():
+        update_screen(record)
+
+    """
+
+    if feed is None:
+        feed = get_game().session.feed
+    if version is None:
+        version = feed.version
+
+    loop = asyncio.get_event_loop()
+    published = asyncio.Event()
+
+    def wake_up(new_version, record):
+        # Called in the thread making the modification
+        loop.call_soon_threadsafe(published.set)
+
+    feed.subscribe(wake_up)
+    try:
+        while True:
+            published.clear()
+            changes = feed.changes_since(version)
+            if not changes:
+                await published.wait()
+                continue
+            for change in changes:
+                version = change[0]
+                yield change
+    finally:
+        feed.unsubscribe(wake_up)
@@ -0,0 +1,481 @@
+"""This module measures how the gaming API performs as the game grows.
+
+Each API action and each gaming_tools getter and setter is timed on games
+holding from 10 to 100000 characters and creatures, with every storage
+backend.  Results are written as JSON so that runs on different commits or
+storage backends can be compared:
+
+    python gaming_benchmark.py --sizes 10,1000,100000 --output bench.json
+
+With --startup, command line actions (python -m gaming_api) are timed
+from the start of their process instead, against STARTUP_BUDGET_MS.
+
+"""
+
+
+import argparse, json, os, pickle, platform, shutil, subprocess, sys, tempfile, time
+
+import gaming_API_gr_16, gaming_output, gaming_random, gaming_rules, gaming_storage, gaming_tools
+
+
+SIZES = (10, 100, 1000, 10000, 100000)
+# Varieties of the rules which every storage backend can hold
+VARIETIES = tuple([variety for variety in gaming_rules.RULES if variety in gaming_storage.VARIETIES])
+
+# Stats given to the benchmarked roster, so that nobody dies or goes broke while timed
+_IMMORTAL_LIFE = 10 ** 9
+_RICH = 10 ** 9
+
+# Most time a command line action may spend starting up, on top of the Python interpreter, in ms
+STARTUP_BUDGET_MS = 30.0
+
+
+class _CallCounter(object):
+    """Counts the calls to _load_game_db and _dump_game_db of gaming_tools."""
+
+    def __init__(self):
+        self.loads = 0
+        self.dumps = 0
+        self._load = gaming_tools._load_game_db
+        self._dump = gaming_tools._dump_game_db
+
+    def _counted_load(self, *args, **kwargs):
+        self.loads += 1
+        return self._load(*args, **kwargs)
+
+    def _counted_dump(self, *args, **kwargs):
+        self.dumps += 1
+        return self._dump(*args, **kwargs)
+
+    def __enter__(self):
+        gaming_tools._load_game_db = self._counted_load
+        gaming_tools._dump_game_db = self._counted_dump
+        return self
+
+    def __exit__(self, *exc_info):
+        gaming_tools._load_game_db = self._load
+        gaming_tools._dump_game_db = self._dump
+
+
+def _populate(size):
+    """Fills the current game with size entities, half characters and half creatures.
+
+    Parameters
+    ----------
+    size: number of characters and creatures (int)
+
+    Returns
+    -------
+    roster: names of the characters per variety and names of the creatures (dict)
+
+    Notes
+    -----
+    Characters and creatures are made immortal and the team rich, so that
+    timed actions always take the same path.
+
+    """
+
+    nb_characters = max(size // 2, len(VARIETIES))
+    nb_creatures = max(size - nb_characters, 1)
+
+    characters = [('Hero%d' % index, VARIETIES[index % len(VARIETIES)]) for index in range(nb_characters)]
+    gaming_API_gr_16.create_characters(characters)
+    creatures = [creature['name'] for creature in gaming_API_gr_16.create_creatures(nb_creatures).created]
+
+    roster = {'creatures': creatures}
+    with gaming_tools.batch():
+        for name, variety in characters:
+            gaming_tools.set_character_life(name, _IMMORTAL_LIFE)
+            roster.setdefault(variety, []).append(name)
+        for name in creatures:
+            gaming_tools.set_creature_life(name, _IMMORTAL_LIFE)
+        gaming_tools.set_team_money(_RICH)
+
+    return roster
+
+
+def _operations(roster):
+    """Lists the benchmarked operations.
+
+    Parameters
+    ----------
+    roster: names of the characters per variety and names of the creatures (dict)
+
+    Returns
+    -------
+    operations: name of each operation and a function doing it once, given the iteration (list)
+
+    """
+
+    def pick(names):
+        return lambda index: names[index % len(names)]
+
+    creature = pick(roster['creatures'])
+    elf = pick(roster['elf'])
+    healer = pick(roster['healer'])
+    dwarf = pick(roster['dwarf'])
+    wizard = pick(roster['wizard'])
+    nb_created = [0]
+    added = []
+
+    def create_character(index):
+        nb_created[0] += 1
+        gaming_API_gr_16.create_character('Bench%d' % nb_created[0], 'dwarf')
+
+    def add_creature(index):
+        added.append('Bench#%d' % index)
+        gaming_tools.add_creature(added[-1], 'short', 1, 1)
+
+    def remove_creature(index):
+        # Removes the creatures added by add_creature, then those of the roster
+        gaming_tools.remove_creature(added.pop() if added else roster['creatures'].pop())
+
+    return [
+        # API actions (elves can attack any creature)
+        ('attack', lambda index: gaming_API_gr_16.attack(elf(index), creature(index))),
+        ('launch_spell', lambda index: gaming_API_gr_16.launch_spell(healer(index), dwarf(index))),
+        ('evolute', lambda index: gaming_API_gr_16.evolute(wizard(index))),
+        ('create_character', create_character),
+        ('create_creature', lambda index: gaming_API_gr_16.create_creature()),
+        # gaming_tools getters
+        ('get_team_money', lambda index: gaming_tools.get_team_money()),
+        ('get_nb_defeated', lambda index: gaming_tools.get_nb_defeated()),
+        ('character_exists', lambda index: gaming_tools.character_exists(dwarf(index))),
+        ('get_character_variety', lambda index: gaming_tools.get_character_variety(dwarf(index))),
+        ('get_character_reach', lambda index: gaming_tools.get_character_reach(dwarf(index))),
+        ('get_character_strength', lambda index: gaming_tools.get_character_strength(dwarf(index))),
+        ('get_character_life', lambda index: gaming_tools.get_character_life(dwarf(index))),
+        ('creature_exists', lambda index: gaming_tools.creature_exists(creature(index))),
+        ('get_creature_reach', lambda index: gaming_tools.get_creature_reach(creature(index))),
+        ('get_creature_strength', lambda index: gaming_tools.get_creature_strength(creature(index))),
+        ('get_creature_life', lambda index: gaming_tools.get_creature_life(creature(index))),
+        ('get_random_creature_name', lambda index: gaming_tools.get_random_creature_name()),
+        # gaming_tools setters (values are kept, so that timed actions do not change)
+        ('set_team_money', lambda index: gaming_tools.set_team_money(_RICH)),
+        ('set_nb_defeated', lambda index: gaming_tools.set_nb_defeated(gaming_tools.get_nb_defeated())),
+        ('set_character_strength', lambda index: gaming_tools.set_character_strength(dwarf(index), 20)),
+        ('set_character_life', lambda index: gaming_tools.set_character_life(dwarf(index), _IMMORTAL_LIFE)),
+        ('set_creature_strength', lambda index: gaming_tools.set_creature_strength(creature(index), 1)),
+        ('set_creature_life', lambda index: gaming_tools.set_creature_life(creature(index), _IMMORTAL_LIFE)),
+        ('add_creature', add_creature),
+        ('remove_creature', remove_creature),
+    ]
+
+
+def _percentile(timings, percent):
+    """Returns a percentile of sorted timings.
+
+    Parameters
+    ----------
+    timings: sorted timings (list)
+    percent: percentile to return, between 0 and 100 (int)
+
+    Returns
+    -------
+    timing: timing below which percent % of the timings are (float)
+
+    """
+
+    return timings[min(len(timings) - 1, int(len(timings) * percent / 100.0))]
+
+
+def _time_operation(operation, iterations, max_time):
+    """Times an operation.
+
+    Parameters
+    ----------
+    operation: function doing the operation once, given the iteration (function)
+    iterations: maximum number of times the operation is done (int)
+    max_time: time after which the operation is not done anymore, in seconds (float)
+
+    Returns
+    -------
+    stats: number of iterations, ops/sec, p50/p99 latency in µs and loads/dumps per operation (dict)
+
+    """
+
+    timings = []
+    with _CallCounter() as counter:
+        start = time.perf_counter()
+        for index in range(iterations):
+            before = time.perf_counter()
+            operation(index)
+            timings.append(time.perf_counter() - before)
+            if before - start > max_time:
+                break
+        total = time.perf_counter() - start
+
+    timings.sort()
+
+    return {'iterations': len(timings),
+            'ops_per_sec': len(timings) / total,
+            'p50_us': _percentile(timings, 50) * 1e6,
+            'p99_us': _percentile(timings, 99) * 1e6,
+            'loads_per_op': counter.loads / float(len(timings)),
+            'dumps_per_op': counter.dumps / float(len(timings))}
+
+
+def run_benchmarks(sizes=SIZES, storages=None, iterations=200, max_time=1.0, seed=0):
+    """Times every operation on every roster size and storage backend.
+
+    Parameters
+    ----------
+    sizes: numbers of characters and creatures in the game (list)
+    storages: names of the storage backends, all of them if None (list)
+    iterations: maximum number of times each operation is done (int)
+    max_time: time after which an operation is not done anymore, in seconds (float)
+    seed: seed of the random values of the game (int)
+
+    Returns
+    -------
+    results: one dict per storage, size and operation (list)
+
+    Notes
+    -----
+    Games are stored in a temporary directory and events are not shown.
+
+    """
+
+    if storages is None:
+        storages = sorted(gaming_storage.BACKENDS)
+
+    results = []
+    directory = tempfile.mkdtemp(prefix='gaming_benchmark')
+    try:
+        with gaming_output.use_sink(gaming_output.NullSink()):
+            for storage in storages:
+                for size in sizes:
+                    backend_class = gaming_storage.BACKENDS[storage]
+                    path = None
+                    if backend_class.default_path is not None:
+                        path = os.path.join(directory, '%s-%d.%s' % (storage, size, backend_class.default_path))
+                    session = gaming_tools.GameSession(gaming_storage.open_backend(storage, path),
+                                                       gaming_random.GameRandom(seed))
+                    try:
+                        with gaming_tools.use_session(session):
+                            roster = _populate(size)
+                            for name, operation in _operations(roster):
+                                stats = _time_operation(operation, iterations, max_time)
+                                stats.update(storage=storage, size=size, operation=name)
+                                results.append(stats)
+                    finally:
+                        session.backend.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return results
+
+
+def _formats():
+    """Lists the benchmarked file formats.
+
+    Returns
+    -------
+    formats: name of each format, a function encoding a game database and a function decoding it (list)
+
+    """
+
+    formats = [('binary', gaming_storage.encode_binary,
+                lambda data: gaming_storage.BinaryView(data).to_game_db())]
+    for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+        formats.append(('pickle-%d' % protocol, lambda game_db, protocol=protocol: pickle.dumps(game_db, protocol),
+                        pickle.loads))
+
+    return formats
+
+
+def _game_db(size):
+    """Returns a game database of a given size, built without the API.
+
+    Parameters
+    ----------
+    size: number of characters and creatures (int)
+
+    Returns
+    -------
+    game_db: half characters (Hero0, Hero1...), half creatures (Python#00000...) (dict)
+
+    """
+
+    game_db = gaming_storage.new_game_db()
+    for index in range(size // 2):
+        game_db['characters']['Hero%d' % index] = gaming_storage.new_character(
+            VARIETIES[index % len(VARIETIES)], 'short', 10 + index % 40, 10 + index % 40)
+    for index in range(size - size // 2):
+        game_db['creatures']['Python#%05d' % index] = gaming_storage.new_creature(
+            'long' if index % 2 else 'short', 1 + index % 40, 1 + index % 40)
+
+    return game_db
+
+
+def run_format_benchmarks(sizes=SIZES, repeat=5):
+    """Times the encoding and decoding of game databases in each file format.
+
+    Parameters
+    ----------
+    sizes: numbers of characters and creatures in the game (list)
+    repeat: number of times each format is timed, the best time is kept (int)
+
+    Returns
+    -------
+    results: dump and load time in µs and file size in bytes, per format and size (list)
+
+    Notes
+    -----
+    Formats are timed in memory, without the cost of writing the file.
+
+    """
+
+    results = []
+    for size in sizes:
+        game_db = _game_db(size)
+        for name, encode, decode in _formats():
+            dump_times = []
+            load_times = []
+            for attempt in range(repeat):
+                start = time.perf_counter()
+                data = encode(game_db)
+                dump_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                decode(data)
+                load_times.append(time.perf_counter() - start)
+            results.append({'format': name, 'size': size, 'bytes': len(data),
+                            'dump_us': min(dump_times) * 1e6, 'load_us': min(load_times) * 1e6})
+
+    return results
+
+
+def _time_process(command, directory, repeat):
+    """Times a Python process from its start to its end.
+
+    Parameters
+    ----------
+    command: arguments of the Python interpreter (list)
+    directory: directory the process runs in (str)
+    repeat: number of runs (int)
+
+    Returns
+    -------
+    timing: median wall time of the runs, in ms (float)
+
+    """
+
+    env = dict(os.environ, GAMING_STORAGE='binary')
+    env.pop('GAMING_DB', None)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.abspath(__file__))] +
+                                        [path for path in [env.get('PYTHONPATH')] if path])
+    timings = []
+    for attempt in range(repeat):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable] + command, cwd=directory, env=env, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    return _percentile(timings, 50) * 1e3
+
+
+def run_startup_benchmarks(sizes=SIZES, repeat=20, budget_ms=STARTUP_BUDGET_MS):
+    """Times command line actions (python -m gaming_api) from process start to exit.
+
+    Parameters
+    ----------
+    sizes: numbers of characters and creatures in the game (list)
+    repeat: number of runs of each command, the median is kept (int)
+    budget_ms: most time spent starting up on top of the interpreter, in ms (float)
+
+    Returns
+    -------
+    results: the time of an empty interpreter ('python_ms') and, per size and
+             command, its time, its overhead over the interpreter and whether
+             money() fits in the budget (dict)
+
+    Notes
+    -----
+    Games use the binary storage.  money() only reads the counters of the
+    team, so its time should not grow with the game; character_info()
+    loads the whole game.
+
+    """
+
+    commands = [('import', ['-c', 'import gaming_API_gr_16']),
+                ('money', ['-m', 'gaming_api', 'money']),
+                ('character_info', ['-m', 'gaming_api', 'character_info', 'Hero0'])]
+
+    directory = tempfile.mkdtemp(prefix='gaming_benchmark')
+    try:
+        python_ms = _time_process(['-c', 'pass'], directory, repeat)
+        results = []
+        for size in sizes:
+            backend = gaming_storage.BinaryBackend(os.path.join(directory, 'game.db'))
+            backend.dump(_game_db(size))
+            for name, command in commands:
+                elapsed = _time_process(command, directory, repeat)
+                results.append({'size': size, 'command': name, 'ms': elapsed, 'overhead_ms': elapsed - python_ms})
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    money_overhead = max([result['overhead_ms'] for result in results if result['command'] == 'money'] or [0.0])
+
+    return {'python_ms': python_ms, 'budget_ms': budget_ms, 'within_budget': money_overhead <= budget_ms,
+            'results': results}
+
+
+def _commit():
+    """Returns the git commit of the API, None if unknown (str)."""
+
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return output.decode().strip()
+
+
+def main(argv=None):
+    """Runs the benchmarks from the command line and writes their JSON report.
+
+    Parameters
+    ----------
+    argv: command line arguments, sys.argv[1:] if None (list)
+
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark the gaming API.')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES),
+                        help='comma separated numbers of characters and creatures')
+    parser.add_argument('--storage', action='append', choices=sorted(gaming_storage.BACKENDS),
+                        help='storage backend to benchmark (repeatable, all by default)')
+    parser.add_argument('--iterations', type=int, default=200, help='maximum iterations per operation')
+    parser.add_argument('--max-time', type=float, default=1.0, help='maximum seconds per operation')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--formats', action='store_true',
+                        help='compare the binary format with pickle protocols instead of timing the API')
+    parser.add_argument('--startup', action='store_true',
+                        help='time command line actions from process start instead of timing the API')
+    parser.add_argument('--output', help='file to write the JSON report to, stdout by default')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    report = {'commit': _commit(),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'sizes': sizes}
+    if args.formats:
+        report['formats'] = run_format_benchmarks(sizes)
+    elif args.startup:
+        report['startup'] = run_startup_benchmarks(sizes)
+    else:
+        report['results'] = run_benchmarks(sizes, args.storage, args.iterations, args.max_time, args.seed)
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
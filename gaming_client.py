@@ -0,0 +1,334 @@
+"""This module talks to a game server (see gaming_server), so that many
+processes can play the same game without sharing its file:
+
+    client = GameClient('game.sock')
+    client.create_character('Bob', 'elf')
+    result = client.attack('Bob', client.create_creature().name)
+
+Requests are sent as JSON lines on connections kept open in a pool, and
+call_many() sends many requests at once and then reads their answers
+(pipelining), so that they cost a single round trip:
+
+    results = client.call_many([('attack', 'Bob', creature_name), ('money',)])
+
+This module does not import the gaming API itself."""
+
+
+import contextlib, json, queue, socket, threading
+
+import gaming_output
+
+
+# Actions served, with their number of arguments
+ACTIONS = {'create_character': 2,
+           'create_creature': 0,
+           'attack': 2,
+           'launch_spell': 2,
+           'evolute': 1,
+           'character_info': 1,
+           'money': 0,
+           'changes_since': 1}
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_PIPELINE = 256
+
+
+def encode_message(message):
+    """Encodes a request or a response as a line of the protocol.
+
+    Parameters
+    ----------
+    message: request or response (dict)
+
+    Returns
+    -------
+    line: compact JSON of the message, ending with a newline (bytes)
+
+    """
+
+    return json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def decode_message(line):
+    """Decodes a line of the protocol.
+
+    Parameters
+    ----------
+    line: line received (bytes)
+
+    Returns
+    -------
+    message: request or response, None if the line is not valid JSON (object)
+
+    """
+
+    try:
+        return json.loads(line.decode('utf-8'))
+    except ValueError:
+        return None
+
+
+def _decode_result(result):
+    """Returns what an action returned from its JSON value (ActionResult, or the changes of changes_since)."""
+
+    if isinstance(result, dict):
+        return gaming_output.ActionResult.from_dict(result)
+
+    return result
+
+
+class Connection(object):
+    """Connection to a game server."""
+
+    def __init__(self, address, timeout=None):
+        """Connects to a game server.
+
+        Parameters
+        ----------
+        address: path of a Unix socket (str), or host and port of a TCP socket (tuple)
+        timeout: time to wait for the server, in seconds, None to wait forever (float)
+
+        Raises
+        ------
+        OSError: if the server cannot be reached
+
+        """
+
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # Requests are small: sent at once rather than coalesced
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.socket.settimeout(timeout)
+        try:
+            self.socket.connect(address)
+        except BaseException:
+            self.socket.close()
+            raise
+        self._file = self.socket.makefile('rb')
+        self._next_id = 0
+
+    def send(self, requests):
+        """Sends requests at once, then reads their responses.
+
+        Parameters
+        ----------
+        requests: action name followed by its arguments, per request (list of tuples)
+
+        Returns
+        -------
+        responses: response of each request, in order (list of dicts)
+
+        Raises
+        ------
+        ConnectionError: if the server closed the connection
+
+        """
+
+        first_id = self._next_id
+        self._next_id += len(requests)
+        self.socket.sendall(b''.join([encode_message({'id': first_id + index, 'action': request[0],
+                                                      'args': list(request[1:])})
+                                      for index, request in enumerate(requests)]))
+
+        responses = []
+        for request in requests:
+            line = self._file.readline()
+            if not line:
+                raise ConnectionError('connection closed by the game server')
+            responses.append(decode_message(line))
+
+        return responses
+
+    def close(self):
+        """Closes the connection."""
+
+        self._file.close()
+        self.socket.close()
+
+
+class ConnectionPool(object):
+    """Connections to a game server, opened when needed and kept for later requests."""
+
+    def __init__(self, address, size=DEFAULT_POOL_SIZE, timeout=None):
+        """Creates an empty pool.
+
+        Parameters
+        ----------
+        address: path of a Unix socket (str), or host and port of a TCP socket (tuple)
+        size: most connections open at once, threads wait for one beyond (int)
+        timeout: time to wait for the server, in seconds, None to wait forever (float)
+
+        """
+
+        self.address = address
+        self.size = size
+        self.timeout = timeout
+        self.nb_opened = 0
+        self._idle = queue.LifoQueue()
+        self._semaphore = threading.BoundedSemaphore(size)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Gives a connection in a with statement, for the current thread only.
+
+        Notes
+        -----
+        A connection is closed instead of being put back in the pool if an
+        error happens while it is used, since its responses could be out of step.
+
+        """
+
+        with self._semaphore:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = Connection(self.address, self.timeout)
+                self.nb_opened += 1
+
+            try:
+                yield connection
+            except BaseException:
+                connection.close()
+                raise
+            self._idle.put(connection)
+
+    def close(self):
+        """Closes the connections which are not being used."""
+
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+
+
+class GameClient(object):
+    """Client of a game server, whose API actions are methods.
+
+    Clients can be shared by threads: each request uses a connection of
+    the pool on its own.
+
+    """
+
+    def __init__(self, address, pool_size=DEFAULT_POOL_SIZE, timeout=None, max_pipeline=DEFAULT_MAX_PIPELINE):
+        """Creates a client.
+
+        Parameters
+        ----------
+        address: path of a Unix socket (str), or host and port of a TCP socket (tuple)
+        pool_size: most connections open at once (int)
+        timeout: time to wait for the server, in seconds, None to wait forever (float)
+        max_pipeline: most requests sent at once on a connection (int)
+
+        """
+
+        self.pool = ConnectionPool(address, pool_size, timeout)
+        self.max_pipeline = max_pipeline
+
+    def call_many(self, requests):
+        """Runs many actions, with one round trip per max_pipeline of them.
+
+        Parameters
+        ----------
+        requests: action name followed by its arguments, per action,
+                  e.g. [('attack', 'Bob', creature_name), ('money',)] (list of tuples)
+
+        Returns
+        -------
+        results: what each action returned, in order (list of ActionResult, list of changes for changes_since)
+
+        Raises
+        ------
+        ValueError: if a request is not valid (then no request is sent)
+        ValueError: if the server refused a request (the other ones were run)
+
+        Notes
+        -----
+        Actions run one after the other in the server, in order, but actions
+        of other clients may run between them.
+
+        """
+
+        requests = [tuple(request) for request in requests]
+        for request in requests:
+            if not request or ACTIONS.get(request[0]) != len(request) - 1:
+                raise ValueError('request %r is not valid' % (request,))
+
+        responses = []
+        with self.pool.connection() as connection:
+            for start in range(0, len(requests), self.max_pipeline):
+                responses.extend(connection.send(requests[start:start + self.max_pipeline]))
+
+        results = []
+        for request, response in zip(requests, responses):
+            if not isinstance(response, dict) or 'result' not in response:
+                error = response.get('error') if isinstance(response, dict) else 'response is not valid'
+                raise ValueError('request %r failed (%s)' % (request, error))
+            results.append(_decode_result(response['result']))
+
+        return results
+
+    def call(self, action, *args):
+        """Runs an action.
+
+        Parameters
+        ----------
+        action: name of the action (str)
+        args: arguments of the action
+
+        Returns
+        -------
+        result: what the action returned (ActionResult, list of changes for changes_since)
+
+        Raises
+        ------
+        ValueError: if the request is not valid or was refused by the server
+
+        """
+
+        return self.call_many([(action,) + args])[0]
+
+    def changes_since(self, version):
+        """Returns the modifications of the game made after a version (see gaming_tools.changes_since).
+
+        Parameters
+        ----------
+        version: last version already seen, 0 for all modifications kept by the server (int)
+
+        Returns
+        -------
+        changes: (version, record) pairs, oldest first (list)
+
+        Raises
+        ------
+        ValueError: if some of these modifications are not kept anymore: the game must be read again
+
+        """
+
+        return [(change_version, tuple(record)) for change_version, record in self.call('changes_since', version)]
+
+    def close(self):
+        """Closes the connections of the client."""
+
+        self.pool.close()
+
+
+def _client_method(action):
+    """Returns a method of GameClient running an action on the server."""
+
+    def method(self, *args):
+        return self.call(action, *args)
+
+    method.__name__ = action
+    method.__doc__ = 'Runs gaming_API_gr_16.%s on the server.' % action
+
+    return method
+
+
+for _action in ACTIONS:
+    if not hasattr(GameClient, _action):
+        setattr(GameClient, _action, _client_method(_action))
+del _action
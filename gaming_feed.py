@@ -0,0 +1,153 @@
+"""This module numbers the modifications of a game, so that observers
+(user interfaces, dashboards...) follow them instead of reading the whole
+game again and again:
+
+    version = get_version()
+    ...
+    for version, record in changes_since(version):
+        ...
+
+Each modification is published as its record (see
+gaming_storage.apply_record), e.g. ('set_character_life', 'Bob', 12),
+with the next version number.  Records ('action', name, arguments...)
+tell which API action caused the next ones, and ('reload',) that the game
+was loaded again (modified by another process, or reset): observers must
+then read it again.  Modifications made in a batch are published when it
+ends, and never if it is rolled back (see gaming_tools.batch)."""
+
+
+import collections, itertools, sys, threading
+
+
+DEFAULT_CAPACITY = 10000
+
+
+class ChangeFeed(object):
+    """Modifications of a game, numbered by increasing versions.
+
+    The last capacity modifications are kept for changes_since(), and
+    callbacks are called at each one, in the thread which made it.
+
+    Attributes
+    ----------
+    version: version of the last modification, 0 if there was none (int)
+
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """Creates an empty feed.
+
+        Parameters
+        ----------
+        capacity: number of modifications kept (int)
+
+        Raises
+        ------
+        ValueError: if capacity is smaller than 1
+
+        """
+
+        if capacity < 1:
+            raise ValueError('feed capacity must be at least 1')
+
+        self.version = 0
+        self.capacity = capacity
+        # (version, record) pairs, oldest first
+        self._changes = collections.deque(maxlen=capacity)
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def publish(self, record):
+        """Publishes a modification.
+
+        Parameters
+        ----------
+        record: name of the modifying function followed by its arguments (tuple)
+
+        Returns
+        -------
+        version: version of the modification (int)
+
+        Notes
+        -----
+        Exceptions raised by callbacks are written on the standard error,
+        so that an observer never stops the game.
+
+        """
+
+        with self._lock:
+            self.version += 1
+            version = self.version
+            self._changes.append((version, record))
+            callbacks = list(self._callbacks)
+
+        for callback in callbacks:
+            try:
+                callback(version, record)
+            except Exception as error:
+                sys.stderr.write('change feed callback %r failed: %r\n' % (callback, error))
+
+        return version
+
+    def changes_since(self, version):
+        """Returns the modifications made after a version.
+
+        Parameters
+        ----------
+        version: last version already seen, 0 for all modifications (int)
+
+        Returns
+        -------
+        changes: (version, record) pairs, oldest first (list)
+
+        Raises
+        ------
+        ValueError: if some modifications after version are not kept anymore, or
+                    version is newer than the feed: the game must be read again
+
+        """
+
+        with self._lock:
+            if version > self.version:
+                raise ValueError('version %d is newer than the feed (version %d)' % (version, self.version))
+            oldest = self._changes[0][0] if self._changes else self.version + 1
+            if version < oldest - 1:
+                raise ValueError('changes since version %d are not kept anymore (oldest is %d)' % (version, oldest))
+
+            # Versions of the kept modifications follow each other: the newest self.version - version ones
+            changes = list(itertools.islice(reversed(self._changes), self.version - version))
+
+        changes.reverse()
+
+        return changes
+
+    def subscribe(self, callback):
+        """Calls a function at each modification.
+
+        Parameters
+        ----------
+        callback: function called with the version and record of each modification (function)
+
+        Returns
+        -------
+        callback: the function, to unsubscribe it later (function)
+
+        """
+
+        with self._lock:
+            self._callbacks.append(callback)
+
+        return callback
+
+    def unsubscribe(self, callback):
+        """Stops calling a function at each modification.
+
+        Parameters
+        ----------
+        callback: function given to subscribe (function)
+
+        """
+
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
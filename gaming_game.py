@@ -0,0 +1,602 @@
+"""This module hosts many independent games in one process.  A game is
+identified by an ID and a storage root, under which each game has its own
+directory:
+
+    game = Game('table-42', root='games')
+    game.create_character('Bob', 'elf')
+    game.attack('Bob', game.create_creature().name)
+
+The API functions and gaming_tools functions are methods of Game.  Open
+games are kept in an LRU cache of bounded size: games used recently stay in
+memory, the least recently used ones are written to disk and closed when
+the cache is full, and reopened from disk at their next use."""
+
+
+import collections, contextlib, os, threading
+
+import gaming_API_gr_16, gaming_storage, gaming_tools
+
+
+DEFAULT_ROOT = 'games'
+DEFAULT_CAPACITY = 128
+
+
+def _check_game_id(game_id):
+    """Checks that a game ID can be used as a directory name.
+
+    Parameters
+    ----------
+    game_id: ID of the game (str)
+
+    Raises
+    ------
+    ValueError: if the ID is empty, '.', '..' or contains a path separator or a NUL character
+
+    """
+
+    separators = [separator for separator in ('/', os.sep, os.altsep, '\0') if separator]
+    if (not isinstance(game_id, str) or game_id in ('', '.', '..')
+            or any([separator in game_id for separator in separators])):
+        raise ValueError('game ID %r is not valid' % (game_id,))
+
+
+class GameCache(object):
+    """LRU cache of the sessions of open games.
+
+    At most capacity games are kept open: when another one is opened, the
+    least recently used games are written to disk and closed.  Games being
+    used are never closed, so the cache can hold more of them while more
+    threads use different games at the same time.
+
+    Games stored with the 'memory' backend are lost when closed: give
+    their cache a capacity large enough for all of them.  The random
+    generator given to Game.set_rng and the functions given to
+    Game.subscribe are kept and given back to the game when it is
+    reopened, so that its draws go on where they stopped and observers
+    keep following it.
+
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """Creates an empty cache.
+
+        Parameters
+        ----------
+        capacity: number of games kept open (int)
+
+        Raises
+        ------
+        ValueError: if capacity is smaller than 1
+
+        """
+
+        if capacity < 1:
+            raise ValueError('cache capacity must be at least 1')
+
+        self.capacity = capacity
+        self.nb_opened = 0
+        self.nb_evicted = 0
+        # key -> [session, number of users], least recently used first
+        self._entries = collections.OrderedDict()
+        # key -> event set once the game is opened, or written and closed, by another thread
+        self._busy = {}
+        # key -> random generator of the game, given back to it when reopened
+        self._rngs = {}
+        # key -> functions subscribed to the changes of the game, subscribed again when reopened
+        self._callbacks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, game):
+        return game.key in self._entries
+
+    @contextlib.contextmanager
+    def use(self, game):
+        """Gives the session of a game in a with statement, opening it if needed.
+
+        Parameters
+        ----------
+        game: game to use (Game)
+
+        Notes
+        -----
+        The game cannot be closed by the cache until the with statement ends.
+        Games are opened, written and closed without holding the lock of the
+        cache, so that other threads keep using their games meanwhile.
+
+        """
+
+        entry, evicted = self._acquire(game)
+        try:
+            self._close_all(evicted)
+            yield entry[0]
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                evicted = self._evict()
+            self._close_all(evicted)
+
+    def _acquire(self, game):
+        """Returns the entry of a game, opening it if needed, with one more user.
+
+        Parameters
+        ----------
+        game: game to use (Game)
+
+        Returns
+        -------
+        entry: session of the game and number of users (list)
+        evicted: games to close with _close_all to make room for it (list)
+
+        """
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(game.key)
+                if entry is not None:
+                    self._entries.move_to_end(game.key)
+                    entry[1] += 1
+                    break
+                busy = self._busy.get(game.key)
+                if busy is None:
+                    # Opened by this thread: others wait for it instead of opening it again
+                    busy = self._busy[game.key] = threading.Event()
+                    break
+            # Opened, or written before being read again from disk, by another thread
+            busy.wait()
+
+        evicted = []
+        if entry is None:
+            session = None
+            try:
+                session = game.open_session()
+            finally:
+                with self._lock:
+                    del self._busy[game.key]
+                    if session is not None:
+                        if game.key in self._rngs:
+                            session.rng = self._rngs[game.key]
+                        for callback in self._callbacks.get(game.key, ()):
+                            session.feed.subscribe(callback)
+                        entry = self._entries[game.key] = [session, 1]
+                        self.nb_opened += 1
+                        evicted = self._evict()
+                busy.set()
+
+        return entry, evicted
+
+    def _evict(self):
+        """Takes the least recently used games unused out of the cache until it fits its capacity.
+
+        Returns
+        -------
+        evicted: keys and sessions of the games to close with _close_all, the lock being released (list)
+
+        Notes
+        -----
+        The lock of the cache must be held.
+
+        """
+
+        evicted = []
+        if len(self._entries) <= self.capacity:
+            return evicted
+
+        for key, (session, users) in list(self._entries.items()):
+            if len(self._entries) <= self.capacity:
+                break
+            if users == 0:
+                del self._entries[key]
+                # Reopened only once written (see _close_all)
+                self._busy[key] = threading.Event()
+                evicted.append((key, session))
+                self.nb_evicted += 1
+
+        return evicted
+
+    def _close_all(self, evicted):
+        """Writes and closes games taken out of the cache.
+
+        Parameters
+        ----------
+        evicted: keys and sessions of the games, given by _evict (list)
+
+        Raises
+        ------
+        Exception: the first error met, once every game is closed
+
+        """
+
+        error = None
+        for key, session in evicted:
+            try:
+                self._close(session)
+            except Exception as exception:
+                # The other games are still closed, and nobody waits forever for this one
+                if error is None:
+                    error = exception
+            finally:
+                with self._lock:
+                    busy = self._busy.pop(key)
+                busy.set()
+
+        if error is not None:
+            raise error
+
+    def _close(self, session):
+        """Writes and closes the session of a game.
+
+        Parameters
+        ----------
+        session: session to close (GameSession)
+
+        """
+
+        try:
+            session.commit()
+        finally:
+            session.backend.close()
+
+    def keep_rng(self, game, rng):
+        """Gives a random generator to a game, now and whenever it is reopened.
+
+        Parameters
+        ----------
+        game: game using it (Game)
+        rng: source of random values of the game (GameRandom)
+
+        Notes
+        -----
+        The game must be used (see use), so that it is open.
+
+        """
+
+        with self._lock:
+            self._entries[game.key][0].rng = rng
+            self._rngs[game.key] = rng
+
+    def keep_callback(self, game, callback):
+        """Subscribes a function to the changes of a game, now and whenever it is reopened.
+
+        Parameters
+        ----------
+        game: game to follow (Game)
+        callback: function called with the version and record of each modification (function)
+
+        Notes
+        -----
+        The game must be used (see use), so that it is open.
+
+        """
+
+        with self._lock:
+            self._entries[game.key][0].feed.subscribe(callback)
+            self._callbacks.setdefault(game.key, []).append(callback)
+
+    def forget_callback(self, game, callback):
+        """Unsubscribes a function given to keep_callback.
+
+        Parameters
+        ----------
+        game: game followed (Game)
+        callback: function given to keep_callback (function)
+
+        Notes
+        -----
+        The game must be used (see use), so that it is open.
+
+        """
+
+        with self._lock:
+            self._entries[game.key][0].feed.unsubscribe(callback)
+            callbacks = self._callbacks.get(game.key, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._callbacks.pop(game.key, None)
+
+    def flush(self, game=None):
+        """Writes pending modifications of the open games to disk.
+
+        Parameters
+        ----------
+        game: only game to write, all of them if None (Game)
+
+        """
+
+        with self._lock:
+            if game is None:
+                entries = list(self._entries.values())
+            else:
+                entry = self._entries.get(game.key)
+                entries = [entry] if entry is not None else []
+            # Used while written, so that they are not closed meanwhile
+            for entry in entries:
+                entry[1] += 1
+
+        try:
+            for session, users in entries:
+                session.commit()
+        finally:
+            with self._lock:
+                for entry in entries:
+                    entry[1] -= 1
+                evicted = self._evict()
+            self._close_all(evicted)
+
+    def close(self):
+        """Writes and closes every open game.
+
+        Raises
+        ------
+        RuntimeError: if a game is being used
+
+        """
+
+        with self._lock:
+            if any([users for session, users in self._entries.values()]):
+                raise RuntimeError('cannot close a game cache while games are used')
+
+            evicted = []
+            while self._entries:
+                key, (session, users) = self._entries.popitem(last=False)
+                self._busy[key] = threading.Event()
+                evicted.append((key, session))
+
+        self._close_all(evicted)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the cache shared by games created without one.
+
+    Returns
+    -------
+    cache: default game cache, created at first use (GameCache)
+
+    """
+
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = GameCache()
+
+    return _cache
+
+
+class Game(object):
+    """Handle of a game stored in its own directory.
+
+    Handles are cheap: the game itself is opened in the cache at its first
+    use, and handles of the same game share it.
+
+    """
+
+    def __init__(self, game_id, root=DEFAULT_ROOT, storage=None, cache=None):
+        """Creates the handle of a game.
+
+        Parameters
+        ----------
+        game_id: ID of the game, used as the name of its directory (str)
+        root: directory containing the games (str)
+        storage: storage backend of the game, from the GAMING_STORAGE environment variable if None (str)
+        cache: cache keeping the game open, the default one if None (GameCache)
+
+        Raises
+        ------
+        ValueError: if the game ID or the storage backend is not valid
+
+        """
+
+        _check_game_id(game_id)
+        backend_class = gaming_storage.get_backend_class(storage)
+
+        self.game_id = game_id
+        self.root = root
+        self.storage = backend_class.name
+        if backend_class.default_path is not None:
+            self.path = os.path.join(root, game_id, backend_class.default_path)
+        else:
+            self.path = None
+        self.cache = cache if cache is not None else get_cache()
+        self.key = (os.path.abspath(root), game_id, self.storage)
+
+    def __repr__(self):
+        return 'Game(%r, root=%r, storage=%r)' % (self.game_id, self.root, self.storage)
+
+    def open_session(self):
+        """Opens the storage of the game.
+
+        Returns
+        -------
+        session: new session on the game (GameSession)
+
+        """
+
+        if self.path is not None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        return gaming_tools.GameSession(gaming_storage.open_backend(self.storage, self.path))
+
+    @contextlib.contextmanager
+    def session(self):
+        """Makes the module-level functions play this game in a with statement.
+
+        Examples
+        --------
+        with game.session():
+            attack('Bob', creature_name)
+
+        Notes
+        -----
+        Only the current thread plays the game: other threads keep their own.
+
+        """
+
+        with self.cache.use(self) as session:
+            with gaming_tools.use_session(session):
+                yield session
+
+    def run(self, function, *args, **kwargs):
+        """Runs a function of gaming_API_gr_16 or gaming_tools on the game.
+
+        Parameters
+        ----------
+        function: function to run (function)
+        args: arguments of the function
+        kwargs: keyword arguments of the function
+
+        Returns
+        -------
+        result: what the function returns
+
+        """
+
+        with self.session():
+            return function(*args, **kwargs)
+
+    @contextlib.contextmanager
+    def batch(self, action=None):
+        """Groups modifications of the game so that they are written to disk only once.
+
+        Parameters
+        ----------
+        action: name and arguments of the API action run in the batch (tuple)
+
+        Examples
+        --------
+        with game.batch():
+            game.attack('Bob', creature_name)
+            game.evolute('Bob')
+
+        """
+
+        with self.session() as session:
+            with session.batch(action):
+                yield session
+
+    def flush(self):
+        """Writes pending modifications of the game to disk."""
+
+        self.cache.flush(self)
+
+    def set_rng(self, rng):
+        """Changes where the random values of the game are drawn from.
+
+        Parameters
+        ----------
+        rng: new source of random values, e.g. gaming_random.GameRandom(seed) (GameRandom)
+
+        Notes
+        -----
+        Unlike gaming_tools.set_rng, the generator is kept when the game is
+        closed by the cache, and used again when it is reopened.
+
+        """
+
+        with self.session():
+            self.cache.keep_rng(self, rng)
+
+    def subscribe(self, callback):
+        """Calls a function at each modification of the game.
+
+        Parameters
+        ----------
+        callback: function called with the version and record of each modification (function)
+
+        Returns
+        -------
+        callback: the function, to unsubscribe it later (function)
+
+        Notes
+        -----
+        The function keeps being called after the game is closed by the
+        cache and reopened.  Versions then start again from 0, as for any
+        new session: changes_since raises ValueError for older versions.
+
+        """
+
+        with self.session():
+            self.cache.keep_callback(self, callback)
+
+        return callback
+
+    def unsubscribe(self, callback):
+        """Stops calling a function at each modification of the game.
+
+        Parameters
+        ----------
+        callback: function given to subscribe (function)
+
+        """
+
+        with self.session():
+            self.cache.forget_callback(self, callback)
+
+    def set_write_behind(self, max_pending=None, max_delay=None, manual=False):
+        """Sets when pending modifications of the game must be written to disk.
+
+        Parameters
+        ----------
+        max_pending: write once that many modifications are pending, None for no limit (int)
+        max_delay: write once the oldest pending modification is that old, in seconds (float)
+        manual: True to only write when flush() is called, whatever the limits (bool)
+
+        Notes
+        -----
+        The policy is forgotten when the game is closed by the cache.
+
+        """
+
+        with self.session() as session:
+            session.set_write_behind(max_pending, max_delay, manual)
+
+
+def _game_method(module, name):
+    """Returns a method of Game running a function of a module on the game.
+
+    Parameters
+    ----------
+    module: module of the function (module)
+    name: name of the function (str)
+
+    Returns
+    -------
+    method: the method (function)
+
+    """
+
+    function = getattr(module, name)
+
+    def method(self, *args, **kwargs):
+        # Looked up at each call, so that the function can be replaced (e.g. by the profiler)
+        return self.run(getattr(module, name), *args, **kwargs)
+
+    method.__name__ = name
+    method.__doc__ = function.__doc__
+
+    return method
+
+
+API_METHODS = ('create_character', 'create_characters', 'create_creature', 'create_creatures', 'attack',
+               'launch_spell', 'evolute', 'kill_creature', 'can_attack', 'execute_actions', 'character_info',
+               'money')
+TOOLS_METHODS = ('reset_game', 'set_team_money', 'get_team_money', 'set_nb_defeated', 'get_nb_defeated',
+                 'get_team_stats', 'character_exists', 'can_store_character', 'get_character', 'add_new_character',
+                 'get_character_variety', 'get_character_reach', 'set_character_strength', 'get_character_strength',
+                 'set_character_life', 'get_character_life', 'creature_exists', 'get_creature', 'add_creature',
+                 'remove_creature', 'get_random_creature_name', 'get_creature_reach', 'set_creature_strength',
+                 'get_creature_strength', 'set_creature_life', 'get_creature_life', 'find_characters',
+                 'find_creatures', 'top_characters', 'top_creatures', 'get_rng', 'get_version', 'changes_since')
+
+for _name in API_METHODS:
+    setattr(Game, _name, _game_method(gaming_API_gr_16, _name))
+for _name in TOOLS_METHODS:
+    setattr(Game, _name, _game_method(gaming_tools, _name))
+del _name
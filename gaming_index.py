@@ -0,0 +1,421 @@
+"""This module indexes the characters and creatures of a game, to answer
+queries such as "living healers" or "weakest living creature" without
+going through the whole roster.
+
+A RosterIndex is built from a game database, then kept up to date by
+applying the modification records of gaming_tools (see
+gaming_storage.apply_record) as they are made.  Indexes only hold names:
+stats are read from the database itself."""
+
+
+import bisect, heapq, itertools
+
+import gaming_storage
+
+
+_VARIETY, _REACH, _STRENGTH, _LIFE = gaming_storage.VARIETY, gaming_storage.REACH, \
+    gaming_storage.STRENGTH, gaming_storage.LIFE
+
+_STATS = {'life': _LIFE, 'strength': _STRENGTH}
+
+
+class SortedPairs(object):
+    """(value, name) pairs kept sorted.
+
+    Pairs are stored in chunks of at most 2 * CHUNK_SIZE sorted pairs, so
+    that adding or removing one only moves the pairs of its chunk instead
+    of those of the whole list.
+
+    """
+
+    CHUNK_SIZE = 512
+
+    def __init__(self, pairs=()):
+        """Sorts pairs.
+
+        Parameters
+        ----------
+        pairs: (value, name) pairs, in any order (iterable)
+
+        """
+
+        pairs = sorted(pairs)
+        self._chunks = [pairs[start:start + self.CHUNK_SIZE] for start in range(0, len(pairs), self.CHUNK_SIZE)]
+        # Last pair of each chunk, to find the chunk of a pair
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._len = len(pairs)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._chunks)
+
+    def __reversed__(self):
+        return itertools.chain.from_iterable([reversed(chunk) for chunk in reversed(self._chunks)])
+
+    def add(self, pair):
+        """Adds a pair.
+
+        Parameters
+        ----------
+        pair: value and name (tuple)
+
+        """
+
+        chunks, maxes = self._chunks, self._maxes
+        if not chunks:
+            chunks.append([pair])
+            maxes.append(pair)
+            self._len = 1
+            return
+
+        index = min(bisect.bisect_left(maxes, pair), len(maxes) - 1)
+        chunk = chunks[index]
+        bisect.insort(chunk, pair)
+        maxes[index] = chunk[-1]
+        self._len += 1
+
+        if len(chunk) > 2 * self.CHUNK_SIZE:
+            chunks[index:index + 1] = [chunk[:self.CHUNK_SIZE], chunk[self.CHUNK_SIZE:]]
+            maxes[index:index + 1] = [chunk[self.CHUNK_SIZE - 1], chunk[-1]]
+
+    def remove(self, pair):
+        """Removes a pair, if it is there.
+
+        Parameters
+        ----------
+        pair: value and name (tuple)
+
+        """
+
+        chunks, maxes = self._chunks, self._maxes
+        index = bisect.bisect_left(maxes, pair)
+        if index == len(maxes):
+            return
+        chunk = chunks[index]
+        position = bisect.bisect_left(chunk, pair)
+        if position == len(chunk) or chunk[position] != pair:
+            return
+
+        del chunk[position]
+        self._len -= 1
+        if chunk:
+            maxes[index] = chunk[-1]
+        else:
+            del chunks[index]
+            del maxes[index]
+
+    def between(self, low, high):
+        """Returns the names of the pairs whose value is between low and high, both included.
+
+        Parameters
+        ----------
+        low: lowest value, None for no limit (int)
+        high: highest value, None for no limit (int)
+
+        Returns
+        -------
+        names: names of the pairs, by increasing value (list)
+
+        """
+
+        chunks = self._chunks
+        # (value,) is before every (value, name) pair: names are strings, never smaller than nothing
+        first = 0 if low is None else bisect.bisect_left(self._maxes, (low,))
+        names = []
+        for chunk in itertools.islice(chunks, first, None):
+            start = 0 if low is None else bisect.bisect_left(chunk, (low,))
+            stop = len(chunk) if high is None else bisect.bisect_left(chunk, (high + 1,))
+            names.extend([name for value, name in chunk[start:stop]])
+            if stop < len(chunk):
+                break
+
+        return names
+
+
+class EntityIndex(object):
+    """Indexes of the characters or of the creatures of a game.
+
+    Attributes
+    ----------
+    section: entities by name, as stored in the indexed game database (dict)
+    by_variety: names by variety (dict of sets)
+    by_reach: names by reach (dict of sets)
+    alive: names of the entities whose life is positive (set)
+    by_life: (life, name) pairs (SortedPairs)
+    by_strength: (strength, name) pairs (SortedPairs)
+
+    """
+
+    def __init__(self, section):
+        """Creates the indexes of a section of a game database.
+
+        Parameters
+        ----------
+        section: entities by name, game_db['characters'] or game_db['creatures'] (dict)
+
+        """
+
+        self.section = section
+        self.by_variety = {}
+        self.by_reach = {}
+        self.alive = set()
+
+        decode_variety, decode_reach = gaming_storage.decode_variety, gaming_storage.decode_reach
+        life_pairs, strength_pairs = [], []
+        for name, entity in section.items():
+            variety = entity[_VARIETY]
+            self.by_variety.setdefault(decode_variety(variety) if variety is not None else None, set()).add(name)
+            self.by_reach.setdefault(decode_reach(entity[_REACH]), set()).add(name)
+            if entity[_LIFE] > 0:
+                self.alive.add(name)
+            life_pairs.append((entity[_LIFE], name))
+            strength_pairs.append((entity[_STRENGTH], name))
+        # Sorted once rather than inserted one by one
+        self.by_life = SortedPairs(life_pairs)
+        self.by_strength = SortedPairs(strength_pairs)
+
+    def __len__(self):
+        return len(self.section)
+
+    def add(self, name, variety, reach, strength, life):
+        """Indexes a new entity, before it is added to the database.
+
+        Parameters
+        ----------
+        name: name of the entity (str)
+        variety: variety of a character, None for a creature (str)
+        reach: reach of the entity (str)
+        strength: strength of the entity (int)
+        life: life of the entity (int)
+
+        """
+
+        if name in self.section:
+            self.remove(name)
+
+        self.by_variety.setdefault(variety, set()).add(name)
+        self.by_reach.setdefault(reach, set()).add(name)
+        if life > 0:
+            self.alive.add(name)
+        self.by_life.add((life, name))
+        self.by_strength.add((strength, name))
+
+    def remove(self, name):
+        """Forgets an entity, before it is removed from the database.
+
+        Parameters
+        ----------
+        name: name of the entity (str)
+
+        """
+
+        entity = self.section.get(name)
+        if entity is None:
+            return
+
+        variety = entity[_VARIETY]
+        self.by_variety[gaming_storage.decode_variety(variety) if variety is not None else None].discard(name)
+        self.by_reach[gaming_storage.decode_reach(entity[_REACH])].discard(name)
+        self.alive.discard(name)
+        self.by_life.remove((entity[_LIFE], name))
+        self.by_strength.remove((entity[_STRENGTH], name))
+
+    def update(self, name, field, value):
+        """Changes the strength or life of an entity, before it is changed in the database.
+
+        Parameters
+        ----------
+        name: name of the entity (str)
+        field: gaming_storage.STRENGTH or gaming_storage.LIFE (int)
+        value: new value of the field (int)
+
+        """
+
+        entity = self.section.get(name)
+        if entity is None or entity[field] == value:
+            return
+
+        pairs = self.by_life if field == _LIFE else self.by_strength
+        pairs.remove((entity[field], name))
+        pairs.add((value, name))
+        if field == _LIFE:
+            if value > 0:
+                self.alive.add(name)
+            else:
+                self.alive.discard(name)
+
+    def _candidates(self, alive, variety, reach, min_life, max_life, min_strength, max_strength):
+        """Returns the smallest index holding every entity matching a query.
+
+        Returns
+        -------
+        candidates: names of the entities which may match (iterable)
+
+        """
+
+        sources = []
+        if alive:
+            sources.append(self.alive)
+        if variety is not None:
+            sources.append(self.by_variety.get(variety, ()))
+        if reach is not None:
+            sources.append(self.by_reach.get(reach, ()))
+        if min_life is not None or max_life is not None:
+            sources.append(self.by_life.between(min_life, max_life))
+        if min_strength is not None or max_strength is not None:
+            sources.append(self.by_strength.between(min_strength, max_strength))
+
+        if not sources:
+            return self.section
+
+        return min(sources, key=len)
+
+    def find(self, alive=None, variety=None, reach=None, min_life=None, max_life=None, min_strength=None,
+             max_strength=None):
+        """Returns the names of the entities matching a query.
+
+        Parameters
+        ----------
+        alive: True for living entities only, False for dead ones only, None for both (bool)
+        variety: only entities of that variety (str)
+        reach: only entities of that reach (str)
+        min_life: only entities with at least that life (int)
+        max_life: only entities with at most that life (int)
+        min_strength: only entities with at least that strength (int)
+        max_strength: only entities with at most that strength (int)
+
+        Returns
+        -------
+        names: names of the matching entities, sorted (list)
+
+        """
+
+        if alive is False:
+            max_life = 0 if max_life is None else min(max_life, 0)
+        candidates = self._candidates(alive, variety, reach, min_life, max_life, min_strength, max_strength)
+        matches = _matcher(self.section, alive, variety, reach, min_life, max_life, min_strength, max_strength)
+
+        return sorted([name for name in candidates if matches(name)])
+
+    def top(self, k, by='strength', lowest=False, alive=None, variety=None, reach=None):
+        """Returns the entities with the highest (or lowest) strength or life.
+
+        Parameters
+        ----------
+        k: number of entities (int)
+        by: 'strength' or 'life' (str)
+        lowest: True for the lowest values instead of the highest (bool)
+        alive: True for living entities only, False for dead ones only, None for both (bool)
+        variety: only entities of that variety (str)
+        reach: only entities of that reach (str)
+
+        Returns
+        -------
+        names: names of the k entities, best first, in (value, name) order (list)
+
+        Raises
+        ------
+        ValueError: if by is neither 'strength' nor 'life'
+
+        """
+
+        if by not in _STATS:
+            raise ValueError('cannot sort by %s' % by)
+
+        pairs = self.by_life if by == 'life' else self.by_strength
+        ordered = iter(pairs) if lowest else reversed(pairs)
+        if alive is None and variety is None and reach is None:
+            return [name for value, name in itertools.islice(ordered, k)]
+
+        max_life = 0 if alive is False else None
+        matches = _matcher(self.section, alive, variety, reach, None, max_life, None, None)
+        candidates = self._candidates(alive, variety, reach, None, max_life, None, None)
+        if len(candidates) * 8 < len(pairs):
+            # Few candidates: sorting them is cheaper than walking the sorted pairs
+            field = _STATS[by]
+            selected = [(self.section[name][field], name) for name in candidates if matches(name)]
+            best = heapq.nsmallest(k, selected) if lowest else heapq.nlargest(k, selected)
+            return [name for value, name in best]
+
+        names = []
+        for value, name in ordered:
+            if len(names) == k:
+                break
+            if matches(name):
+                names.append(name)
+
+        return names
+
+
+def _matcher(section, alive, variety, reach, min_life, max_life, min_strength, max_strength):
+    """Returns a function telling whether the entity of a name matches a query (see EntityIndex.find)."""
+
+    # Compared with the stored codes
+    variety = gaming_storage.encode_variety(variety) if variety is not None else None
+    reach = gaming_storage.encode_reach(reach) if reach is not None else None
+
+    def matches(name):
+        entity = section[name]
+        life, strength = entity[_LIFE], entity[_STRENGTH]
+        return ((alive is None or (life > 0) == alive)
+                and (variety is None or entity[_VARIETY] == variety)
+                and (reach is None or entity[_REACH] == reach)
+                and (min_life is None or life >= min_life) and (max_life is None or life <= max_life)
+                and (min_strength is None or strength >= min_strength)
+                and (max_strength is None or strength <= max_strength))
+
+    return matches
+
+
+class RosterIndex(object):
+    """Indexes of the characters and creatures of a game database.
+
+    Attributes
+    ----------
+    characters: indexes of the characters (EntityIndex)
+    creatures: indexes of the creatures (EntityIndex)
+
+    """
+
+    def __init__(self, game_db):
+        """Indexes a game database.
+
+        Parameters
+        ----------
+        game_db: contains all game information, read again by the queries (dict)
+
+        """
+
+        self.characters = EntityIndex(game_db['characters'])
+        self.creatures = EntityIndex(game_db['creatures'])
+
+    def apply(self, record):
+        """Applies a modification record to the indexes.
+
+        Parameters
+        ----------
+        record: name of the gaming_tools function followed by its arguments (tuple)
+
+        Notes
+        -----
+        The record must be applied to the indexes before the database,
+        whose values it replaces are read from it.  Records which change no
+        character or creature are ignored.
+
+        """
+
+        name = record[0]
+
+        if name in gaming_storage._RECORD_FIELDS:
+            section, field = gaming_storage._RECORD_FIELDS[name]
+            getattr(self, section).update(record[1], field, record[2])
+        elif name == 'add_new_character':
+            self.characters.add(*record[1:])
+        elif name == 'add_creature':
+            self.creatures.add(record[1], None, *record[2:])
+        elif name == 'remove_creature':
+            self.creatures.remove(record[1])
+        elif name == 'remove_character':
+            self.characters.remove(record[1])
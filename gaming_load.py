@@ -0,0 +1,291 @@
+"""This module measures how many requests per second a game server (see
+gaming_server) answers, compared with clients playing on the game file
+directly:
+
+    python gaming_load.py --requests 20000 --clients 4 --pipeline 64
+
+Both paths play the same requests on a copy of the same game, stored in a
+temporary directory: attacks of immortal characters on immortal creatures,
+character_info and money, so that nothing changes but lives.  The server
+runs in its own process; file clients are threads of this process, each
+with its own session, coordinating through the game file and its lock."""
+
+
+import argparse, json, os, shutil, subprocess, sys, tempfile, threading, time
+
+import gaming_API_gr_16, gaming_client, gaming_output, gaming_random, gaming_storage, gaming_tools
+
+
+# Stats of the roster, so that nobody dies while timed
+_IMMORTAL_LIFE = 10 ** 9
+
+
+def _populate(path, storage, size):
+    """Creates the game played by the load.
+
+    Parameters
+    ----------
+    path: path of the game database (str)
+    storage: storage backend of the game (str)
+    size: number of characters, and of creatures (int)
+
+    """
+
+    session = gaming_tools.GameSession(gaming_storage.open_backend(storage, path))
+    try:
+        with gaming_tools.use_session(session):
+            with gaming_tools.batch():
+                for index in range(size):
+                    # Long reach characters attacking short reach creatures are never hit back
+                    gaming_tools.add_new_character('Hero%d' % index, 'elf', 'long', 1, _IMMORTAL_LIFE)
+                    gaming_tools.add_creature('Python#%05d' % index, 'short', 1, _IMMORTAL_LIFE)
+    finally:
+        session.backend.close()
+
+
+def _requests(nb_requests, size, client):
+    """Returns the requests of a client.
+
+    Parameters
+    ----------
+    nb_requests: number of requests (int)
+    size: number of characters, and of creatures (int)
+    client: index of the client (int)
+
+    Returns
+    -------
+    requests: action name followed by its arguments, per request (list of tuples)
+
+    """
+
+    requests = []
+    for index in range(nb_requests):
+        member = (client * nb_requests + index) % size
+        kind = index % 4
+        if kind < 2:
+            requests.append(('attack', 'Hero%d' % member, 'Python#%05d' % member))
+        elif kind == 2:
+            requests.append(('character_info', 'Hero%d' % member))
+        else:
+            requests.append(('money',))
+
+    return requests
+
+
+def _run_clients(nb_requests, clients, play):
+    """Shares requests among client threads and times them.
+
+    Parameters
+    ----------
+    nb_requests: total number of requests (int)
+    clients: number of client threads (int)
+    play: function playing the requests of a client, given its index and requests (function)
+
+    Returns
+    -------
+    elapsed: time until every client is done, in seconds (float)
+
+    """
+
+    shares = [nb_requests // clients + (client < nb_requests % clients) for client in range(clients)]
+    errors = []
+
+    def run(client, share):
+        try:
+            play(client, share)
+        except BaseException as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=run, args=(client, share)) for client, share in enumerate(shares)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if errors:
+        raise errors[0]
+
+    return elapsed
+
+
+def run_file_load(directory, nb_requests, clients=4, size=1000, storage='binary'):
+    """Plays requests on the game file directly, as clients without a server do.
+
+    Parameters
+    ----------
+    directory: directory of the game (str)
+    nb_requests: total number of requests (int)
+    clients: number of client threads, each with its own session (int)
+    size: number of characters, and of creatures (int)
+    storage: storage backend of the game (str)
+
+    Returns
+    -------
+    stats: number of requests, time and requests per second (dict)
+
+    """
+
+    path = os.path.join(directory, 'file-' + gaming_storage.BACKENDS[storage].default_path)
+    _populate(path, storage, size)
+
+    def play(client, share):
+        session = gaming_tools.GameSession(gaming_storage.open_backend(storage, path),
+                                           gaming_random.GameRandom(client))
+        try:
+            # Sinks are chosen per thread, like sessions
+            with gaming_tools.use_session(session), gaming_output.use_sink(gaming_output.NullSink()):
+                for request in _requests(share, size, client):
+                    getattr(gaming_API_gr_16, request[0])(*request[1:])
+        finally:
+            session.backend.close()
+
+    elapsed = _run_clients(nb_requests, clients, play)
+
+    return {'path': 'file', 'requests': nb_requests, 'clients': clients, 'time': elapsed,
+            'requests_per_sec': nb_requests / elapsed}
+
+
+def _start_server(directory, path, storage):
+    """Starts a game server in another process.
+
+    Parameters
+    ----------
+    directory: directory of the game (str)
+    path: path of the game database (str)
+    storage: storage backend of the game (str)
+
+    Returns
+    -------
+    server: process of the server and its address (tuple)
+
+    """
+
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gaming_server.py'),
+               '--storage', storage, '--path', path]
+    if hasattr(gaming_client.socket, 'AF_UNIX'):
+        command.extend(['--socket', os.path.join(directory, 'game.sock')])
+
+    process = subprocess.Popen(command, cwd=directory, stdout=subprocess.PIPE)
+    line = process.stdout.readline()
+    if not line:
+        process.wait()
+        raise RuntimeError('game server did not start')
+    address = json.loads(line.decode('utf-8'))['address']
+
+    return process, address if isinstance(address, str) else tuple(address)
+
+
+def run_server_load(directory, nb_requests, clients=4, pipeline=64, size=1000, storage='binary'):
+    """Plays requests through a game server.
+
+    Parameters
+    ----------
+    directory: directory of the game (str)
+    nb_requests: total number of requests (int)
+    clients: number of client threads, sharing a pool of as many connections (int)
+    pipeline: number of requests sent at once by a client, 1 to wait for each answer (int)
+    size: number of characters, and of creatures (int)
+    storage: storage backend of the game (str)
+
+    Returns
+    -------
+    stats: number of requests, time, requests per second and number of requests
+           sent at once (dict)
+
+    """
+
+    path = os.path.join(directory, 'server%d-%s' % (pipeline, gaming_storage.BACKENDS[storage].default_path))
+    _populate(path, storage, size)
+    process, address = _start_server(directory, path, storage)
+    client = gaming_client.GameClient(address, pool_size=clients)
+
+    def play(index, share):
+        requests = _requests(share, size, index)
+        for start in range(0, len(requests), pipeline):
+            client.call_many(requests[start:start + pipeline])
+
+    try:
+        elapsed = _run_clients(nb_requests, clients, play)
+    finally:
+        client.close()
+        process.terminate()
+        process.wait()
+
+    return {'path': 'server', 'requests': nb_requests, 'clients': clients, 'pipeline': pipeline, 'time': elapsed,
+            'requests_per_sec': nb_requests / elapsed}
+
+
+def compare(nb_requests, clients=4, pipelines=(1, 64), size=1000, storage='binary'):
+    """Compares the requests per second of the game file and of a game server.
+
+    Parameters
+    ----------
+    nb_requests: total number of requests of each run (int)
+    clients: number of client threads (int)
+    pipelines: numbers of requests sent at once to the server, one run each (list)
+    size: number of characters, and of creatures (int)
+    storage: storage backend of the games (str)
+
+    Returns
+    -------
+    results: stats of the file run, then of each server run, with its speedup
+             over the file run (list of dicts)
+
+    Raises
+    ------
+    ValueError: if the storage backend does not store games in files
+
+    """
+
+    if gaming_storage.BACKENDS[storage].default_path is None:
+        raise ValueError('storage %s does not store games in files' % storage)
+
+    directory = tempfile.mkdtemp(prefix='gaming_load')
+    try:
+        results = [run_file_load(directory, nb_requests, clients, size, storage)]
+        for pipeline in pipelines:
+            stats = run_server_load(directory, nb_requests, clients, pipeline, size, storage)
+            stats['speedup'] = stats['requests_per_sec'] / results[0]['requests_per_sec']
+            results.append(stats)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return results
+
+
+def main(argv=None):
+    """Runs the comparison from the command line and writes its JSON report.
+
+    Parameters
+    ----------
+    argv: command line arguments, sys.argv[1:] if None (list)
+
+    """
+
+    parser = argparse.ArgumentParser(description='Compare a game server with clients playing on the game file.')
+    parser.add_argument('--requests', type=int, default=10000, help='number of requests of each run')
+    parser.add_argument('--clients', type=int, default=4, help='number of client threads')
+    parser.add_argument('--pipeline', type=int, action='append',
+                        help='number of requests sent at once to the server (repeatable, 1 and 64 by default)')
+    parser.add_argument('--size', type=int, default=1000, help='number of characters, and of creatures')
+    parser.add_argument('--storage', default='binary',
+                        choices=sorted([name for name, backend_class in gaming_storage.BACKENDS.items()
+                                        if backend_class.default_path is not None]))
+    parser.add_argument('--output', help='file to write the JSON report to, stdout by default')
+    args = parser.parse_args(argv)
+
+    report = {'storage': args.storage, 'size': args.size,
+              'results': compare(args.requests, args.clients, args.pipeline or [1, 64], args.size, args.storage)}
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
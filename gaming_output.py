@@ -0,0 +1,320 @@
+"""This module implements the output of the gaming API.  API actions
+report what happens as events, sent to a sink which prints them by
+default, and return an ActionResult summing them up."""
+
+
+import contextlib, sys, threading
+
+
+class Event(object):
+    """Something which happened during an API action.
+
+    The message is only formatted when a sink needs it.
+
+    """
+
+    __slots__ = ('action', 'code', 'template', 'args')
+
+    def __init__(self, action, code, template, args=()):
+        """Creates an event.
+
+        Parameters
+        ----------
+        action: name of the API action (str)
+        code: what happened, e.g. 'damage_dealt' or 'out_of_reach' (str)
+        template: message, with % placeholders for args (str)
+        args: values of the message (tuple)
+
+        """
+
+        self.action = action
+        self.code = code
+        self.template = template
+        self.args = args
+
+    @property
+    def message(self):
+        """Message shown to the players (str)."""
+
+        if self.args:
+            return self.template % self.args
+
+        return self.template
+
+    def to_dict(self):
+        """Returns the event as a dict.
+
+        Returns
+        -------
+        event: action, code, message and args of the event (dict)
+
+        """
+
+        return {'action': self.action, 'code': self.code, 'message': self.message, 'args': list(self.args)}
+
+    @classmethod
+    def from_dict(cls, event):
+        """Creates an event from the dict given by to_dict.
+
+        Parameters
+        ----------
+        event: action, code and message of the event (dict)
+
+        Returns
+        -------
+        event: the event, whose template is the formatted message, without args (Event)
+
+        """
+
+        return cls(event['action'], event['code'], event['message'])
+
+    def __repr__(self):
+        return 'Event(%r, %r, %r)' % (self.action, self.code, self.message)
+
+
+class ActionResult(object):
+    """What an API action did.
+
+    Attributes
+    ----------
+    action: name of the action (str)
+    error: code of the error which prevented the action, None if it succeeded (str)
+    damage: life removed from the creature (int)
+    damage_taken: life removed from the attacker (int)
+    killed: True if the creature was killed (bool)
+    died: True if the attacker was killed (bool)
+    reward: money earned by the team (int)
+    cost: money spent by the team (int)
+    life: new life of the character concerned, None if unchanged (int)
+    events: events of the action, in order (list)
+
+    Actions may add other attributes (e.g. strength for evolute).
+
+    """
+
+    def __init__(self, action, **details):
+        """Creates the result of an action which did nothing yet.
+
+        Parameters
+        ----------
+        action: name of the action (str)
+        details: other attributes of the result
+
+        """
+
+        self.action = action
+        self.error = None
+        self.damage = 0
+        self.damage_taken = 0
+        self.killed = False
+        self.died = False
+        self.reward = 0
+        self.cost = 0
+        self.life = None
+        self.events = []
+        self.__dict__.update(details)
+
+    @property
+    def ok(self):
+        """True if the action succeeded (bool)."""
+
+        return self.error is None
+
+    def to_dict(self):
+        """Returns the result as a dict.
+
+        Returns
+        -------
+        result: attributes of the result, events as dicts (dict)
+
+        """
+
+        result = dict(self.__dict__)
+        result['events'] = [event.to_dict() for event in self.events]
+
+        return result
+
+    @classmethod
+    def from_dict(cls, result):
+        """Creates a result from the dict given by to_dict, e.g. received from a server.
+
+        Parameters
+        ----------
+        result: attributes of the result, events as dicts (dict)
+
+        Returns
+        -------
+        result: the result (ActionResult)
+
+        """
+
+        details = dict(result)
+        events = [Event.from_dict(event) for event in details.pop('events', ())]
+        action_result = cls(details.pop('action'), **details)
+        action_result.events = events
+
+        return action_result
+
+    def __repr__(self):
+        details = ', '.join(['%s=%r' % (name, value) for name, value in sorted(self.__dict__.items())
+                             if name not in ('action', 'events')])
+
+        return 'ActionResult(%r, %s)' % (self.action, details)
+
+
+# === sinks ===
+class PrintSink(object):
+    """Prints the message of each event (default)."""
+
+    def __init__(self, stream=None):
+        """Creates a sink printing to a stream.
+
+        Parameters
+        ----------
+        stream: where to print, the current sys.stdout if None (file)
+
+        """
+
+        self.stream = stream
+
+    def emit(self, event):
+        print(event.message, file=self.stream if self.stream is not None else sys.stdout)
+
+
+class NullSink(object):
+    """Drops every event."""
+
+    def emit(self, event):
+        pass
+
+
+class ListSink(object):
+    """Keeps every event in a list."""
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+class LoggingSink(object):
+    """Sends each event to a logger."""
+
+    def __init__(self, logger=None, level=None):
+        """Creates a sink logging events.
+
+        Parameters
+        ----------
+        logger: logger to use, the 'gaming' logger if None (logging.Logger)
+        level: level of the log records, logging.INFO if None (int)
+
+        """
+
+        # Imported here: logging is slow to import and most games do not log
+        import logging
+
+        self.logger = logger if logger is not None else logging.getLogger('gaming')
+        self.level = level if level is not None else logging.INFO
+
+    def emit(self, event):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, event.template, *event.args, extra={'action': event.action,
+                                                                             'code': event.code})
+
+
+class JsonLinesSink(object):
+    """Writes each event as a JSON object on its own line."""
+
+    def __init__(self, stream):
+        """Creates a sink writing JSON lines.
+
+        Parameters
+        ----------
+        stream: text file to write to (file)
+
+        """
+
+        import json
+
+        self.stream = stream
+        self._dumps = json.dumps
+
+    def emit(self, event):
+        self.stream.write(self._dumps(event.to_dict()) + '\n')
+
+
+_sink = PrintSink()
+
+# Sink chosen with use_sink, per thread
+_current = threading.local()
+
+
+def get_sink():
+    """Returns where events are sent.
+
+    Returns
+    -------
+    sink: sink chosen with use_sink in the current thread, the default one otherwise
+          (object with an emit(event) method)
+
+    """
+
+    sink = getattr(_current, 'sink', None)
+
+    return sink if sink is not None else _sink
+
+
+def set_sink(sink):
+    """Changes where events are sent by default, in every thread.
+
+    Parameters
+    ----------
+    sink: new sink (object with an emit(event) method)
+
+    Returns
+    -------
+    previous: previous sink (object with an emit(event) method)
+
+    """
+
+    global _sink
+
+    previous = _sink
+    _sink = sink
+
+    return previous
+
+
+@contextlib.contextmanager
+def use_sink(sink):
+    """Sends events to another sink in a with statement.
+
+    Parameters
+    ----------
+    sink: sink to use (object with an emit(event) method)
+
+    Notes
+    -----
+    Only the current thread sends its events to the sink: other threads keep theirs.
+
+    """
+
+    previous = getattr(_current, 'sink', None)
+    _current.sink = sink
+    try:
+        yield sink
+    finally:
+        _current.sink = previous
+
+
+def emit(event):
+    """Sends an event to the current sink.
+
+    Parameters
+    ----------
+    event: event to send (Event)
+
+    """
+
+    get_sink().emit(event)
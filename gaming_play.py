@@ -0,0 +1,94 @@
+"""This module plays whole games with gaming_API_gr_16 on the current
+session: a party of characters faces creatures one after the other,
+following a policy.  gaming_simulator plays the same games with NumPy
+arrays and gaming_tournament compares parties on them.
+
+It does not require NumPy."""
+
+
+import gaming_API_gr_16, gaming_rules, gaming_tools
+
+
+POLICIES = ('attack', 'support', 'evolve')
+
+# Outcome of a game
+RUNNING, WON, LOST, STALLED = 0, 1, 2, 3
+
+# A healer only heals a character whose life is below this
+HEAL_BELOW = 10
+
+
+def play_game(party, policy='attack', nb_waves=10, max_turns=50, api=gaming_API_gr_16):
+    """Plays one game with gaming_API_gr_16 on the current session.
+
+    Parameters
+    ----------
+    party: variety of each character (list)
+    policy: 'attack', 'support' or 'evolve' (str)
+    nb_waves: number of creatures to defeat (int)
+    max_turns: number of turns after which the game is stalled (int)
+    api: module, or object, whose create_character, create_creature, evolute,
+         attack and launch_spell functions play the game (module)
+
+    Returns
+    -------
+    result: outcome, money, nb_defeated, lives and strengths at the end (tuple)
+
+    Notes
+    -----
+    The game must be empty.  The characters are named after their variety
+    and position in the party.  At each turn, they act in the party order.
+    With 'attack', they all attack the creature.  With 'support', a
+    character with the heal spell (healer) heals the weakest living
+    character when its life is below HEAL_BELOW, one with the resurrect
+    spell (necromancer) resurrects the first dead character when the team
+    can pay, and they attack otherwise.  With 'evolve', every character
+    evolutes before each wave when the team can pay, then all attack.
+    Other spells are never used.
+
+    """
+
+    tools = gaming_tools
+    names = ['%s%d' % (variety, member) for member, variety in enumerate(party)]
+
+    for member, variety in enumerate(party):
+        api.create_character(names[member], variety)
+
+    outcome = RUNNING
+    for wave in range(nb_waves):
+        if policy == 'evolve':
+            for member in range(len(party)):
+                api.evolute(names[member])
+
+        creature = api.create_creature().name
+
+        for turn in range(max_turns):
+            if not tools.creature_exists(creature):
+                break
+            for member, variety in enumerate(party):
+                if not tools.creature_exists(creature):
+                    break
+                lives = [tools.get_character_life(name) for name in names]
+                alive = [life for life in lives if life > 0]
+                rules = gaming_rules.RULES[variety]
+                if policy == 'support' and rules.spell == 'heal' and alive and min(alive) < HEAL_BELOW \
+                        and lives[member] > 0 and tools.get_team_money() >= rules.cost:
+                    api.launch_spell(names[member], names[lives.index(min(alive))])
+                elif policy == 'support' and rules.spell == 'resurrect' and len(alive) < len(lives) \
+                        and lives[member] > 0 and tools.get_team_money() >= rules.cost:
+                    api.launch_spell(names[member], names[[life <= 0 for life in lives].index(True)])
+                else:
+                    api.attack(names[member], creature)
+            if all([tools.get_character_life(name) <= 0 for name in names]):
+                outcome = LOST
+                break
+
+        if outcome == RUNNING and tools.creature_exists(creature):
+            outcome = STALLED
+        if outcome != RUNNING:
+            break
+
+    return (outcome if outcome != RUNNING else WON,
+            tools.get_team_money(), tools.get_nb_defeated(),
+            [tools.get_character_life(name) for name in names],
+            [tools.get_character_strength(name) for name in names])
@@ -0,0 +1,288 @@
+"""This module profiles the gaming API.  While a Profiler is enabled, the
+public functions of gaming_tools and gaming_API_gr_16, _load_game_db and
+_dump_game_db are replaced by wrappers which count their calls, wall time
+and bytes read and written by the storage backend:
+
+    with Profiler() as profiler:
+        attack('Bob', creature_name)
+    profiler.write_json('profile.json')
+
+Calls made during an API action are attributed to the outermost API
+function running (attack, launch_spell, ...).  Disabled, the original
+functions are put back, so profiling costs nothing."""
+
+
+import functools, json, sys, threading, time
+
+import gaming_API_gr_16, gaming_tools
+
+
+_IO_FUNCTIONS = ('_load_game_db', '_dump_game_db')
+
+# Functions returning a context manager: timing them would only time its creation
+_NOT_PROFILED = ('batch', 'get_session', 'use_session', 'use_sink')
+
+
+def _public_functions(module):
+    """Returns the public functions defined in a module.
+
+    Parameters
+    ----------
+    module: module to look into (module)
+
+    Returns
+    -------
+    functions: functions by name (dict)
+
+    """
+
+    functions = {}
+    for name, value in vars(module).items():
+        if (not name.startswith('_') and callable(value) and getattr(value, '__module__', None) == module.__name__
+                and not isinstance(value, type) and name not in _NOT_PROFILED):
+            functions[name] = value
+
+    return functions
+
+
+class Profiler(object):
+    """Counts calls, wall time and bytes read and written of the gaming API.
+
+    Statistics are kept per (caller, function), where caller is the
+    outermost gaming_API_gr_16 function running ('' outside of them).
+
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._patched = []
+
+    @property
+    def enabled(self):
+        """True while the API is profiled (bool)."""
+
+        return bool(self._patched)
+
+    def enable(self):
+        """Starts profiling the API.
+
+        Notes
+        -----
+        Functions are replaced in every loaded module which imported them,
+        so that 'from gaming_API_gr_16 import *' is profiled too.
+
+        """
+
+        if self._patched:
+            return
+
+        originals = {}
+        for name, function in _public_functions(gaming_tools).items():
+            originals[function] = self._wrap(name, function, False)
+        for name, function in _public_functions(gaming_API_gr_16).items():
+            originals[function] = self._wrap(name, function, True)
+        for name in _IO_FUNCTIONS:
+            function = getattr(gaming_tools, name)
+            originals[function] = self._wrap(name, function, False)
+
+        for module in list(sys.modules.values()):
+            namespace = getattr(module, '__dict__', None)
+            if namespace is None:
+                continue
+            for name, value in list(namespace.items()):
+                try:
+                    wrapper = originals.get(value)
+                except TypeError:
+                    continue
+                if wrapper is not None:
+                    namespace[name] = wrapper
+                    self._patched.append((namespace, name, value))
+
+    def disable(self):
+        """Stops profiling the API, putting back the original functions."""
+
+        for namespace, name, function in reversed(self._patched):
+            namespace[name] = function
+        self._patched = []
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def _wrap(self, name, function, top_level):
+        """Returns a wrapper profiling a function.
+
+        Parameters
+        ----------
+        name: name of the function (str)
+        function: function to profile (function)
+        top_level: True for API functions, to which nested calls are attributed (bool)
+
+        Returns
+        -------
+        wrapper: profiled function (function)
+
+        """
+
+        local = self._local
+        measure_io = name in _IO_FUNCTIONS
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            caller = getattr(local, 'caller', '')
+            if top_level and not caller:
+                local.caller = name
+            if measure_io:
+                backend = gaming_tools.get_session().backend
+                read, written = backend.bytes_read, backend.bytes_written
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                local.caller = caller
+                if measure_io:
+                    self._record(caller, name, elapsed, backend.bytes_read - read, backend.bytes_written - written)
+                else:
+                    self._record(caller, name, elapsed, 0, 0)
+
+        return wrapper
+
+    def _record(self, caller, name, elapsed, bytes_read, bytes_written):
+        """Adds a call to the statistics.
+
+        Parameters
+        ----------
+        caller: outermost API function running, '' if none (str)
+        name: name of the called function (str)
+        elapsed: wall time of the call, in seconds (float)
+        bytes_read: bytes read by the storage backend during the call (int)
+        bytes_written: bytes written by the storage backend during the call (int)
+
+        """
+
+        with self._lock:
+            stats = self._stats.get((caller, name))
+            if stats is None:
+                stats = self._stats[(caller, name)] = [0, 0.0, 0.0, 0, 0]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            stats[3] += bytes_read
+            stats[4] += bytes_written
+
+    def reset(self):
+        """Forgets the statistics gathered so far."""
+
+        with self._lock:
+            self._stats = {}
+
+    def snapshot(self):
+        """Returns the statistics gathered so far.
+
+        Returns
+        -------
+        snapshot: 'functions' gives, for each function, its calls, total_time, mean_time and
+                  max_time (in seconds), bytes_read and bytes_written; 'callers' gives the
+                  same per API function and called function (dict)
+
+        """
+
+        with self._lock:
+            items = [(key, list(stats)) for key, stats in self._stats.items()]
+
+        functions = {}
+        callers = {}
+        for (caller, name), (calls, total, longest, read, written) in sorted(items):
+            callers.setdefault(caller, {})[name] = self._describe(calls, total, longest, read, written)
+
+            total_stats = functions.setdefault(name, [0, 0.0, 0.0, 0, 0])
+            total_stats[0] += calls
+            total_stats[1] += total
+            total_stats[2] = max(total_stats[2], longest)
+            total_stats[3] += read
+            total_stats[4] += written
+
+        return {'functions': dict([(name, self._describe(*stats)) for name, stats in functions.items()]),
+                'callers': callers}
+
+    def _describe(self, calls, total, longest, read, written):
+        """Returns the statistics of a function as a dict.
+
+        Parameters
+        ----------
+        calls: number of calls (int)
+        total: cumulative wall time, in seconds (float)
+        longest: longest call, in seconds (float)
+        read: bytes read (int)
+        written: bytes written (int)
+
+        Returns
+        -------
+        stats: the statistics, with the mean wall time per call (dict)
+
+        """
+
+        return {'calls': calls, 'total_time': total, 'mean_time': total / calls, 'max_time': longest,
+                'bytes_read': read, 'bytes_written': written}
+
+    def to_json(self):
+        """Returns the statistics as JSON (str)."""
+
+        return json.dumps(self.snapshot(), indent=1, sort_keys=True)
+
+    def to_prometheus(self):
+        """Returns the statistics in the Prometheus text format.
+
+        Returns
+        -------
+        text: one sample per metric, caller and function (str)
+
+        """
+
+        metrics = (('gaming_calls_total', 'calls', 'Calls of the function.'),
+                   ('gaming_seconds_total', 'total_time', 'Cumulative wall time of the function.'),
+                   ('gaming_seconds_max', 'max_time', 'Longest call of the function.'),
+                   ('gaming_bytes_read_total', 'bytes_read', 'Bytes read by the storage backend.'),
+                   ('gaming_bytes_written_total', 'bytes_written', 'Bytes written by the storage backend.'))
+        callers = self.snapshot()['callers']
+
+        lines = []
+        for metric, field, description in metrics:
+            lines.append('# HELP %s %s' % (metric, description))
+            lines.append('# TYPE %s %s' % (metric, 'gauge' if metric.endswith('_max') else 'counter'))
+            for caller in sorted(callers):
+                for name in sorted(callers[caller]):
+                    lines.append('%s{caller="%s",function="%s"} %r' % (metric, caller, name,
+                                                                       callers[caller][name][field]))
+
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        """Writes the statistics to a JSON file.
+
+        Parameters
+        ----------
+        path: path of the file (str)
+
+        """
+
+        with open(path, 'w') as fd:
+            fd.write(self.to_json())
+
+    def write_prometheus(self, path):
+        """Writes the statistics to a file in the Prometheus text format.
+
+        Parameters
+        ----------
+        path: path of the file (str)
+
+        """
+
+        with open(path, 'w') as fd:
+            fd.write(self.to_prometheus())
@@ -0,0 +1,192 @@
+"""This module draws the random values of the gaming API.  Each game
+session has its own source of random values, which can be seeded, saved
+and replaced, so that games do not share the global random state:
+
+    gaming_tools.set_rng(GameRandom(42))
+
+NumpyRandom draws values in blocks from a NumPy Generator, for long runs
+and simulations, and whole arrays of them with draw_array(); NumPy is only
+needed to use it."""
+
+
+import random
+
+
+class GameRandom(object):
+    """Random values of a game, drawn from its own random.Random.
+
+    Instances can be pickled with the game; get_state() also gives a state
+    which set_state() restores, to continue the same sequence later.
+
+    """
+
+    def __init__(self, seed=None):
+        """Creates a source of random values.
+
+        Parameters
+        ----------
+        seed: seed of the values, from the operating system if None (int or str)
+
+        """
+
+        self._random = random.Random(seed)
+
+    def seed(self, seed=None):
+        """Restarts the values from a seed.
+
+        Parameters
+        ----------
+        seed: seed of the values, from the operating system if None (int or str)
+
+        """
+
+        self._random.seed(seed)
+
+    def randint(self, a, b):
+        """Returns a random integer between a and b, both included (int)."""
+
+        return self._random.randint(a, b)
+
+    def chance(self, percent):
+        """Returns True with a probability of exactly percent / 100.
+
+        Parameters
+        ----------
+        percent: chance of success, from 0 to 100 (int)
+
+        Returns
+        -------
+        lucky: True in percent draws out of 100 (bool)
+
+        """
+
+        return self.randint(0, 99) < percent
+
+    def draw(self, a, b, size):
+        """Returns many random integers between a and b, both included.
+
+        Parameters
+        ----------
+        a: lowest value (int)
+        b: highest value (int)
+        size: number of values (int)
+
+        Returns
+        -------
+        values: the values (list)
+
+        """
+
+        return [self._random.randint(a, b) for i in range(size)]
+
+    def get_state(self):
+        """Returns the state of the values.
+
+        Returns
+        -------
+        state: what set_state needs to continue the values from here (object)
+
+        """
+
+        return self._random.getstate()
+
+    def set_state(self, state):
+        """Continues the values from a state.
+
+        Parameters
+        ----------
+        state: state given by get_state (object)
+
+        """
+
+        self._random.setstate(state)
+
+
+class NumpyRandom(GameRandom):
+    """Random values of a game, drawn in blocks from a NumPy Generator.
+
+    Values of each range are drawn block_size at a time and handed out
+    one by one, which is much faster than a draw per value.  Sequences
+    differ from GameRandom ones for the same seed.
+
+    """
+
+    def __init__(self, seed=None, block_size=1024, generator=None):
+        """Creates a source of random values.
+
+        Parameters
+        ----------
+        seed: seed of the values, from the operating system if None (int)
+        block_size: number of values drawn at once for each range (int)
+        generator: generator to draw from, numpy.random.default_rng(seed) if None (numpy.random.Generator)
+
+        Raises
+        ------
+        ImportError: if NumPy is not installed
+
+        """
+
+        import numpy
+
+        self.block_size = block_size
+        self.generator = generator if generator is not None else numpy.random.default_rng(seed)
+        # (a, b) -> [values, index of the next one]
+        self._blocks = {}
+
+    def seed(self, seed=None):
+        import numpy
+
+        self.generator = numpy.random.default_rng(seed)
+        self._blocks = {}
+
+    def randint(self, a, b):
+        block = self._blocks.get((a, b))
+        if block is None or block[1] == len(block[0]):
+            block = self._blocks[a, b] = [self.generator.integers(a, b + 1, size=self.block_size).tolist(), 0]
+
+        value = block[0][block[1]]
+        block[1] += 1
+
+        return value
+
+    def draw(self, a, b, size):
+        """Returns many random integers between a and b, both included.
+
+        Parameters
+        ----------
+        a: lowest value (int)
+        b: highest value (int)
+        size: number of values (int)
+
+        Returns
+        -------
+        values: the values, as GameRandom.draw gives them (list)
+
+        """
+
+        return self.generator.integers(a, b + 1, size=size).tolist()
+
+    def draw_array(self, low, high, shape):
+        """Returns an array of random integers, for computations on whole arrays.
+
+        Parameters
+        ----------
+        low: lowest value, or lowest value of each element (int or numpy array)
+        high: highest value, or highest value of each element (int or numpy array)
+        shape: shape of the array (tuple)
+
+        Returns
+        -------
+        values: the values (numpy array)
+
+        """
+
+        return self.generator.integers(low, high + 1, size=shape)
+
+    def get_state(self):
+        return {'generator': self.generator.bit_generator.state,
+                'blocks': dict([(key, list(block)) for key, block in self._blocks.items()])}
+
+    def set_state(self, state):
+        self.generator.bit_generator.state = state['generator']
+        self._blocks = dict([(key, list(block)) for key, block in state['blocks'].items()])
@@ -0,0 +1,199 @@
+"""This module holds the rules of the varieties of characters: the ranges
+of their life and strength, their reach and their spell.  The table is
+built once, at import, and looked up by variety name:
+
+    rules = RULES['healer']
+    rules.spell, rules.cost, rules.target        # 'heal', 5, 'character'
+
+Other varieties can be added with add_variety(), or described in a JSON
+file named by the GAMING_RULES environment variable:
+
+    {"paladin": {"life": [20, 30], "strength": [5, 10], "reach": "short", "spell": "heal", "cost": 10}}
+
+Varieties use one of the spells of SPELLS, whose effects are implemented
+by gaming_API_gr_16."""
+
+
+import os
+
+import gaming_storage
+
+
+REACHES = gaming_storage.REACHES
+
+# Spell name -> kind of target ('character' or 'creature')
+SPELLS = {'heal': 'character', 'halve': 'creature', 'resurrect': 'character'}
+
+
+class Variety(object):
+    """Rules of a variety of characters.
+
+    Attributes
+    ----------
+    name: name of the variety (str)
+    life: lowest and highest life of a new character (tuple)
+    strength: lowest and highest strength of a new character (tuple)
+    reach: 'short' or 'long' (str)
+    spell: name of the spell in SPELLS, None if the variety has none (str)
+    cost: money paid by the team for each spell (int)
+    target: 'character' or 'creature', the kind of target of the spell, None without a spell (str)
+
+    """
+
+    __slots__ = ('name', 'life', 'strength', 'reach', 'spell', 'cost', 'target')
+
+    def __init__(self, name, life, strength, reach, spell=None, cost=0):
+        """Creates the rules of a variety.
+
+        Parameters
+        ----------
+        name: name of the variety (str)
+        life: lowest and highest life of a new character (tuple)
+        strength: lowest and highest strength of a new character (tuple)
+        reach: 'short' or 'long' (str)
+        spell: name of the spell in SPELLS, None for no spell (str)
+        cost: money paid by the team for each spell (int)
+
+        Raises
+        ------
+        ValueError: if a range, the reach, the spell or the cost is not valid
+
+        """
+
+        life, strength = tuple(life), tuple(strength)
+        for stat in (life, strength):
+            if len(stat) != 2 or not 0 <= stat[0] <= stat[1]:
+                raise ValueError('range %s of variety %s is not valid' % (stat, name))
+        if reach not in REACHES:
+            raise ValueError('reach %s is not valid' % reach)
+        if spell is not None and spell not in SPELLS:
+            raise ValueError('spell %s is not valid' % spell)
+        if cost < 0:
+            raise ValueError('spell cost cannot be negative (cost = %d)' % cost)
+
+        self.name = name
+        self.life = life
+        self.strength = strength
+        self.reach = reach
+        self.spell = spell
+        self.cost = cost
+        self.target = SPELLS[spell] if spell is not None else None
+
+    def __repr__(self):
+        return 'Variety(%r, life=%r, strength=%r, reach=%r, spell=%r, cost=%r)' % (
+            self.name, self.life, self.strength, self.reach, self.spell, self.cost)
+
+
+# Variety name -> rules
+RULES = {}
+
+# Money earned for the n-th creature defeated: KILL_REWARD + KILL_BONUS * n
+KILL_REWARD = 40
+KILL_BONUS = 10
+
+
+def add_variety(name, life, strength, reach, spell=None, cost=0):
+    """Adds a variety of characters, or replaces its rules.
+
+    Parameters
+    ----------
+    name: name of the variety (str)
+    life: lowest and highest life of a new character (tuple)
+    strength: lowest and highest strength of a new character (tuple)
+    reach: 'short' or 'long' (str)
+    spell: name of the spell in SPELLS, None for no spell (str)
+    cost: money paid by the team for each spell (int)
+
+    Returns
+    -------
+    rules: rules of the variety (Variety)
+
+    Raises
+    ------
+    ValueError: if a range, the reach, the spell or the cost is not valid
+
+    """
+
+    rules = RULES[name] = Variety(name, life, strength, reach, spell, cost)
+
+    return rules
+
+
+def get_variety(name):
+    """Returns the rules of a variety.
+
+    Parameters
+    ----------
+    name: name of the variety (str)
+
+    Returns
+    -------
+    rules: rules of the variety, None if it does not exist (Variety)
+
+    """
+
+    return RULES.get(name)
+
+
+def kill_reward(nb_defeated):
+    """Returns the money earned by the team for a creature.
+
+    Parameters
+    ----------
+    nb_defeated: number of creatures defeated, this one included (int or numpy array)
+
+    Returns
+    -------
+    reward: money earned (int or numpy array)
+
+    """
+
+    return KILL_REWARD + KILL_BONUS * nb_defeated
+
+
+# Arguments of add_variety which a rules file may give, and those it must give
+_RULES_KEYS = ('life', 'strength', 'reach', 'spell', 'cost')
+_REQUIRED_RULES_KEYS = ('life', 'strength', 'reach')
+
+
+def load_rules(path):
+    """Adds the varieties described in a JSON file.
+
+    Parameters
+    ----------
+    path: path of the file, an object giving the arguments of add_variety by variety name (str)
+
+    Raises
+    ------
+    ValueError: if the file or a variety is not valid, or a variety has unknown or missing keys
+
+    """
+
+    import json
+
+    with open(path) as rules_file:
+        varieties = json.load(rules_file)
+
+    if not isinstance(varieties, dict):
+        raise ValueError('rules of %s are not an object' % path)
+    for name, rules in varieties.items():
+        if not isinstance(rules, dict):
+            raise ValueError('rules of variety %s are not an object' % name)
+        unknown = sorted(set(rules) - set(_RULES_KEYS))
+        if unknown:
+            raise ValueError('unknown rules %s for variety %s' % (', '.join(unknown), name))
+        missing = [key for key in _REQUIRED_RULES_KEYS if key not in rules]
+        if missing:
+            raise ValueError('missing rules %s for variety %s' % (', '.join(missing), name))
+
+        add_variety(name, **rules)
+
+
+add_variety('dwarf', (10, 50), (10, 50), 'short')
+add_variety('elf', (15, 25), (15, 25), 'long')
+add_variety('healer', (5, 15), (5, 15), 'short', 'heal', 5)
+add_variety('wizard', (5, 15), (5, 15), 'long', 'halve', 20)
+add_variety('necromancer', (5, 15), (5, 15), 'short', 'resurrect', 75)
+
+if os.environ.get('GAMING_RULES'):
+    load_rules(os.environ['GAMING_RULES'])
@@ -0,0 +1,267 @@
+"""This module serves a game to other processes over a local socket.  The
+server owns the game: it is kept in memory (see gaming_async.AsyncGame)
+and written to disk in the background, once for all the requests which
+arrived in the meantime, instead of being loaded and written by each
+client:
+
+    python gaming_server.py --socket game.sock
+
+Clients (see gaming_client) send one JSON object per line, and receive
+one line per request, in order:
+
+    {"id": 1, "action": "attack", "args": ["Bob", "Python#123"]}
+    {"id": 1, "result": {"action": "attack", "damage": 12, ...}}
+
+    {"id": 2, "action": "fly", "args": []}
+    {"id": 2, "error": "unknown action fly"}
+
+Requests received together (sent without waiting for the previous
+answers) are run together and answered with a single write."""
+
+
+import argparse, asyncio, json, os, signal, socket, stat, sys
+
+import gaming_API_gr_16, gaming_async, gaming_client, gaming_output, gaming_storage, gaming_tools
+
+
+# Longest request accepted, in bytes
+MAX_REQUEST_SIZE = 1 << 20
+
+_READ_SIZE = 1 << 16
+
+
+def run_request(request):
+    """Runs a request on the current game.
+
+    Parameters
+    ----------
+    request: decoded request, None if it was not valid JSON (dict)
+
+    Returns
+    -------
+    response: ID of the request, and what the action returned or why the request was refused (dict)
+
+    Notes
+    -----
+    A request failing halfway leaves the game as it was before it.
+
+    """
+
+    if not isinstance(request, dict):
+        return {'id': None, 'error': 'request is not a JSON object'}
+
+    request_id = request.get('id')
+    action = request.get('action')
+    args = request.get('args', [])
+    if action not in gaming_client.ACTIONS:
+        return {'id': request_id, 'error': 'unknown action %s' % (action,)}
+    if not isinstance(args, list) or len(args) != gaming_client.ACTIONS[action]:
+        return {'id': request_id, 'error': '%s takes %d arguments' % (action, gaming_client.ACTIONS[action])}
+
+    try:
+        # Rolled back alone if it fails, since the game is only written after many requests
+        with gaming_tools.batch():
+            result = getattr(gaming_API_gr_16, action)(*args)
+    except (TypeError, ValueError) as error:
+        return {'id': request_id, 'error': str(error)}
+
+    # changes_since returns the changes themselves
+    if isinstance(result, gaming_output.ActionResult):
+        result = result.to_dict()
+
+    return {'id': request_id, 'result': result}
+
+
+def run_requests(requests):
+    """Runs requests on the current game, in order, as one batch.
+
+    Parameters
+    ----------
+    requests: decoded requests (list)
+
+    Returns
+    -------
+    responses: response of each request (list of dicts)
+
+    """
+
+    with gaming_tools.batch():
+        return [run_request(request) for request in requests]
+
+
+class GameServer(object):
+    """Server of a game on a Unix socket or a TCP socket.
+
+    Events of the actions are not shown by the server: they are sent to
+    the clients with the results.  Use serve() to run a server from a
+    script, or start() and close() in an event loop.
+
+    """
+
+    def __init__(self, game=None):
+        """Creates a server.
+
+        Parameters
+        ----------
+        game: game to serve, the game of the current directory if None (gaming_async.AsyncGame)
+
+        """
+
+        self.game = game if game is not None else gaming_async.AsyncGame()
+        self.nb_connections = 0
+        self.nb_requests = 0
+        self.address = None
+        self._server = None
+        self._writers = set()
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        """Starts accepting clients.
+
+        Parameters
+        ----------
+        path: path of the Unix socket, None for a TCP socket (str)
+        host: address of the TCP socket (str)
+        port: port of the TCP socket, 0 for any free port (int)
+
+        Returns
+        -------
+        address: path of the Unix socket, or host and port of the TCP socket (str or tuple)
+
+        """
+
+        # Before accepting clients, so that the first ones do not wait for it
+        await self.game.load()
+        if path is not None:
+            # Left behind by a server which did not stop cleanly
+            if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+                os.remove(path)
+            self._server = await asyncio.start_unix_server(self._serve_client, path)
+            self.address = path
+        else:
+            self._server = await asyncio.start_server(self._serve_client, host, port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+
+        return self.address
+
+    async def _serve_client(self, reader, writer):
+        """Answers the requests of a client until it disconnects."""
+
+        self.nb_connections += 1
+        self._writers.add(writer)
+        sock = writer.get_extra_info('socket')
+        if sock is not None and sock.family != getattr(socket, 'AF_UNIX', None):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        pending = b''
+        try:
+            while True:
+                data = await reader.read(_READ_SIZE)
+                if not data:
+                    break
+
+                lines = (pending + data).split(b'\n')
+                pending = lines.pop()
+                if len(pending) > MAX_REQUEST_SIZE:
+                    writer.write(gaming_client.encode_message({'id': None, 'error': 'request is too long'}))
+                    break
+
+                requests = [gaming_client.decode_message(line) for line in lines if line.strip()]
+                if requests:
+                    responses = await self.game.run(run_requests, requests)
+                    self.nb_requests += len(requests)
+                    writer.write(b''.join([gaming_client.encode_message(response) for response in responses]))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def close(self):
+        """Stops accepting clients, then writes and closes the game."""
+
+        if self._server is not None:
+            self._server.close()
+            # Clients keeping their connection open in a pool are disconnected
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.remove(self.address)
+        await self.game.close()
+
+
+def serve(path=None, host='127.0.0.1', port=0, backend=None, max_delay=0.0, ready=None):
+    """Serves a game until interrupted (Ctrl+C, SIGINT or SIGTERM).
+
+    Parameters
+    ----------
+    path: path of the Unix socket, None for a TCP socket (str)
+    host: address of the TCP socket (str)
+    port: port of the TCP socket, 0 for any free port (int)
+    backend: storage of the game, chosen by gaming_storage.open_backend() if None (StorageBackend)
+    max_delay: time to wait for more requests before writing the game, in seconds (float)
+    ready: function called with the address of the server once clients can connect (function)
+
+    """
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = GameServer(gaming_async.AsyncGame(backend, max_delay))
+
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, loop.stop)
+        except (NotImplementedError, RuntimeError):
+            # Not on Windows, nor outside the main thread: Ctrl+C then raises KeyboardInterrupt
+            pass
+
+    with gaming_output.use_sink(gaming_output.NullSink()):
+        try:
+            address = loop.run_until_complete(server.start(path, host, port))
+            if ready is not None:
+                ready(address)
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            loop.run_until_complete(server.close())
+            loop.close()
+
+
+def main(argv=None):
+    """Runs a game server from the command line.
+
+    Parameters
+    ----------
+    argv: command line arguments, sys.argv[1:] if None (list)
+
+    Notes
+    -----
+    Once clients can connect, the address of the server is written on the
+    standard output as a JSON line, e.g. {"address": "game.sock"}.
+
+    """
+
+    parser = argparse.ArgumentParser(description='Serve a game to local clients.')
+    parser.add_argument('--socket', help='path of the Unix socket to listen on')
+    parser.add_argument('--host', default='127.0.0.1', help='address of the TCP socket, without --socket')
+    parser.add_argument('--port', type=int, default=0, help='port of the TCP socket, any free port by default')
+    parser.add_argument('--storage', choices=sorted(gaming_storage.BACKENDS),
+                        help='storage backend of the game, from GAMING_STORAGE by default')
+    parser.add_argument('--path', help='path of the game database, the default one of the backend by default')
+    parser.add_argument('--max-delay', type=float, default=0.0,
+                        help='seconds to wait for more requests before writing the game')
+    args = parser.parse_args(argv)
+
+    def ready(address):
+        json.dump({'address': address}, sys.stdout)
+        sys.stdout.write('\n')
+        sys.stdout.flush()
+
+    serve(args.socket, args.host, args.port, gaming_storage.open_backend(args.storage, args.path), args.max_delay,
+          ready)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,454 @@
+"""This module simulates many independent games at once to balance the
+varieties.  It applies the rules of gaming_API_gr_16 (creation, attack,
+spells, evolution and rewards) with NumPy arrays holding one row per
+game, instead of going through the game database.
+
+It requires NumPy."""
+
+
+import itertools
+
+import numpy as np
+
+import gaming_API_gr_16, gaming_output, gaming_play, gaming_random, gaming_rules, gaming_storage, gaming_tools
+
+
+# Policies, outcomes and games played with the API are those of gaming_play
+POLICIES = gaming_play.POLICIES
+RUNNING, WON, LOST, STALLED = gaming_play.RUNNING, gaming_play.WON, gaming_play.LOST, gaming_play.STALLED
+play_game = gaming_play.play_game
+
+
+def _draw_rolls(rng, n, party, nb_waves):
+    """Draws every random value the games may need.
+
+    Parameters
+    ----------
+    rng: source of the random values (gaming_random.NumpyRandom)
+    n: number of games (int)
+    party: variety of each character (list)
+    nb_waves: number of creatures per game (int)
+
+    Returns
+    -------
+    rolls: arrays of random values, by kind (dict)
+
+    Notes
+    -----
+    Values have the bounds used by gaming_API_gr_16 and are in the order
+    in which its functions draw them, so that a game can be replayed there.
+
+    """
+
+    # Life then strength, as drawn by create_character
+    ranges = np.array([[gaming_rules.RULES[variety].life, gaming_rules.RULES[variety].strength]
+                       for variety in party])
+    low = ranges[np.newaxis, :, :, 0]
+    high = ranges[np.newaxis, :, :, 1]
+
+    return {'characters': rng.draw_array(low, high, (n, len(party), 2)),
+            'creatures': np.stack([rng.draw_array(0, 1, (n, nb_waves)),
+                                   rng.draw_array(1, 10, (n, nb_waves)),
+                                   rng.draw_array(1, 10, (n, nb_waves))], axis=-1),
+            'evolutions': rng.draw_array(0, 99, (n, nb_waves, len(party), 2))}
+
+
+class BattleState(object):
+    """State of many independent games, one row per game.
+
+    Characters are (games x party) arrays and the current creature of
+    each game is a (games,) array.  Reach is stored as a bool (True for
+    long).
+
+    """
+
+    def __init__(self, n, party, rolls):
+        """Creates the party of each game.
+
+        Parameters
+        ----------
+        n: number of games (int)
+        party: variety of each character (list)
+        rolls: random values drawn by _draw_rolls (dict)
+
+        """
+
+        self.party = list(party)
+        self.reach_long = np.array([gaming_rules.RULES[variety].reach == 'long' for variety in party])
+
+        self.life = rolls['characters'][:, :, 0].astype(np.int64)
+        self.strength = rolls['characters'][:, :, 1].astype(np.int64)
+        self.deaths = np.zeros((n, len(party)), dtype=np.int64)
+
+        self.money = np.full(n, 50 * len(party), dtype=np.int64)
+        self.nb_defeated = np.zeros(n, dtype=np.int64)
+        self.outcome = np.full(n, RUNNING, dtype=np.int8)
+
+        self.creature_life = np.zeros(n, dtype=np.int64)
+        self.creature_strength = np.zeros(n, dtype=np.int64)
+        self.creature_long = np.zeros(n, dtype=bool)
+        self.creature_alive = np.zeros(n, dtype=bool)
+
+    def create_creatures(self, games, rolls):
+        """Creates a new creature in some games (see create_creature).
+
+        Parameters
+        ----------
+        games: games where a creature is created (numpy bool array)
+        rolls: reach, strength and life rolls of each game (numpy array)
+
+        """
+
+        self.creature_long = np.where(games, rolls[:, 0] == 1, self.creature_long)
+        self.creature_strength = np.where(games, rolls[:, 1] * (1 + self.nb_defeated), self.creature_strength)
+        self.creature_life = np.where(games, rolls[:, 2] * (1 + self.nb_defeated), self.creature_life)
+        self.creature_alive |= games
+
+    def attack(self, games, member):
+        """A character attacks the creature in some games (see attack).
+
+        Parameters
+        ----------
+        games: games where the character attacks (numpy bool array)
+        member: index of the character in the party (int)
+
+        """
+
+        attacking = games & (self.life[:, member] > 0) & self.creature_alive
+        attacking &= self.reach_long[member] | ~self.creature_long
+        strength = self.strength[:, member]
+
+        # Creature killed: +1 defeated, then reward for that many defeated
+        kill = attacking & (self.creature_life - strength <= 0)
+        self.nb_defeated += kill
+        self.money += np.where(kill, gaming_rules.kill_reward(self.nb_defeated), 0)
+        self.creature_alive &= ~kill
+
+        hit = attacking & ~kill
+        self.creature_life -= np.where(hit, strength, 0)
+
+        # The creature kills the attacker whatever its reach, but only hurts it if it reaches it
+        killed = hit & (self.life[:, member] - self.creature_strength <= 0)
+        self.life[killed, member] = 0
+        self.deaths[:, member] += killed
+        hurt = hit & ~killed & (self.creature_long | ~self.reach_long[member])
+        self.life[:, member] -= np.where(hurt, self.creature_strength, 0)
+
+    def heal(self, games, member):
+        """A healer heals the weakest living character if needed (see launch_spell).
+
+        Parameters
+        ----------
+        games: games where the healer may heal (numpy bool array)
+        member: index of the healer in the party (int)
+
+        Returns
+        -------
+        healed: games where the healer healed someone (numpy bool array)
+
+        """
+
+        lives = np.where(self.life > 0, self.life, np.iinfo(np.int64).max)
+        target = lives.argmin(axis=1)
+        rows = np.arange(len(target))
+
+        cost = gaming_rules.RULES[self.party[member]].cost
+        healed = games & (self.life[:, member] > 0) & (self.money >= cost)
+        healed &= lives[rows, target] < gaming_play.HEAL_BELOW
+        self.life[rows[healed], target[healed]] += 10
+        self.money -= np.where(healed, cost, 0)
+
+        return healed
+
+    def resurrect(self, games, member):
+        """A necromancer resurrects the first dead character if any (see launch_spell).
+
+        Parameters
+        ----------
+        games: games where the necromancer may resurrect (numpy bool array)
+        member: index of the necromancer in the party (int)
+
+        Returns
+        -------
+        resurrected: games where the necromancer resurrected someone (numpy bool array)
+
+        """
+
+        dead = self.life <= 0
+        target = dead.argmax(axis=1)
+        rows = np.arange(len(target))
+
+        cost = gaming_rules.RULES[self.party[member]].cost
+        resurrected = games & (self.life[:, member] > 0) & (self.money >= cost) & dead.any(axis=1)
+        self.life[rows[resurrected], target[resurrected]] = 10
+        self.money -= np.where(resurrected, cost, 0)
+
+        return resurrected
+
+    def evolute(self, games, member, rolls):
+        """A character evolutes if the team can pay for it (see evolute).
+
+        Parameters
+        ----------
+        games: games where the character evolutes (numpy bool array)
+        member: index of the character in the party (int)
+        rolls: strength and life luck rolls of each game, between 0 and 99 (numpy array)
+
+        """
+
+        evolving = games & (self.life[:, member] > 0) & (self.money >= 4)
+        self.money -= np.where(evolving, 4, 0)
+        self.strength[:, member] += np.where(evolving & (rolls[:, 0] < 25), 4, 0)
+        self.life[:, member] += np.where(evolving & (rolls[:, 1] < 50), 2, 0)
+
+
+def run_battles(n, party, policy='attack', seed=None, nb_waves=10, max_turns=50):
+    """Plays many independent games at once.
+
+    Parameters
+    ----------
+    n: number of games (int)
+    party: variety of each character, e.g. ['dwarf', 'dwarf', 'healer'] (list)
+    policy: 'attack', 'support' or 'evolve' (str)
+    seed: seed of the random generator (int)
+    nb_waves: number of creatures to defeat, one after the other (int)
+    max_turns: number of turns after which a creature which cannot be defeated stalls the game (int)
+
+    Returns
+    -------
+    state: final state of the games (BattleState)
+    money_curve: mean team money after each wave (numpy array)
+
+    Raises
+    ------
+    ValueError: if a variety or the policy is not valid
+
+    Notes
+    -----
+    At each turn, the characters act in the party order.  With 'attack',
+    they all attack the creature.  With 'support', a character with the
+    heal spell (healer) heals the weakest living character when its life
+    is below 10, one with the resurrect spell (necromancer) resurrects the
+    first dead character when the team can pay, and they attack otherwise.
+    With 'evolve', every character evolutes before each wave when the team
+    can pay, then all attack.  Other spells are never used.  These are the
+    games of gaming_play.play_game.
+
+    """
+
+    for variety in party:
+        if variety not in gaming_rules.RULES:
+            raise ValueError('variety %s is not valid' % variety)
+    if policy not in POLICIES:
+        raise ValueError('policy %s is not valid' % policy)
+
+    rolls = _draw_rolls(gaming_random.NumpyRandom(seed), n, party, nb_waves)
+    state = BattleState(n, party, rolls)
+    money_curve = np.zeros(nb_waves)
+
+    for wave in range(nb_waves):
+        running = state.outcome == RUNNING
+
+        if policy == 'evolve':
+            for member in range(len(party)):
+                state.evolute(running, member, rolls['evolutions'][:, wave, member])
+
+        state.create_creatures(running, rolls['creatures'][:, wave])
+
+        for turn in range(max_turns):
+            fighting = state.creature_alive & (state.outcome == RUNNING)
+            if not fighting.any():
+                break
+
+            for member, variety in enumerate(party):
+                acting = fighting & state.creature_alive
+                spell = gaming_rules.RULES[variety].spell
+                if policy == 'support' and spell == 'heal':
+                    acting &= ~state.heal(acting, member)
+                elif policy == 'support' and spell == 'resurrect':
+                    acting &= ~state.resurrect(acting, member)
+                state.attack(acting, member)
+
+            state.outcome[fighting & (state.life <= 0).all(axis=1)] = LOST
+
+        state.outcome[state.creature_alive & (state.outcome == RUNNING)] = STALLED
+        money_curve[wave] = state.money.mean()
+
+    state.outcome[state.outcome == RUNNING] = WON
+
+    return state, money_curve
+
+
+def simulate_battles(n, party, policy='attack', seed=None, nb_waves=10, max_turns=50):
+    """Plays many independent games at once and sums their results up.
+
+    Parameters
+    ----------
+    n: number of games (int)
+    party: variety of each character, e.g. ['dwarf', 'dwarf', 'healer'] (list)
+    policy: 'attack', 'support' or 'evolve' (str)
+    seed: seed of the random generator (int)
+    nb_waves: number of creatures to defeat, one after the other (int)
+    max_turns: number of turns after which a creature which cannot be defeated stalls the game (int)
+
+    Returns
+    -------
+    stats: win, loss and stall rates, mean money after each wave, mean number
+           of defeated creatures and deaths per variety (dict)
+
+    Raises
+    ------
+    ValueError: if a variety or the policy is not valid
+
+    Notes
+    -----
+    See run_battles for the rules of the games.
+
+    """
+
+    state, money_curve = run_battles(n, party, policy, seed, nb_waves, max_turns)
+
+    deaths = dict([(variety, 0) for variety in party])
+    for member, variety in enumerate(party):
+        deaths[variety] += int(state.deaths[:, member].sum())
+
+    return {'games': n,
+            'win_rate': float(np.mean(state.outcome == WON)),
+            'loss_rate': float(np.mean(state.outcome == LOST)),
+            'stall_rate': float(np.mean(state.outcome == STALLED)),
+            'money_curve': money_curve.tolist(),
+            'mean_defeated': float(state.nb_defeated.mean()),
+            'deaths_per_variety': deaths}
+
+
+# === games played with gaming_API_gr_16 ===
+class _ReplayedRandom(gaming_random.GameRandom):
+    """Random values given back from values drawn beforehand, call by call (see _ReplayedAPI)."""
+
+    def __init__(self):
+        gaming_random.GameRandom.__init__(self)
+        # Values of the running call
+        self.values = []
+
+    def randint(self, a, b):
+        value = int(self.values.pop(0))
+        if not a <= value <= b:
+            raise ValueError('rolled %d out of [%d, %d]' % (value, a, b))
+        return value
+
+
+class _ReplayedNames(object):
+    """Creature names drawing no random value, so that replayed games only draw the simulated ones."""
+
+    def __init__(self):
+        self._indexes = itertools.count()
+
+    def allocate(self, game_db, rng):
+        return 'creature#%d' % next(self._indexes)
+
+
+class _ReplayedAPI(object):
+    """gaming_API_gr_16 functions giving the values drawn for a simulated game to the random ones."""
+
+    def __init__(self, rng, rolls, game):
+        """Prepares the values of each call.
+
+        Parameters
+        ----------
+        rng: random values of the session playing the game (_ReplayedRandom)
+        rolls: random values drawn by _draw_rolls (dict)
+        game: index of the game in rolls (int)
+
+        """
+
+        self.rng = rng
+        self._characters = iter(rolls['characters'][game])
+        self._creatures = iter(rolls['creatures'][game])
+        self._evolutions = iter(rolls['evolutions'][game].reshape(-1, 2))
+
+    def _replay(self, values, function, *args):
+        # Each call draws from its own values, unused ones being dropped
+        self.rng.values[:] = list(next(values))
+        try:
+            return function(*args)
+        finally:
+            del self.rng.values[:]
+
+    def create_character(self, name, variety):
+        return self._replay(self._characters, gaming_API_gr_16.create_character, name, variety)
+
+    def create_creature(self):
+        return self._replay(self._creatures, gaming_API_gr_16.create_creature)
+
+    def evolute(self, name):
+        return self._replay(self._evolutions, gaming_API_gr_16.evolute, name)
+
+    def __getattr__(self, name):
+        return getattr(gaming_API_gr_16, name)
+
+
+def _play_scalar(party, policy, rolls, game, nb_waves, max_turns):
+    """Plays one game with gaming_API_gr_16 on an in-memory database, replaying drawn values.
+
+    Parameters
+    ----------
+    party: variety of each character (list)
+    policy: 'attack', 'support' or 'evolve' (str)
+    rolls: random values drawn by _draw_rolls (dict)
+    game: index of the game in rolls (int)
+    nb_waves: number of creatures to defeat (int)
+    max_turns: number of turns after which the game is stalled (int)
+
+    Returns
+    -------
+    result: outcome, money, nb_defeated, lives and strengths at the end (tuple)
+
+    """
+
+    rng = _ReplayedRandom()
+    api = _ReplayedAPI(rng, rolls, game)
+    session = gaming_tools.GameSession(gaming_storage.MemoryBackend(), rng)
+    session.names = _ReplayedNames()
+    with gaming_tools.use_session(session), gaming_output.use_sink(gaming_output.NullSink()):
+        return play_game(party, policy, nb_waves, max_turns, api)
+
+
+def check_parity(n=100, party=('dwarf', 'elf', 'healer', 'necromancer'), policy='support', seed=0,
+                 nb_waves=10, max_turns=50):
+    """Checks that run_battles gives the same games as gaming_API_gr_16.
+
+    Parameters
+    ----------
+    n: number of games (int)
+    party: variety of each character (list)
+    policy: 'attack', 'support' or 'evolve' (str)
+    seed: seed of the random generator (int)
+    nb_waves: number of creatures to defeat (int)
+    max_turns: number of turns after which the game is stalled (int)
+
+    Raises
+    ------
+    AssertionError: if a game ends differently
+
+    Notes
+    -----
+    Each game is replayed with gaming_API_gr_16 on an in-memory database,
+    whose random values are the ones drawn for the simulation.
+
+    """
+
+    party = list(party)
+    state, money_curve = run_battles(n, party, policy, seed, nb_waves, max_turns)
+    rolls = _draw_rolls(gaming_random.NumpyRandom(seed), n, party, nb_waves)
+
+    for game in range(n):
+        expected = (int(state.outcome[game]), int(state.money[game]), int(state.nb_defeated[game]),
+                    state.life[game].tolist(), state.strength[game].tolist())
+        result = _play_scalar(party, policy, rolls, game, nb_waves, max_turns)
+        if result != expected:
+            raise AssertionError('game %d differs: simulated %s, played %s' % (game, expected, result))
+
+
+if __name__ == '__main__':
+    for party in (['dwarf', 'dwarf', 'healer'], ['elf', 'wizard', 'necromancer']):
+        print(party, simulate_battles(100000, party, 'support', seed=0))
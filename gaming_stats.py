@@ -0,0 +1,205 @@
+"""This module keeps aggregates of a game (number of living characters,
+total life, total strength...) so that dashboards can read them at once
+instead of loading every character and creature.
+
+TeamStats is built once from a game database, then kept up to date in
+constant time by applying the modification records of gaming_tools (see
+gaming_storage.apply_record), like the indexes of gaming_index."""
+
+
+import gaming_storage
+
+
+_STRENGTH, _LIFE = gaming_storage.STRENGTH, gaming_storage.LIFE
+
+
+class SectionStats(object):
+    """Aggregates of the characters or of the creatures of a game.
+
+    Attributes
+    ----------
+    count: number of entities (int)
+    nb_alive: number of entities whose life is positive (int)
+    total_life: sum of the lives of the entities (int)
+    total_strength: sum of the strengths of the entities (int)
+
+    """
+
+    __slots__ = ('count', 'nb_alive', 'total_life', 'total_strength')
+
+    def __init__(self, section=None):
+        """Computes the aggregates of a section of a game database.
+
+        Parameters
+        ----------
+        section: entities by name, as stored in game_db['characters'] or game_db['creatures'] (dict)
+
+        """
+
+        self.count = 0
+        self.nb_alive = 0
+        self.total_life = 0
+        self.total_strength = 0
+
+        if section:
+            for entity in section.values():
+                self.add(entity[_STRENGTH], entity[_LIFE])
+
+    def add(self, strength, life):
+        """Counts a new entity.
+
+        Parameters
+        ----------
+        strength: strength of the entity (int)
+        life: life of the entity (int)
+
+        """
+
+        self.count += 1
+        self.nb_alive += life > 0
+        self.total_life += life
+        self.total_strength += strength
+
+    def remove(self, strength, life):
+        """Forgets an entity.
+
+        Parameters
+        ----------
+        strength: strength of the entity (int)
+        life: life of the entity (int)
+
+        """
+
+        self.count -= 1
+        self.nb_alive -= life > 0
+        self.total_life -= life
+        self.total_strength -= strength
+
+    def set_strength(self, old, new):
+        """Changes the strength of an entity.
+
+        Parameters
+        ----------
+        old: strength before the change (int)
+        new: strength after the change (int)
+
+        """
+
+        self.total_strength += new - old
+
+    def set_life(self, old, new):
+        """Changes the life of an entity, which may die or come back to life.
+
+        Parameters
+        ----------
+        old: life before the change (int)
+        new: life after the change (int)
+
+        """
+
+        self.total_life += new - old
+        self.nb_alive += (new > 0) - (old > 0)
+
+
+class TeamStats(object):
+    """Aggregates of the characters and creatures of a game.
+
+    Attributes
+    ----------
+    characters: aggregates of the characters (SectionStats)
+    creatures: aggregates of the creatures (SectionStats)
+
+    """
+
+    def __init__(self, game_db):
+        """Computes the aggregates of a game database.
+
+        Parameters
+        ----------
+        game_db: contains all game information, read again by apply() (dict)
+
+        """
+
+        self.game_db = game_db
+        self.characters = SectionStats(game_db['characters'])
+        self.creatures = SectionStats(game_db['creatures'])
+
+    def apply(self, record):
+        """Applies a modification record to the aggregates.
+
+        Parameters
+        ----------
+        record: name of the gaming_tools function followed by its arguments (tuple)
+
+        Notes
+        -----
+        The record must be applied to the aggregates before the database,
+        whose values it replaces are read from it.  Records which change no
+        character or creature are ignored.
+
+        """
+
+        name = record[0]
+
+        if name in gaming_storage._RECORD_FIELDS:
+            section, field = gaming_storage._RECORD_FIELDS[name]
+            entity = self.game_db[section].get(record[1])
+            if entity is not None:
+                if field == _LIFE:
+                    getattr(self, section).set_life(entity[_LIFE], record[2])
+                else:
+                    getattr(self, section).set_strength(entity[_STRENGTH], record[2])
+        elif name == 'add_new_character':
+            self._remove('characters', record[1])
+            self.characters.add(record[4], record[5])
+        elif name == 'add_creature':
+            self._remove('creatures', record[1])
+            self.creatures.add(record[3], record[4])
+        elif name == 'remove_creature':
+            self._remove('creatures', record[1])
+        elif name == 'remove_character':
+            self._remove('characters', record[1])
+
+    def _remove(self, section, name):
+        """Forgets an entity of the database, if it exists."""
+
+        entity = self.game_db[section].get(name)
+        if entity is not None:
+            getattr(self, section).remove(entity[_STRENGTH], entity[_LIFE])
+
+    def summary(self, team_money, nb_defeated):
+        """Returns the aggregates with the counters of the team.
+
+        Parameters
+        ----------
+        team_money: money of the team (int)
+        nb_defeated: number of creatures defeated by the team (int)
+
+        Returns
+        -------
+        stats: counters of the team, numbers of characters (alive and dead) and
+               creatures, total and mean life and strength (dict)
+
+        """
+
+        characters, creatures = self.characters, self.creatures
+
+        return {'team_money': team_money,
+                'nb_defeated': nb_defeated,
+                'nb_characters': characters.count,
+                'nb_alive_characters': characters.nb_alive,
+                'nb_dead_characters': characters.count - characters.nb_alive,
+                'total_life': characters.total_life,
+                'total_strength': characters.total_strength,
+                'mean_character_life': _mean(characters.total_life, characters.count),
+                'mean_character_strength': _mean(characters.total_strength, characters.count),
+                'nb_creatures': creatures.count,
+                'total_creature_life': creatures.total_life,
+                'mean_creature_life': _mean(creatures.total_life, creatures.count),
+                'mean_creature_strength': _mean(creatures.total_strength, creatures.count)}
+
+
+def _mean(total, count):
+    """Returns total / count, 0.0 if count is 0 (float)."""
+
+    return total / count if count else 0.0
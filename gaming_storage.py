@@ -0,0 +1,1788 @@
+"""This module implements the storage backends of the game database.
+A backend knows how to load the whole database, write it back (or
+only what changed) and tell whether another process changed it.
+It should NOT be used outside of gaming_tools."""
+
+
+import array, itertools, operator, os, struct, sys, zlib
+
+# json, mmap, pickle, sqlite3 and tempfile are imported by the backends using them, so that
+# short-lived scripts only pay for the modules of their backend
+
+
+# Version of the layout of the game database, stored in it as 'version':
+# 1: characters and creatures are dicts of 'variety', 'reach', 'strength' and 'life'
+# 2: characters and creatures are lists [variety, reach, strength, life] of codes (see new_character)
+FORMAT_VERSION = 2
+
+# Small integer codes of the usual varieties and reaches (other values are stored as they are)
+VARIETIES = ('dwarf', 'elf', 'healer', 'wizard', 'necromancer')
+REACHES = ('short', 'long')
+_VARIETY_CODES = dict([(variety, code) for code, variety in enumerate(VARIETIES)])
+_REACH_CODES = dict([(reach, code) for code, reach in enumerate(REACHES)])
+
+
+# === entities ===
+# Characters and creatures are lists [variety, reach, strength, life] (variety
+# is None for creatures): lists of small integers are smaller in memory and
+# in the pickle than dicts, and unpickled just as fast.
+VARIETY, REACH, STRENGTH, LIFE = range(4)
+
+# Counters of the team, stored next to the characters and creatures
+COUNTERS = ('team_money', 'nb_defeated')
+
+
+def encode_variety(variety):
+    """Returns the code of a variety.
+
+    Parameters
+    ----------
+    variety: variety of a character (str)
+
+    Returns
+    -------
+    code: index in VARIETIES, the variety itself if it is not there (int)
+
+    """
+
+    return _VARIETY_CODES.get(variety, variety)
+
+
+def decode_variety(code):
+    """Returns the variety of a code.
+
+    Parameters
+    ----------
+    code: code of the variety (int)
+
+    Returns
+    -------
+    variety: variety of the character (str)
+
+    """
+
+    return VARIETIES[code] if code.__class__ is int else code
+
+
+def encode_reach(reach):
+    """Returns the code of a reach.
+
+    Parameters
+    ----------
+    reach: 'short' or 'long' (str)
+
+    Returns
+    -------
+    code: index in REACHES, the reach itself if it is not there (int)
+
+    """
+
+    return _REACH_CODES.get(reach, reach)
+
+
+def decode_reach(code):
+    """Returns the reach of a code.
+
+    Parameters
+    ----------
+    code: code of the reach (int)
+
+    Returns
+    -------
+    reach: 'short' or 'long' (str)
+
+    """
+
+    return REACHES[code] if code.__class__ is int else code
+
+
+def new_character(variety, reach, strength, life):
+    """Returns the record of a character.
+
+    Parameters
+    ----------
+    variety: variety of the character (str)
+    reach: reach of the character (str)
+    strength: strength of the character (int)
+    life: life of the character (int)
+
+    Returns
+    -------
+    character: [variety code, reach code, strength, life] (list)
+
+    """
+
+    return [encode_variety(variety), encode_reach(reach), strength, life]
+
+
+def new_creature(reach, strength, life):
+    """Returns the record of a creature.
+
+    Parameters
+    ----------
+    reach: reach of the creature (str)
+    strength: strength of the creature (int)
+    life: life of the creature (int)
+
+    Returns
+    -------
+    creature: [None, reach code, strength, life] (list)
+
+    """
+
+    return [None, encode_reach(reach), strength, life]
+
+
+def new_game_db():
+    """Returns an empty game database.
+
+    Returns
+    -------
+    game_db: contains all game information (dict)
+
+    """
+
+    return {'version': FORMAT_VERSION,
+            'creatures': {},
+            'characters': {},
+            'team_money': 0,
+            'nb_defeated': 0}
+
+
+def migrate(game_db):
+    """Converts a game database to the current layout.
+
+    Parameters
+    ----------
+    game_db: contains all game information, in any known layout (dict)
+
+    Returns
+    -------
+    game_db: the same database, in the FORMAT_VERSION layout (dict)
+
+    Raises
+    ------
+    IOError: if the database was written by a newer version of the game
+
+    """
+
+    version = game_db.get('version', 1)
+
+    if version > FORMAT_VERSION:
+        raise IOError('game database version %d is not supported (newer than %d)' % (version, FORMAT_VERSION))
+
+    if version == 1:
+        characters = game_db['characters']
+        for name, character in characters.items():
+            characters[name] = new_character(character['variety'], character['reach'], character['strength'],
+                                             character['life'])
+        creatures = game_db['creatures']
+        for name, creature in creatures.items():
+            creatures[name] = new_creature(creature['reach'], creature['strength'], creature['life'])
+        game_db['version'] = FORMAT_VERSION
+
+    return game_db
+
+
+# === modification records ===
+_RECORD_FIELDS = {'set_character_strength': ('characters', STRENGTH),
+                  'set_character_life': ('characters', LIFE),
+                  'set_creature_strength': ('creatures', STRENGTH),
+                  'set_creature_life': ('creatures', LIFE)}
+
+
+def apply_record(game_db, record):
+    """Applies a modification record to a game database.
+
+    Parameters
+    ----------
+    game_db: contains all game information (dict)
+    record: name of the gaming_tools function followed by its arguments (tuple)
+
+    Notes
+    -----
+    Records only hold final values, so applying them again is harmless.
+    Action records ('action', name, arguments...) only document which
+    API action caused the next records and change nothing, and
+    ('remove_character', name) records only undo add_new_character.
+
+    """
+
+    name = record[0]
+
+    if name in _RECORD_FIELDS:
+        section, field = _RECORD_FIELDS[name]
+        if record[1] in game_db[section]:
+            game_db[section][record[1]][field] = record[2]
+    elif name == 'add_new_character':
+        game_db['characters'][record[1]] = new_character(*record[2:])
+    elif name == 'add_creature':
+        game_db['creatures'][record[1]] = new_creature(*record[2:])
+    elif name == 'remove_creature':
+        game_db['creatures'].pop(record[1], None)
+    elif name == 'remove_character':
+        game_db['characters'].pop(record[1], None)
+    elif name == 'set_team_money':
+        game_db['team_money'] = record[1]
+    elif name == 'set_nb_defeated':
+        game_db['nb_defeated'] = record[1]
+    elif name != 'action':
+        raise ValueError('record %s is not valid' % name)
+
+
+def undo_record(game_db, record):
+    """Returns the record undoing a modification record.
+
+    Parameters
+    ----------
+    game_db: database the record is about to be applied to (dict)
+    record: name of the gaming_tools function followed by its arguments (tuple)
+
+    Returns
+    -------
+    undo: record giving back the current values of what record modifies (tuple)
+
+    """
+
+    name = record[0]
+
+    if name in _RECORD_FIELDS:
+        section, field = _RECORD_FIELDS[name]
+        entity = game_db[section].get(record[1])
+        return (name, record[1], entity[field] if entity is not None else None)
+    if name in ('add_new_character', 'remove_character'):
+        entity = game_db['characters'].get(record[1])
+        if entity is None:
+            return ('remove_character', record[1])
+        return ('add_new_character', record[1], decode_variety(entity[VARIETY]), decode_reach(entity[REACH]),
+                entity[STRENGTH], entity[LIFE])
+    if name in ('add_creature', 'remove_creature'):
+        entity = game_db['creatures'].get(record[1])
+        if entity is None:
+            return ('remove_creature', record[1])
+        return ('add_creature', record[1], decode_reach(entity[REACH]), entity[STRENGTH], entity[LIFE])
+    if name == 'set_team_money':
+        return (name, game_db['team_money'])
+    if name == 'set_nb_defeated':
+        return (name, game_db['nb_defeated'])
+
+    return record
+
+
+def replay(records, game_db=None):
+    """Rebuilds a game database from modification records.
+
+    Parameters
+    ----------
+    records: modification records, in order (iterable)
+    game_db: database to start from, an empty one if None (dict)
+
+    Returns
+    -------
+    game_db: contains all game information (dict)
+
+    """
+
+    if game_db is None:
+        game_db = new_game_db()
+
+    for record in records:
+        apply_record(game_db, record)
+
+    return game_db
+
+
+# === backend interface ===
+class StorageBackend(object):
+    """Storage of a game database.
+
+    Changes are given to dump() as a set of (section, key) pairs, where
+    section is 'characters', 'creatures' or a counter name ('team_money',
+    'nb_defeated') and key is the entity name (None for counters), and as
+    the list of modification records (see apply_record) in their order.
+    Backends may use them to write only what changed.
+
+    Backends count in bytes_read and bytes_written how much they read and
+    wrote, for profiling.
+
+    """
+
+    name = None
+    default_path = None
+    bytes_read = 0
+    bytes_written = 0
+
+    def __init__(self, path=None):
+        """Creates the backend of a database file.
+
+        Parameters
+        ----------
+        path: path of the database file, default_path if None (str)
+
+        """
+
+        self.path = path if path is not None else self.default_path
+
+    def signature(self):
+        """Returns what identifies the current version of the stored database.
+
+        Returns
+        -------
+        signature: changes whenever the database is modified by someone else (object)
+
+        """
+
+        raise NotImplementedError
+
+    def load(self):
+        """Loads the whole database.
+
+        Returns
+        -------
+        game_db: contains all game information (dict)
+
+        """
+
+        raise NotImplementedError
+
+    def load_counters(self):
+        """Loads the counters of the database, without its characters and creatures if possible.
+
+        Returns
+        -------
+        counters: value of each counter of COUNTERS (dict)
+
+        Notes
+        -----
+        Backends which cannot read the counters alone load the whole database.
+
+        """
+
+        game_db = self.load()
+
+        return dict([(counter, game_db[counter]) for counter in COUNTERS])
+
+    def can_store(self, name, variety=None):
+        """Tells whether an entity can be stored.
+
+        Parameters
+        ----------
+        name: name of the character or creature (str)
+        variety: variety of the character, None for a creature (str)
+
+        Returns
+        -------
+        result: True if the backend can store it, False otherwise (bool)
+
+        """
+
+        return True
+
+    def dump(self, game_db, changes=None, records=None):
+        """Writes the database.
+
+        Parameters
+        ----------
+        game_db: contains all game information (dict)
+        changes: (section, key) pairs modified since the last dump, None if unknown (set)
+        records: modification records since the last dump, None if unknown (list)
+
+        """
+
+        raise NotImplementedError
+
+    def remove(self):
+        """Removes the stored database."""
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        """Releases the resources held by the backend."""
+
+        pass
+
+
+def _file_signature(path):
+    """Returns what identifies the current version of a file.
+
+    Parameters
+    ----------
+    path: path of the file (str)
+
+    Returns
+    -------
+    signature: modification time, size and inode of the file, None if there is no file (tuple)
+
+    """
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _file_mode(path):
+    """Returns the permissions of a new version of a file.
+
+    Parameters
+    ----------
+    path: path of the file (str)
+
+    Returns
+    -------
+    mode: permissions of the current file, or those allowed by the umask if there is none (int)
+
+    """
+
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def _replace_file(path, data):
+    """Writes a file atomically.
+
+    Parameters
+    ----------
+    path: path of the file (str)
+    data: new content of the file (bytes)
+
+    Notes
+    -----
+    The data is written in a temporary file which then replaces the old
+    one, so that a crash never leaves a truncated file behind.  The file
+    keeps its permissions (temporary files are only readable by their owner).
+
+    """
+
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(prefix='.%s.' % os.path.basename(path), dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as fd:
+            if hasattr(os, 'fchmod'):
+                os.fchmod(fd.fileno(), _file_mode(path))
+            fd.write(data)
+            fd.flush()
+            os.fsync(fd.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+# === pickle backend ===
+class PickleBackend(StorageBackend):
+    """Whole database pickled in a single file (always rewritten).
+
+    Only use it on trusted files: unpickling can run any code.
+
+    """
+
+    name = 'pickle'
+    default_path = 'game.db'
+
+    def __init__(self, path=None, protocol=None):
+        """Creates the backend of a pickle file.
+
+        Parameters
+        ----------
+        path: path of the database file, default_path if None (str)
+        protocol: pickle protocol used to write the file, pickle.DEFAULT_PROTOCOL if None (int)
+
+        """
+
+        import pickle
+
+        StorageBackend.__init__(self, path)
+        self.protocol = protocol if protocol is not None else pickle.DEFAULT_PROTOCOL
+
+    def signature(self):
+        return _file_signature(self.path)
+
+    def load(self):
+        game_db = self.read()
+        if game_db is None:
+            return new_game_db()
+
+        return migrate(game_db)
+
+    def read(self):
+        """Unpickles the file as it is.
+
+        Returns
+        -------
+        content: pickled object, None if there is no file (object)
+
+        Raises
+        ------
+        IOError: if the file is corrupted
+
+        """
+
+        import pickle
+
+        try:
+            fd = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+
+        try:
+            game_db = pickle.load(fd)
+            self.bytes_read += fd.tell()
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as error:
+            raise IOError('game database %s is corrupted (%s)' % (self.path, error))
+        finally:
+            fd.close()
+
+        return game_db
+
+    def dump(self, game_db, changes=None, records=None):
+        import pickle
+
+        data = pickle.dumps(game_db, self.protocol)
+        _replace_file(self.path, data)
+        self.bytes_written += len(data)
+
+
+# === binary backend ===
+# Layout of a binary game database (little-endian):
+#   header         BINARY_HEADER
+#   characters     nb_characters x BINARY_CHARACTER (variety, reach, strength, life)
+#   creatures      nb_creatures x BINARY_CREATURE (reach, strength, life)
+# Codes are int16, strengths and lives int32.
+#   string table   nb_strings + 1 uint32 offsets, then the UTF-8 strings, each followed by a NUL
+# String i is the name of character i, then of creature i - nb_characters; the
+# strings after them are varieties and reaches which have no code, referred to
+# by a negative code (-1 for the first one).  The CRC32 covers everything
+# after the header.
+BINARY_MAGIC = b'GMDB'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sHHIqqIII')
+BINARY_CHARACTER = struct.Struct('<hhii')
+BINARY_CREATURE = struct.Struct('<hii')
+_OFFSETS_TYPE = 'I'
+
+
+class BinaryView(object):
+    """Read-only view of a binary game database.
+
+    Entities are unpacked from the buffer when they are asked for, so that
+    looking at a few of them does not decode the whole database.
+
+    """
+
+    def __init__(self, data):
+        """Creates a view of a binary game database.
+
+        Parameters
+        ----------
+        data: content of the file (bytes, bytearray, mmap or memoryview)
+
+        Raises
+        ------
+        IOError: if the data is not a valid binary game database
+
+        """
+
+        self.data = memoryview(data)
+        if len(self.data) < BINARY_HEADER.size:
+            raise IOError('binary game database is truncated')
+
+        (magic, version, flags, crc, self.team_money, self.nb_defeated,
+         self.nb_characters, self.nb_creatures, self.nb_strings) = BINARY_HEADER.unpack_from(self.data)
+
+        if magic != BINARY_MAGIC:
+            raise IOError('not a binary game database')
+        if version > BINARY_VERSION:
+            raise IOError('binary game database version %d is not supported (newer than %d)'
+                          % (version, BINARY_VERSION))
+        if zlib.crc32(self.data[BINARY_HEADER.size:]) != crc:
+            raise IOError('binary game database is corrupted (bad checksum)')
+
+        self.characters_offset = BINARY_HEADER.size
+        self.creatures_offset = self.characters_offset + self.nb_characters * BINARY_CHARACTER.size
+        strings_offset = self.creatures_offset + self.nb_creatures * BINARY_CREATURE.size
+        self._offsets = array.array(_OFFSETS_TYPE)
+        self._offsets.frombytes(self.data[strings_offset:strings_offset + (self.nb_strings + 1) * 4])
+        if sys.byteorder == 'big':
+            self._offsets.byteswap()
+        self._blob_offset = strings_offset + (self.nb_strings + 1) * 4
+
+    def string(self, index):
+        """Returns a string of the string table.
+
+        Parameters
+        ----------
+        index: index of the string (int)
+
+        Returns
+        -------
+        string: the string (str)
+
+        """
+
+        start = self._blob_offset + self._offsets[index]
+        end = self._blob_offset + self._offsets[index + 1] - 1
+
+        return str(self.data[start:end], 'utf-8')
+
+    def _decode(self, code, names):
+        """Returns the value of a variety or reach code."""
+
+        if code >= 0:
+            return names[code]
+
+        return self.string(self.nb_characters + self.nb_creatures - code - 1)
+
+    def character(self, index):
+        """Returns a character.
+
+        Parameters
+        ----------
+        index: index of the character in the file (int)
+
+        Returns
+        -------
+        character: name, variety, reach, strength and life of the character (tuple)
+
+        """
+
+        variety, reach, strength, life = BINARY_CHARACTER.unpack_from(
+            self.data, self.characters_offset + index * BINARY_CHARACTER.size)
+
+        return (self.string(index), self._decode(variety, VARIETIES), self._decode(reach, REACHES), strength, life)
+
+    def creature(self, index):
+        """Returns a creature.
+
+        Parameters
+        ----------
+        index: index of the creature in the file (int)
+
+        Returns
+        -------
+        creature: name, reach, strength and life of the creature (tuple)
+
+        """
+
+        reach, strength, life = BINARY_CREATURE.unpack_from(
+            self.data, self.creatures_offset + index * BINARY_CREATURE.size)
+
+        return (self.string(self.nb_characters + index), self._decode(reach, REACHES), strength, life)
+
+    def to_game_db(self):
+        """Decodes the whole database.
+
+        Returns
+        -------
+        game_db: contains all game information (dict)
+
+        """
+
+        game_db = new_game_db()
+        game_db['team_money'] = self.team_money
+        game_db['nb_defeated'] = self.nb_defeated
+
+        # Each string ends with a NUL, so the last item of the split is empty
+        strings = str(self.data[self._blob_offset:], 'utf-8').split('\0')[:-1]
+
+        nb_characters = self.nb_characters
+        extra = strings[nb_characters + self.nb_creatures:]
+
+        records = BINARY_CHARACTER.iter_unpack(self.data[self.characters_offset:self.creatures_offset])
+        game_db['characters'] = dict(zip(strings, [[variety, reach, strength, life]
+                                                   for variety, reach, strength, life in records]))
+        end = self.creatures_offset + self.nb_creatures * BINARY_CREATURE.size
+        records = BINARY_CREATURE.iter_unpack(self.data[self.creatures_offset:end])
+        game_db['creatures'] = dict(zip(strings[nb_characters:], [[None, reach, strength, life]
+                                                                  for reach, strength, life in records]))
+
+        if extra:
+            # Replaces the codes of the values without one
+            for section in ('characters', 'creatures'):
+                for entity in game_db[section].values():
+                    for field in (VARIETY, REACH):
+                        if entity[field].__class__ is int and entity[field] < 0:
+                            entity[field] = extra[-entity[field] - 1]
+
+        return game_db
+
+
+def encode_binary(game_db):
+    """Encodes a game database in the binary format.
+
+    Parameters
+    ----------
+    game_db: contains all game information (dict)
+
+    Returns
+    -------
+    data: content of the binary file (bytes)
+
+    Raises
+    ------
+    ValueError: if there are more than 32768 varieties and reaches without a code
+    ValueError: if a strength or a life does not fit in 32 bits
+    ValueError: if a name contains a NUL character
+
+    """
+
+    characters = game_db['characters']
+    creatures = game_db['creatures']
+    strings = list(characters) + list(creatures)
+    extra = {}
+
+    def code(value):
+        # Values without a code are stored in the string table
+        if value.__class__ is int:
+            return value
+        if value not in extra:
+            if len(extra) == 32768:
+                raise ValueError('too many varieties and reaches without a code')
+            extra[value] = -len(extra) - 1
+            strings.append(value)
+        return extra[value]
+
+    pack_character = BINARY_CHARACTER.pack
+    pack_creature = BINARY_CREATURE.pack
+    parts = []
+    try:
+        try:
+            # Usual case, where every variety and reach has a code: packed without Python loops
+            parts.append(b''.join(itertools.starmap(pack_character, characters.values())))
+            parts.append(b''.join(itertools.starmap(pack_creature, map(operator.itemgetter(REACH, STRENGTH, LIFE),
+                                                                       creatures.values()))))
+        except struct.error:
+            parts = [pack_character(code(variety), code(reach), strength, life)
+                     for variety, reach, strength, life in characters.values()]
+            parts.extend([pack_creature(code(reach), strength, life)
+                          for variety, reach, strength, life in creatures.values()])
+    except struct.error as error:
+        raise ValueError('game database cannot be encoded (%s)' % error)
+
+    text = '\0'.join(strings) + '\0' if strings else ''
+    table = text.encode('utf-8')
+    if table.count(b'\0') != len(strings):
+        raise ValueError('names cannot contain NUL characters')
+
+    # Offset of the end of string i: size of the strings up to it, plus i + 1 NULs
+    sizes = map(len, strings) if len(table) == len(text) else map(len, map(str.encode, strings))
+    offsets = array.array(_OFFSETS_TYPE, [0])
+    offsets.extend(map(operator.add, itertools.accumulate(sizes), itertools.count(1)))
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+    parts.append(offsets.tobytes())
+    parts.append(table)
+
+    body = b''.join(parts)
+    header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, zlib.crc32(body), game_db['team_money'],
+                                game_db['nb_defeated'], len(characters), len(creatures), len(strings))
+
+    return header + body
+
+
+class BinaryBackend(StorageBackend):
+    """Whole database in a single file of fixed-width records (always rewritten).
+
+    The format (see BINARY_HEADER) is versioned and checksummed, and, unlike
+    pickle, safe to load from untrusted storage.  Pickled databases are still
+    loaded, and written in the binary format the next time the game changes.
+
+    """
+
+    name = 'binary'
+    default_path = 'game.db'
+
+    def signature(self):
+        return _file_signature(self.path)
+
+    def load(self):
+        try:
+            fd = open(self.path, 'rb')
+        except FileNotFoundError:
+            return new_game_db()
+
+        with fd:
+            data = fd.read()
+        self.bytes_read += len(data)
+
+        if not data.startswith(BINARY_MAGIC):
+            # Pickled by an older version of the game
+            import pickle
+
+            try:
+                game_db = pickle.loads(data)
+            except (pickle.UnpicklingError, EOFError, AttributeError, ValueError, IndexError) as error:
+                raise IOError('game database %s is corrupted (%s)' % (self.path, error))
+            return migrate(game_db)
+
+        try:
+            return BinaryView(data).to_game_db()
+        except (IOError, struct.error, UnicodeDecodeError, IndexError) as error:
+            raise IOError('game database %s is corrupted (%s)' % (self.path, error))
+
+    def load_counters(self):
+        # Only the header is read: the checksum of the entities is checked by load()
+        try:
+            fd = open(self.path, 'rb')
+        except FileNotFoundError:
+            return StorageBackend.load_counters(self)
+
+        with fd:
+            header = fd.read(BINARY_HEADER.size)
+        self.bytes_read += len(header)
+
+        if len(header) < BINARY_HEADER.size or not header.startswith(BINARY_MAGIC):
+            # Pickled by an older version of the game, or truncated
+            return StorageBackend.load_counters(self)
+
+        magic, version, flags, crc, team_money, nb_defeated = BINARY_HEADER.unpack(header)[:6]
+        if version > BINARY_VERSION:
+            raise IOError('game database %s is corrupted (binary game database version %d is not supported)'
+                          % (self.path, version))
+
+        return {'team_money': team_money, 'nb_defeated': nb_defeated}
+
+    def dump(self, game_db, changes=None, records=None):
+        data = encode_binary(game_db)
+        _replace_file(self.path, data)
+        self.bytes_written += len(data)
+
+
+# === SQLite backend ===
+class SQLiteBackend(StorageBackend):
+    """Database stored in SQLite, with one row per character and creature.
+
+    Only the rows which changed are written, in a single transaction.  The
+    database uses write-ahead logging, so that readers of other processes
+    are never blocked by a writer.
+
+    """
+
+    name = 'sqlite'
+    default_path = 'game.sqlite'
+
+    _SCHEMA = ('CREATE TABLE IF NOT EXISTS characters (name TEXT PRIMARY KEY, variety TEXT NOT NULL, '
+               'reach TEXT NOT NULL, strength INTEGER NOT NULL, life INTEGER NOT NULL)',
+               'CREATE TABLE IF NOT EXISTS creatures (name TEXT PRIMARY KEY, '
+               'reach TEXT NOT NULL, strength INTEGER NOT NULL, life INTEGER NOT NULL)',
+               'CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+    _COUNTERS = COUNTERS
+
+    _SAVE_CHARACTER = 'INSERT OR REPLACE INTO characters VALUES (?, ?, ?, ?, ?)'
+    _SAVE_CREATURE = 'INSERT OR REPLACE INTO creatures VALUES (?, ?, ?, ?)'
+    _SAVE_COUNTER = 'INSERT OR REPLACE INTO counters VALUES (?, ?)'
+    _DELETE = {'characters': 'DELETE FROM characters WHERE name = ?',
+               'creatures': 'DELETE FROM creatures WHERE name = ?'}
+
+    # Size counted for an integer value in bytes_read and bytes_written
+    _INTEGER_SIZE = 8
+
+    def __init__(self, path=None):
+        StorageBackend.__init__(self, path)
+        self._connection = None
+
+    def _connect(self):
+        """Returns the connection to the database, opening it if needed.
+
+        Returns
+        -------
+        connection: connection to the database (sqlite3.Connection)
+
+        """
+
+        if self._connection is None:
+            import sqlite3
+
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                for statement in self._SCHEMA:
+                    connection.execute(statement)
+            self._connection = connection
+
+        return self._connection
+
+    def signature(self):
+        if not os.path.exists(self.path):
+            return None
+
+        # data_version only changes when another connection commits
+        return self._connect().execute('PRAGMA data_version').fetchone()[0]
+
+    def load(self):
+        connection = self._connect()
+        game_db = new_game_db()
+
+        for row in connection.execute('SELECT * FROM characters'):
+            game_db['characters'][row[0]] = new_character(*row[1:])
+            self.bytes_read += self._row_size(row)
+        for row in connection.execute('SELECT * FROM creatures'):
+            game_db['creatures'][row[0]] = new_creature(*row[1:])
+            self.bytes_read += self._row_size(row)
+        for row in connection.execute('SELECT * FROM counters'):
+            game_db[row[0]] = row[1]
+            self.bytes_read += self._row_size(row)
+
+        return game_db
+
+    def load_counters(self):
+        game_db = new_game_db()
+        counters = dict([(counter, game_db[counter]) for counter in COUNTERS])
+
+        for row in self._connect().execute('SELECT * FROM counters'):
+            counters[row[0]] = row[1]
+            self.bytes_read += self._row_size(row)
+
+        return counters
+
+    def _row_size(self, row):
+        """Returns the size of the values of a row.
+
+        Parameters
+        ----------
+        row: values of the row (tuple)
+
+        Returns
+        -------
+        size: UTF-8 length of the texts plus _INTEGER_SIZE per integer (int)
+
+        Notes
+        -----
+        This approximates what SQLite reads and writes, which also depends
+        on its pages and write-ahead log.
+
+        """
+
+        return sum([len(value.encode('utf-8')) if isinstance(value, str) else self._INTEGER_SIZE
+                    for value in row])
+
+    def dump(self, game_db, changes=None, records=None):
+        connection = self._connect()
+
+        if changes is None:
+            changes = set([('characters', name) for name in game_db['characters']] +
+                          [('creatures', name) for name in game_db['creatures']] +
+                          [(counter, None) for counter in self._COUNTERS])
+            full = True
+        else:
+            full = False
+
+        with connection:
+            if full:
+                connection.execute('DELETE FROM characters')
+                connection.execute('DELETE FROM creatures')
+
+            for section, key in changes:
+                if section == 'characters' and key in game_db['characters']:
+                    character = game_db['characters'][key]
+                    statement = self._SAVE_CHARACTER
+                    row = (key, decode_variety(character[VARIETY]), decode_reach(character[REACH]),
+                           character[STRENGTH], character[LIFE])
+                elif section == 'creatures' and key in game_db['creatures']:
+                    creature = game_db['creatures'][key]
+                    statement = self._SAVE_CREATURE
+                    row = (key, decode_reach(creature[REACH]), creature[STRENGTH], creature[LIFE])
+                elif section in self._DELETE:
+                    statement = self._DELETE[section]
+                    row = (key,)
+                else:
+                    statement = self._SAVE_COUNTER
+                    row = (section, game_db[section])
+                connection.execute(statement, row)
+                self.bytes_written += self._row_size(row)
+
+    def remove(self):
+        self.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+# === journal backend ===
+class JournalBackend(StorageBackend):
+    """Database stored as a snapshot followed by a journal of modifications.
+
+    Each dump appends the modification records to the journal, one JSON
+    list per line, so that its cost only depends on what changed.  Once
+    compact_every records were appended since the last snapshot, the
+    whole database is written to a new snapshot which remembers up to
+    where the journal is folded in it.  Loading reads the snapshot and
+    replays the rest of the journal.
+
+    The journal is never truncated: it is the complete history of the game,
+    including the API actions which caused each modification (see history).
+
+    """
+
+    name = 'journal'
+    default_path = 'game.journal'
+
+    def __init__(self, path=None, compact_every=10000):
+        """Creates the backend of a journal file.
+
+        Parameters
+        ----------
+        path: path of the journal file, the snapshot is path + '.snapshot' (str)
+        compact_every: number of records after which a new snapshot is written (int)
+
+        """
+
+        StorageBackend.__init__(self, path)
+        self.compact_every = compact_every
+        self.snapshot = PickleBackend(self.path + '.snapshot')
+        self._tail = 0
+
+    def signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return self.snapshot.signature()
+
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino, self.snapshot.signature())
+
+    def _read_snapshot(self):
+        """Returns the snapshot and the journal offset folded in it.
+
+        Returns
+        -------
+        game_db: contains all game information at the snapshot (dict)
+        offset: size of the journal folded in the snapshot (int)
+
+        """
+
+        snapshot = self.snapshot.read()
+        if snapshot is None:
+            return new_game_db(), 0
+        if 'journal_offset' not in snapshot:
+            return migrate(snapshot), 0
+
+        return migrate(snapshot['game_db']), snapshot['journal_offset']
+
+    def history(self, offset=0):
+        """Yields the records of the journal.
+
+        Parameters
+        ----------
+        offset: position in the journal to start from (int)
+
+        Returns
+        -------
+        records: modification records, in order (generator)
+
+        Notes
+        -----
+        Lines which cannot be read (the end of a record being appended
+        when a process crashed) are skipped.
+
+        """
+
+        import json
+
+        try:
+            fd = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+
+        with fd:
+            fd.seek(offset)
+            for line in fd:
+                self.bytes_read += len(line)
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    continue
+                yield tuple(record)
+
+    def load(self):
+        snapshot_read = self.snapshot.bytes_read
+        game_db, offset = self._read_snapshot()
+        self.bytes_read += self.snapshot.bytes_read - snapshot_read
+        self._tail = 0
+        for record in self.history(offset):
+            apply_record(game_db, record)
+            self._tail += 1
+
+        return game_db
+
+    def dump(self, game_db, changes=None, records=None):
+        if records is None:
+            self.compact(game_db)
+            return
+
+        import json
+
+        lines = [json.dumps(record, separators=(',', ':')) for record in records]
+        with open(self.path, 'ab') as fd:
+            if fd.tell() > 0 and not self._ends_with_newline():
+                fd.write(b'\n')
+            data = ''.join([line + '\n' for line in lines]).encode('utf-8')
+            fd.write(data)
+            fd.flush()
+            os.fsync(fd.fileno())
+        self.bytes_written += len(data)
+
+        self._tail += len(lines)
+        if self._tail >= self.compact_every:
+            self.compact(game_db)
+
+    def _ends_with_newline(self):
+        """Tells whether the journal ends with a complete line.
+
+        Returns
+        -------
+        result: False if the last record was only partly written (bool)
+
+        """
+
+        with open(self.path, 'rb') as fd:
+            fd.seek(-1, os.SEEK_END)
+            return fd.read(1) == b'\n'
+
+    def compact(self, game_db):
+        """Folds the journal in a new snapshot.
+
+        Parameters
+        ----------
+        game_db: contains all game information, up to date with the journal (dict)
+
+        """
+
+        try:
+            offset = os.path.getsize(self.path)
+        except OSError:
+            offset = 0
+
+        snapshot_written = self.snapshot.bytes_written
+        self.snapshot.dump({'game_db': game_db, 'journal_offset': offset})
+        self.bytes_written += self.snapshot.bytes_written - snapshot_written
+        self._tail = 0
+
+    def remove(self):
+        StorageBackend.remove(self)
+        self.snapshot.remove()
+
+
+# === memory-mapped backend ===
+# Layout of a memory-mapped game database (little-endian):
+#   header    MAPPED_HEADER, padded to MAPPED_RECORD_SIZE bytes
+#   records   capacity x MAPPED_RECORD_SIZE bytes (kind, name size, variety, reach,
+#             strength, life, then the UTF-8 name padded with NULs)
+# Records never move, so that they can be patched in place.  Removed records
+# are chained in a free list through their strength field and used again.
+MAPPED_MAGIC = b'GMAP'
+MAPPED_VERSION = 1
+MAPPED_HEADER = struct.Struct('<4sHHqqQQIIi')
+MAPPED_RECORD = struct.Struct('<BBhhii')
+MAPPED_RECORD_SIZE = 64
+MAPPED_NAME_SIZE = MAPPED_RECORD_SIZE - MAPPED_RECORD.size
+
+# Kind of a record
+_FREE, _CHARACTER, _CREATURE = 0, 1, 2
+_KINDS = {'characters': _CHARACTER, 'creatures': _CREATURE}
+
+# Offset and format of each field in a record, and of the counters in the header
+_MAPPED_FIELDS = {VARIETY: (2, struct.Struct('<h')), REACH: (4, struct.Struct('<h')),
+                  STRENGTH: (6, struct.Struct('<i')), LIFE: (10, struct.Struct('<i'))}
+_MAPPED_COUNTERS = {'team_money': (8, struct.Struct('<q')), 'nb_defeated': (16, struct.Struct('<q'))}
+# Counters of the header telling other processes that the file changed
+_COUNT = struct.Struct('<Q')
+_WRITE_COUNT_OFFSET = 24
+_STRUCTURE_COUNT_OFFSET = 32
+
+
+class MappedRecord(object):
+    """Character or creature of a memory-mapped database.
+
+    It behaves like the [variety, reach, strength, life] lists of the other
+    backends, but reads and writes the file directly.
+
+    """
+
+    __slots__ = ('_map', '_offset', '_kind')
+
+    def __init__(self, mapping, offset, kind):
+        self._map = mapping
+        self._offset = offset
+        self._kind = kind
+
+    def __getitem__(self, field):
+        if field == VARIETY and self._kind == _CREATURE:
+            return None
+
+        offset, field_struct = _MAPPED_FIELDS[field]
+
+        return field_struct.unpack_from(self._map, self._offset + offset)[0]
+
+    def __setitem__(self, field, value):
+        offset, field_struct = _MAPPED_FIELDS[field]
+        try:
+            field_struct.pack_into(self._map, self._offset + offset, value)
+        except struct.error as error:
+            raise ValueError('value %r cannot be stored (%s)' % (value, error))
+
+    def __len__(self):
+        return 4
+
+    def __iter__(self):
+        return iter([self[field] for field in (VARIETY, REACH, STRENGTH, LIFE)])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'MappedRecord(%r)' % list(self)
+
+
+class MappedSection(object):
+    """Characters or creatures of a memory-mapped database, by name."""
+
+    def __init__(self, backend, kind):
+        self._backend = backend
+        self._kind = kind
+        self.index = {}
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __getitem__(self, name):
+        return MappedRecord(self._backend.mapping, MAPPED_RECORD_SIZE * (self.index[name] + 1), self._kind)
+
+    def __setitem__(self, name, entity):
+        backend = self._backend
+        # Checked before a record is taken, so that a refused entity changes nothing
+        data = backend.encode_record(self._kind, name, entity)
+        slot = self.index.get(name)
+        if slot is None:
+            slot = backend.allocate()
+        backend.write_record(slot, data)
+        self.index[name] = slot
+
+    def __delitem__(self, name):
+        self._backend.free(self.index.pop(name))
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, name, default=None):
+        return self[name] if name in self.index else default
+
+    def pop(self, name, default=None):
+        if name not in self.index:
+            return default
+        entity = list(self[name])
+        del self[name]
+        return entity
+
+    def keys(self):
+        return list(self.index)
+
+    def values(self):
+        return [self[name] for name in list(self.index)]
+
+    def items(self):
+        return [(name, self[name]) for name in list(self.index)]
+
+
+class MappedGameDB(object):
+    """Game database read and written in place in a memory-mapped file.
+
+    It behaves like the game_db dicts of the other backends.
+
+    """
+
+    def __init__(self, backend):
+        self._backend = backend
+        self.sections = {'characters': MappedSection(backend, _CHARACTER),
+                         'creatures': MappedSection(backend, _CREATURE)}
+
+    def __getitem__(self, key):
+        if key in self.sections:
+            return self.sections[key]
+        if key == 'version':
+            return FORMAT_VERSION
+        offset, counter_struct = _MAPPED_COUNTERS[key]
+
+        return counter_struct.unpack_from(self._backend.mapping, offset)[0]
+
+    def __setitem__(self, key, value):
+        if key not in _MAPPED_COUNTERS:
+            raise KeyError(key)
+        offset, counter_struct = _MAPPED_COUNTERS[key]
+        counter_struct.pack_into(self._backend.mapping, offset, value)
+
+    def __contains__(self, key):
+        return key in self.sections or key in _MAPPED_COUNTERS or key == 'version'
+
+    def keys(self):
+        return ['version', 'creatures', 'characters', 'team_money', 'nb_defeated']
+
+    def to_game_db(self):
+        """Returns a copy of the database as a plain dict.
+
+        Returns
+        -------
+        game_db: contains all game information (dict)
+
+        """
+
+        game_db = new_game_db()
+        for key in ('team_money', 'nb_defeated'):
+            game_db[key] = self[key]
+        for section in ('characters', 'creatures'):
+            game_db[section] = dict([(name, list(entity)) for name, entity in self[section].items()])
+
+        return game_db
+
+
+class MmapBackend(StorageBackend):
+    """Database in a file of fixed-size records, accessed through mmap.
+
+    Getters read the record of an entity in the mapped file and setters
+    patch its bytes, without reading or writing anything else.  Other
+    processes map the same file, so they see field updates at once; they
+    only scan the names again when entities were added or removed.
+
+    Since changes are made in place, other processes see them before the
+    end of a batch, and a crash in the middle of a batch leaves it half
+    written; a failed batch is rolled back by writing the previous values
+    back (see gaming_tools.GameSession.batch).  Names are limited to
+    MAPPED_NAME_SIZE bytes and varieties and reaches to those with a code.
+    A pickled or binary game.db is converted when it is first loaded,
+    unless one of its entities cannot be stored (IOError).
+
+    """
+
+    name = 'mmap'
+    default_path = 'game.db'
+
+    def __init__(self, path=None, sync=False):
+        """Creates the backend of a memory-mapped file.
+
+        Parameters
+        ----------
+        path: path of the database file, default_path if None (str)
+        sync: if True, each dump waits for the file to be written to disk (bool)
+
+        """
+
+        StorageBackend.__init__(self, path)
+        self.sync = sync
+        self.mapping = None
+        self._fd = None
+        self._inode = None
+        self._capacity = 0
+        self._structure = None
+        self._game_db = None
+
+    # --- file management ---
+    def signature(self):
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError:
+            return None
+        if self.mapping is None or inode != self._inode:
+            return (inode, None)
+
+        return (inode, _COUNT.unpack_from(self.mapping, _WRITE_COUNT_OFFSET)[0])
+
+    def _header(self):
+        """Returns the header of the file (tuple, see MAPPED_HEADER)."""
+
+        return MAPPED_HEADER.unpack_from(self.mapping)
+
+    def _create(self, game_db):
+        """Writes a new file holding a database.
+
+        Parameters
+        ----------
+        game_db: contains all game information (dict)
+
+        Notes
+        -----
+        An existing file is replaced, and a file created meanwhile by
+        another process is kept.
+
+        """
+
+        entities = ([(_CHARACTER, name, entity) for name, entity in game_db['characters'].items()] +
+                    [(_CREATURE, name, entity) for name, entity in game_db['creatures'].items()])
+        capacity = 64
+        while capacity < len(entities):
+            capacity *= 2
+
+        data = bytearray(MAPPED_RECORD_SIZE * (capacity + 1))
+        MAPPED_HEADER.pack_into(data, 0, MAPPED_MAGIC, MAPPED_VERSION, MAPPED_RECORD_SIZE, game_db['team_money'],
+                                game_db['nb_defeated'], 0, 0, capacity, len(entities), -1)
+        for slot, (kind, name, entity) in enumerate(entities):
+            offset = MAPPED_RECORD_SIZE * (slot + 1)
+            data[offset:offset + MAPPED_RECORD_SIZE] = self.encode_record(kind, name, entity)
+
+        import tempfile
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        handle, temp_path = tempfile.mkstemp(prefix='.%s.' % os.path.basename(self.path), dir=directory)
+        try:
+            with os.fdopen(handle, 'wb') as fd:
+                if hasattr(os, 'fchmod'):
+                    os.fchmod(fd.fileno(), _file_mode(self.path))
+                fd.write(data)
+                fd.flush()
+                os.fsync(fd.fileno())
+            if os.path.exists(self.path):
+                os.replace(temp_path, self.path)
+            else:
+                try:
+                    os.link(temp_path, self.path)
+                except FileExistsError:
+                    pass
+                os.remove(temp_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.bytes_written += len(data)
+
+    def _open(self):
+        """Maps the file, creating or converting it first if needed."""
+
+        self.close()
+
+        try:
+            with open(self.path, 'rb') as fd:
+                magic = fd.read(len(MAPPED_MAGIC))
+        except FileNotFoundError:
+            magic = None
+
+        if magic != MAPPED_MAGIC:
+            # Missing, or written by the binary or pickle backend
+            game_db = BinaryBackend(self.path).load() if magic is not None else new_game_db()
+            self._check_convertible(game_db)
+            self._create(game_db)
+
+        self._fd = open(self.path, 'r+b')
+        self._inode = os.fstat(self._fd.fileno()).st_ino
+        self._map_file()
+        magic, version = self._header()[:2]
+        if magic != MAPPED_MAGIC or version > MAPPED_VERSION:
+            self.close()
+            raise IOError('game database %s is not a supported memory-mapped file' % self.path)
+        self._game_db = MappedGameDB(self)
+
+    def _check_convertible(self, game_db):
+        """Checks that every entity of a database can be written in a memory-mapped file.
+
+        Parameters
+        ----------
+        game_db: database read from a binary or pickled file (dict)
+
+        Raises
+        ------
+        IOError: naming the first entity which cannot be stored, before the file is changed
+
+        """
+
+        for section, kind in (('characters', _CHARACTER), ('creatures', _CREATURE)):
+            for name, entity in game_db[section].items():
+                variety = decode_variety(entity[VARIETY]) if kind == _CHARACTER else None
+                try:
+                    self.encode_record(kind, name, entity)
+                    storable = self.can_store(name, variety)
+                except ValueError:
+                    storable = False
+                if not storable:
+                    raise IOError('game database %s cannot be converted to a memory-mapped file: '
+                                  '%s %s cannot be stored' % (self.path, section[:-1], name))
+
+    def _map_file(self):
+        """Maps the whole file."""
+
+        import mmap
+
+        self.mapping = mmap.mmap(self._fd.fileno(), 0)
+        self._capacity = self._header()[7]
+
+    def _scan(self):
+        """Rebuilds the indexes from names to records."""
+
+        header = self._header()
+        used = header[8]
+        indexes = {_CHARACTER: {}, _CREATURE: {}}
+        unpack = MAPPED_RECORD.unpack_from
+        mapping = self.mapping
+        for slot in range(used):
+            offset = MAPPED_RECORD_SIZE * (slot + 1)
+            kind, size = unpack(mapping, offset)[:2]
+            if kind != _FREE:
+                start = offset + MAPPED_RECORD.size
+                indexes[kind][str(mapping[start:start + size], 'utf-8')] = slot
+        self.bytes_read += MAPPED_RECORD_SIZE * (used + 1)
+
+        self._game_db.sections['characters'].index = indexes[_CHARACTER]
+        self._game_db.sections['creatures'].index = indexes[_CREATURE]
+        self._structure = header[6]
+
+    def load(self):
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError:
+            inode = None
+        if self.mapping is None or inode != self._inode:
+            self._open()
+
+        # The file was grown or entities were added or removed by another process
+        if self._header()[7] != self._capacity:
+            self._map_file()
+        if self._header()[6] != self._structure:
+            self._scan()
+
+        return self._game_db
+
+    def dump(self, game_db, changes=None, records=None):
+        if game_db is not self._game_db:
+            self.close()
+            self._create(game_db)
+            return
+
+        # Fields were already written in place: only tells other processes
+        _COUNT.pack_into(self.mapping, _WRITE_COUNT_OFFSET, self._header()[5] + 1)
+        if self.sync:
+            self.mapping.flush()
+
+    def remove(self):
+        self.close()
+        StorageBackend.remove(self)
+
+    def close(self):
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+        self._game_db = None
+        self._inode = None
+        # The next file is scanned whatever its header says: it may be another one
+        self._capacity = 0
+        self._structure = None
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+
+    def can_store(self, name, variety=None):
+        return (len(name.encode('utf-8')) <= MAPPED_NAME_SIZE
+                and (variety is None or encode_variety(variety).__class__ is int))
+
+    # --- records ---
+    def encode_record(self, kind, name, entity):
+        """Returns the bytes of a record.
+
+        Parameters
+        ----------
+        kind: _CHARACTER or _CREATURE (int)
+        name: name of the entity (str)
+        entity: [variety, reach, strength, life] (list)
+
+        Returns
+        -------
+        data: MAPPED_RECORD_SIZE bytes (bytes)
+
+        Raises
+        ------
+        ValueError: if the name is too long, the variety or reach has no code or a value is out of range
+
+        """
+
+        encoded = name.encode('utf-8')
+        if len(encoded) > MAPPED_NAME_SIZE:
+            raise ValueError('name %s is longer than %d bytes' % (name, MAPPED_NAME_SIZE))
+        variety = entity[VARIETY] if kind == _CHARACTER else 0
+        reach = entity[REACH]
+        if variety.__class__ is not int or reach.__class__ is not int:
+            raise ValueError('variety %r and reach %r cannot be stored' % (variety, reach))
+
+        try:
+            fields = MAPPED_RECORD.pack(kind, len(encoded), variety, reach, entity[STRENGTH], entity[LIFE])
+        except struct.error as error:
+            raise ValueError('entity %s cannot be stored (%s)' % (name, error))
+
+        return fields + encoded.ljust(MAPPED_NAME_SIZE, b'\0')
+
+    def write_record(self, slot, data):
+        """Writes a character or a creature in the file.
+
+        Parameters
+        ----------
+        slot: index of the record, from allocate() (int)
+        data: the record, from encode_record() (bytes)
+
+        """
+
+        offset = MAPPED_RECORD_SIZE * (slot + 1)
+        self.mapping[offset:offset + MAPPED_RECORD_SIZE] = data
+        self._structure_changed()
+
+    def allocate(self):
+        """Returns the index of a free record, growing the file if needed (int)."""
+
+        header = self._header()
+        capacity, used, free = header[7:10]
+
+        if free >= 0:
+            # Next free record is kept in the strength field
+            next_free = _MAPPED_FIELDS[STRENGTH][1].unpack_from(
+                self.mapping, MAPPED_RECORD_SIZE * (free + 1) + _MAPPED_FIELDS[STRENGTH][0])[0]
+            self._set_header(free=next_free)
+            return free
+
+        if used == capacity:
+            capacity *= 2
+            os.ftruncate(self._fd.fileno(), MAPPED_RECORD_SIZE * (capacity + 1))
+            self._set_header(capacity=capacity)
+            self._map_file()
+        self._set_header(used=used + 1)
+
+        return used
+
+    def free(self, slot):
+        """Puts a record in the free list.
+
+        Parameters
+        ----------
+        slot: index of the record (int)
+
+        """
+
+        offset = MAPPED_RECORD_SIZE * (slot + 1)
+        self.mapping[offset:offset + MAPPED_RECORD_SIZE] = bytes(MAPPED_RECORD_SIZE)
+        _MAPPED_FIELDS[STRENGTH][1].pack_into(self.mapping, offset + _MAPPED_FIELDS[STRENGTH][0],
+                                              self._header()[9])
+        self._set_header(free=slot)
+        self._structure_changed()
+
+    def _set_header(self, capacity=None, used=None, free=None):
+        """Changes the record counts of the header."""
+
+        header = list(self._header())
+        for index, value in ((7, capacity), (8, used), (9, free)):
+            if value is not None:
+                header[index] = value
+        MAPPED_HEADER.pack_into(self.mapping, 0, *header)
+
+    def _structure_changed(self):
+        """Tells other processes that entities were added or removed."""
+
+        structure = self._header()[6] + 1
+        _COUNT.pack_into(self.mapping, _STRUCTURE_COUNT_OFFSET, structure)
+        self._structure = structure
+
+
+# === memory backend ===
+class MemoryBackend(StorageBackend):
+    """Database only kept in memory, for simulations and tests.
+
+    Nothing is written: loading again gives back the last dumped database
+    (the same object), so modifications are never rolled back.
+
+    """
+
+    name = 'memory'
+
+    def __init__(self, path=None):
+        StorageBackend.__init__(self, None)
+        self._game_db = None
+
+    def signature(self):
+        return None
+
+    def load(self):
+        if self._game_db is None:
+            self._game_db = new_game_db()
+
+        return self._game_db
+
+    def dump(self, game_db, changes=None, records=None):
+        self._game_db = game_db
+
+    def remove(self):
+        self._game_db = None
+
+
+BACKENDS = {BinaryBackend.name: BinaryBackend,
+            MmapBackend.name: MmapBackend,
+            PickleBackend.name: PickleBackend,
+            SQLiteBackend.name: SQLiteBackend,
+            JournalBackend.name: JournalBackend,
+            MemoryBackend.name: MemoryBackend}
+
+
+def get_backend_class(name=None):
+    """Returns the class of a storage backend.
+
+    Parameters
+    ----------
+    name: name of the backend, from the GAMING_STORAGE environment variable if None (str)
+
+    Returns
+    -------
+    backend_class: class of the backend (type)
+
+    Raises
+    ------
+    ValueError: if there is no backend with that name
+
+    """
+
+    if name is None:
+        name = os.environ.get('GAMING_STORAGE', BinaryBackend.name)
+    if name not in BACKENDS:
+        raise ValueError('storage backend %s is not valid' % name)
+
+    return BACKENDS[name]
+
+
+def open_backend(name=None, path=None):
+    """Creates a storage backend.
+
+    Parameters
+    ----------
+    name: name of the backend, from the GAMING_STORAGE environment variable if None (str)
+    path: path of the database file, from GAMING_DB or the backend default if None (str)
+
+    Returns
+    -------
+    backend: storage backend (StorageBackend)
+
+    Raises
+    ------
+    ValueError: if there is no backend with that name
+
+    Notes
+    -----
+    The 'mmap' backend modifies the file in place: other processes see the
+    modifications of a batch before it ends, and a crash in the middle of a
+    batch leaves it half written.  The other backends write whole batches.
+
+    """
+
+    if path is None:
+        path = os.environ.get('GAMING_DB')
+
+    return get_backend_class(name)(path)
@@ -3,56 +3,872 @@ functions should be used to create higher level operations.
 In particular, they should NOT be directly used by players."""
 
 
-import os, pickle, random
+import atexit, contextlib, os, threading, time, weakref
+
+import gaming_feed, gaming_index, gaming_random, gaming_rules, gaming_stats, gaming_storage
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows: the database is then not locked
+    fcntl = None
 
 
 # === game management functions ===
 def reset_game():
     """Remove all characters and creatures + reset counters (money + defeated)."""
     
-    if os.path.exists('game.db'):
-        os.remove('game.db')
+    session = get_session()
+    
+    with session.lock.exclusive():
+        session.backend.remove()
+        session.invalidate()
 
 
 # === database management (do not use outside of API) ===
-def _load_game_db():
+def _load_game_db(backend=None):
     """Loads the game database.
     
+    Parameters
+    ----------
+    backend: storage of the database, the one of the current session if None (StorageBackend)
+    
     Returns
     -------
     game_db: contains all game information (dict)
     
+    Raises
+    ------
+    IOError: if the database exists but cannot be read
+    
     Notes
     -----
     If no database exists, an empty one is automatically created.
     
     """
     
-    try:
-        fd = open('game.db', 'rb')
-        game_db = pickle.load(fd)
-        fd.close()
-    except:
-        game_db = {'creatures': {},
-                   'characters': {},
-                   'team_money': 0,
-                   'nb_defeated': 0}
-
-    return game_db
+    if backend is None:
+        backend = get_session().backend
+    
+    return backend.load()
 
 
-def _dump_game_db(game_db):
+def _dump_game_db(game_db, backend=None, changes=None, records=None):
     """Dumps the game database.
     
     Parameters
     -------
     game_db: contains all game information (dict)
+    backend: storage of the database, the one of the current session if None (StorageBackend)
+    changes: (section, key) pairs modified since the last dump, None to write everything (set)
+    records: modification records since the last dump, None to write everything (list)
+    
+    Notes
+    -----
+    Backends never leave a partially written database behind, even after a crash.
+    
+    """
+    
+    if backend is None:
+        backend = get_session().backend
+    
+    backend.dump(game_db, changes, records)
+
+
+# === database locking (do not use outside of API) ===
+class GameLock(object):
+    """Lock shared by the threads and processes using a database file.
+    
+    The lock is taken on a '.lock' file next to the database, since the
+    database itself is replaced at each dump (databases without a file are
+    only locked between threads).  Readers take it shared and writers
+    exclusive.  The lock is re-entrant: inside an exclusive lock,
+    nested shared or exclusive locks are free.
+    
+    """
+    
+    def __init__(self, path):
+        """Creates the lock of a database file.
+        
+        Parameters
+        ----------
+        path: path of the database file, None if there is none (str)
+        
+        """
+        
+        self.path = path + '.lock' if path is not None else None
+        self.exclusive_held = False
+        self._depth = 0
+        self._fd = None
+        self._thread_lock = threading.RLock()
+    
+    def acquire(self, exclusive):
+        """Takes the lock, waiting for other threads and processes if needed.
+        
+        Parameters
+        ----------
+        exclusive: True for an exclusive (write) lock, False for a shared (read) one (bool)
+        
+        """
+        
+        self._thread_lock.acquire()
+        try:
+            if self._depth == 0 and fcntl is not None and self.path is not None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+            if self._fd is not None and (self._depth == 0 or exclusive and not self.exclusive_held):
+                fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        except BaseException:
+            if self._depth == 0 and self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._thread_lock.release()
+            raise
+        
+        self.exclusive_held = exclusive or self.exclusive_held
+        self._depth += 1
+    
+    def release(self):
+        """Releases the lock taken by the last call to acquire()."""
+        
+        self._depth -= 1
+        if self._depth == 0:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
+            self.exclusive_held = False
+        self._thread_lock.release()
+    
+    @contextlib.contextmanager
+    def shared(self):
+        """Holds the lock shared (for reading) in a with statement."""
+        
+        self.acquire(False)
+        try:
+            yield self
+        finally:
+            self.release()
+    
+    @contextlib.contextmanager
+    def exclusive(self):
+        """Holds the lock exclusively (for writing) in a with statement."""
+        
+        self.acquire(True)
+        try:
+            yield self
+        finally:
+            self.release()
+
+
+# === creature names (do not use outside of API) ===
+class CreatureNames(object):
+    """Allocates unique creature names such as 'Python#123'.
+    
+    Names given once are remembered and never given again, even after the
+    creature is removed.  Suffixes start with 'digits' digits; once half of
+    the suffixes of a prefix are used, longer suffixes are drawn, so that
+    a free name is always found after a couple of draws.
+    
+    Sessions allocate names with their own allocator (GameSession.names),
+    which can be replaced by any object with the same allocate() method.
+    
+    """
+    
+    def __init__(self, digits=3):
+        """Creates an allocator of creature names.
+        
+        Parameters
+        ----------
+        digits: smallest number of digits of the suffixes (int)
+        
+        """
+        
+        self.digits = digits
+        self._used = set()
+        self._counts = {}
+        self._game_db = None
+    
+    def _use(self, name):
+        """Remembers that a name is used.
+        
+        Parameters
+        ----------
+        name: creature name (str)
+        
+        """
+        
+        if name not in self._used:
+            self._used.add(name)
+            prefix, _, suffix = name.partition('#')
+            self._counts[prefix, len(suffix)] = self._counts.get((prefix, len(suffix)), 0) + 1
+    
+    def allocate(self, game_db, rng):
+        """Returns a new, random, unique creature name.
+        
+        Parameters
+        ----------
+        game_db: contains all game information (dict)
+        rng: source of the random prefixes and suffixes (GameRandom)
+        
+        Returns
+        -------
+        creature: random, unique creature name (str)
+        
+        Notes
+        -----
+        Names start with 'Python' until a creature is defeated.  Names of
+        the creatures of game_db are only collected when game_db was not
+        seen before (after the database was loaded again).
+        
+        """
+        
+        if game_db is not self._game_db:
+            for creature in game_db['creatures']:
+                self._use(creature)
+            self._game_db = game_db
+        
+        if game_db['nb_defeated'] == 0 or rng.randint(0, 2) == 0:
+            prefix = 'Python'
+        else:
+            prefix = ('Lieju', 'Raiden', 'Rinnees')[rng.randint(0, 2)]
+        
+        digits = self.digits
+        while self._counts.get((prefix, digits), 0) * 2 >= 9 * 10 ** (digits - 1):
+            digits += 1
+        
+        creature = '%s#%d' % (prefix, rng.randint(10 ** (digits - 1), 10 ** digits - 1))
+        while creature in self._used or creature in game_db['creatures']:
+            creature = '%s#%d' % (prefix, rng.randint(10 ** (digits - 1), 10 ** digits - 1))
+        self._use(creature)
+        
+        return creature
+
+
+# === game session (do not use outside of API) ===
+class GameSession(object):
+    """Keeps the game database in memory between calls.
+    
+    The database is loaded once and every read is served from memory.
+    Before each access, the session compares the signature of the stored
+    database (modification time, size and inode of a pickle file, data
+    version of an SQLite one) with the one seen at the last load or dump:
+    if another process changed the database, the cached copy is dropped
+    and the database is loaded again.
+    
+    Modifications are made on the cached copy, flagged with changed() and
+    written back to disk by commit().  By default, every modification is
+    written at once, except inside batch() where they are kept in memory
+    and written in one go at the end of the outermost batch.  A batch holds
+    the database lock exclusively, which makes it a read-modify-write
+    transaction: concurrent batches of other threads and processes run one
+    after the other, and a batch left with an exception is rolled back.  A
+    write-behind policy (see set_write_behind) can also keep modifications
+    in memory after their batch, bounding how many of them, or for how long,
+    or until commit() is called.
+    
+    """
+    
+    def __init__(self, backend=None, rng=None):
+        """Creates a session on a stored database.
+        
+        Parameters
+        ----------
+        backend: storage of the database, chosen by gaming_storage.open_backend() if None (StorageBackend)
+        rng: source of the random values of the game, a new unseeded one if None (GameRandom)
+        
+        """
+        
+        if backend is None:
+            backend = gaming_storage.open_backend()
+        
+        self.backend = backend
+        self.rng = rng if rng is not None else gaming_random.GameRandom()
+        self.path = backend.path
+        self.lock = GameLock(backend.path)
+        self.names = CreatureNames()
+        self.feed = gaming_feed.ChangeFeed()
+        self.game_db = None
+        self.index = None
+        self.stats = None
+        self.dirty = False
+        self.changes = set()
+        self.records = []
+        # Records undoing the modifications of the running batches, with their section and key, oldest first
+        self._undo = []
+        # Records of the running batches, published when the outermost one ends
+        self._unpublished = []
+        # (function, arguments) pairs called when the outermost batch ends (see after_batch)
+        self._deferred = []
+        self.generation = 0
+        self.pending = 0
+        self.max_pending = None
+        self.max_delay = None
+        self.manual = False
+        self._depth = 0
+        self._first_pending = None
+        self._signature = None
+        self._trusted = False
+    
+    def get_db(self):
+        """Returns the cached game database, loading it if needed.
+        
+        Returns
+        -------
+        game_db: contains all game information (dict)
+        
+        Notes
+        -----
+        Pending modifications are never dropped, even if the file changed on disk.
+        Inside a batch, the file is only checked once since nobody else can change it,
+        and never with manual commits (see set_write_behind).
+        
+        """
+        
+        if self.game_db is None or not (self.dirty or self._trusted or self.manual) \
+                and self.backend.signature() != self._signature:
+            self.reload()
+        if self._depth > 0:
+            self._trusted = True
+        
+        return self.game_db
+    
+    def get_counter(self, name):
+        """Returns a counter of the database.
+        
+        Parameters
+        ----------
+        name: 'team_money' or 'nb_defeated' (str)
+        
+        Returns
+        -------
+        value: value of the counter (int)
+        
+        Notes
+        -----
+        Until the database is loaded, only the counters are read, so that
+        scripts asking for the money of the team do not decode every
+        character and creature.
+        
+        """
+        
+        if self.game_db is None and self._depth == 0:
+            return self.backend.load_counters()[name]
+        
+        return self.get_db()[name]
+    
+    def get_index(self):
+        """Returns the indexes of the cached database, building them if needed.
+        
+        Returns
+        -------
+        index: indexes of the characters and creatures (gaming_index.RosterIndex)
+        
+        Notes
+        -----
+        Indexes are built at the first query after each load, then updated
+        by every modification made through the session.
+        
+        """
+        
+        game_db = self.get_db()
+        if self.index is None:
+            self.index = gaming_index.RosterIndex(game_db)
+        
+        return self.index
+    
+    def get_stats(self):
+        """Returns the aggregates of the cached database, computing them if needed.
+        
+        Returns
+        -------
+        stats: aggregates of the characters and creatures (gaming_stats.TeamStats)
+        
+        Notes
+        -----
+        Aggregates are computed at the first call after each load, then
+        updated by every modification made through the session.
+        
+        """
+        
+        game_db = self.get_db()
+        if self.stats is None:
+            self.stats = gaming_stats.TeamStats(game_db)
+        
+        return self.stats
+    
+    def reload(self):
+        """Drops the cached database and loads it again from disk."""
+        
+        reloaded = self.game_db is not None
+        with self.lock.shared():
+            self._signature = self.backend.signature()
+            self.game_db = _load_game_db(self.backend)
+        self.index = None
+        self.stats = None
+        self._clean()
+        if reloaded:
+            # Dropped modifications are never published: observers read the game again
+            self._unpublished = []
+            self.feed.publish(('reload',))
+    
+    def changed(self, section, key=None, record=None):
+        """Applies a modification to the cached database and flags it as modified.
+        
+        Parameters
+        ----------
+        section: 'characters', 'creatures' or the name of a counter (str)
+        key: name of the modified character or creature, None for counters (str)
+        record: the modifying function name followed by its arguments (see gaming_storage.apply_record),
+                None if the caller already modified the database (tuple)
+        
+        Notes
+        -----
+        The database is written at once, unless a batch is running or a
+        write-behind policy is set; it is then written when the batch ends
+        or when the policy says so.  Modifications made by the caller
+        cannot be undone: if their batch fails, the database is loaded again.
+        
+        """
+        
+        if record is not None:
+            undo = gaming_storage.undo_record(self.game_db, record) if self._depth > 0 else None
+            self._apply(record)
+            if self._depth > 0:
+                self._undo.append((section, key, undo))
+            self.records.append(record)
+            if self._depth > 0:
+                self._unpublished.append(record)
+            else:
+                self.feed.publish(record)
+        elif self._depth > 0:
+            self._undo.append((section, key, None))
+        
+        self.dirty = True
+        self.changes.add((section, key))
+        if record is None and key is not None:
+            # Unknown change of a character or creature: indexes and aggregates are built again at the next call
+            self.index = None
+            self.stats = None
+        self.pending += 1
+        if self._first_pending is None:
+            self._first_pending = time.monotonic()
+        
+        self._commit_if_due()
+    
+    def _apply(self, record):
+        """Applies a modification record to the cached database, its aggregates and its indexes.
+        
+        Parameters
+        ----------
+        record: the modifying function name followed by its arguments (tuple)
+        
+        """
+        
+        # Aggregates and indexes read the values being replaced
+        if self.stats is not None:
+            self.stats.apply(record)
+        if self.index is not None:
+            self.index.apply(record)
+        try:
+            gaming_storage.apply_record(self.game_db, record)
+        except BaseException:
+            # Already applied to them: built again at the next call
+            self.stats = None
+            self.index = None
+            raise
+    
+    def _commit_if_due(self):
+        """Writes the cached database if the batches and write-behind policy allow it."""
+        
+        if self._depth > 0 or self.manual:
+            # Never in the middle of a batch, which could still be rolled back
+            return
+        
+        if self.max_pending is None and self.max_delay is None:
+            self.commit()
+        elif self.max_pending is not None and self.pending >= self.max_pending:
+            self.commit()
+        elif self.max_delay is not None and self.dirty and time.monotonic() - self._first_pending >= self.max_delay:
+            self.commit()
+    
+    def commit(self):
+        """Writes the cached database to disk if it was modified."""
+        
+        if self.dirty:
+            with self.lock.exclusive():
+                _dump_game_db(self.game_db, self.backend, self.changes, self.records)
+                self._signature = self.backend.signature()
+            self.generation += 1
+            self.records = []
+            self._clean()
+    
+    def invalidate(self):
+        """Forgets the cached database (it will be loaded at next access).
+        
+        Notes
+        -----
+        Modifications which were not written yet are lost.
+        
+        """
+        
+        if self.game_db is not None:
+            self.feed.publish(('reload',))
+        self.game_db = None
+        self.index = None
+        self.stats = None
+        self._signature = None
+        self.records = []
+        self._undo = []
+        self._unpublished = []
+        self._clean()
+    
+    def _clean(self):
+        """Resets the modification tracking once memory and disk agree."""
+        
+        self.dirty = False
+        self.changes = set()
+        self.pending = 0
+        self._first_pending = None
+    
+    @contextlib.contextmanager
+    def batch(self, action=None):
+        """Groups modifications so that they are written to disk only once.
+        
+        Parameters
+        ----------
+        action: name and arguments of the API action run in the batch, recorded before its modifications (tuple)
+        
+        Notes
+        -----
+        Batches can be nested: only the end of the outermost one writes the
+        database (unless a write-behind policy delays it further).  If a
+        batch is left with an exception, its modifications are rolled back,
+        those of its nested batches included, whatever the write-behind
+        policy: modifications of previous batches are kept.  A nested batch
+        whose exception is caught is rolled back alone.  With the 'mmap'
+        backend, which modifies the file in place, other processes see the
+        modifications before the batch ends and a crash in its middle leaves
+        it half written.
+        
+        The database lock is held exclusively during the whole batch, so
+        everything read in a batch is still up to date when it is written.
+        
+        The modifications are published to the change feed when the
+        outermost batch ends, and only if it ends normally: observers never
+        see rolled back modifications.
+        
+        """
+        
+        self.lock.acquire(True)
+        self._depth += 1
+        # What to roll back to if the batch fails
+        state = (len(self._undo), len(self.records), len(self._unpublished), len(self._deferred), self.generation,
+                 self.dirty)
+        if action is not None:
+            self.records.append(('action',) + tuple(action))
+            self._unpublished.append(('action',) + tuple(action))
+        deferred = ()
+        try:
+            yield self
+        except BaseException:
+            try:
+                self._rollback(*state)
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._trusted = False
+            raise
+        else:
+            self._depth -= 1
+            if self._depth == 0:
+                self._trusted = False
+                self._undo = []
+                deferred, self._deferred = self._deferred, []
+                unpublished, self._unpublished = self._unpublished, []
+                for record in unpublished:
+                    self.feed.publish(record)
+                self._commit_if_due()
+        finally:
+            self.lock.release()
+        
+        # Once the database is written and unlocked
+        for function, args in deferred:
+            function(*args)
+    
+    def after_batch(self, function, *args):
+        """Calls a function when the outermost running batch ends.
+        
+        Parameters
+        ----------
+        function: function to call (function)
+        args: arguments of the function
+        
+        Notes
+        -----
+        The function is called once the database is written and unlocked,
+        and never if the batch is rolled back.  Outside a batch, it is
+        called at once.
+        
+        """
+        
+        if self._depth == 0:
+            function(*args)
+        else:
+            self._deferred.append((function, args))
+    
+    def _rollback(self, undo_size, records_size, unpublished_size, deferred_size, generation, dirty):
+        """Undoes the modifications of a failed batch.
+        
+        Parameters
+        ----------
+        undo_size: number of undo records when the batch started (int)
+        records_size: number of modification records when the batch started (int)
+        unpublished_size: number of unpublished records when the batch started (int)
+        deferred_size: number of deferred calls when the batch started (int)
+        generation: number of commits when the batch started (int)
+        dirty: True if modifications were pending when the batch started (bool)
+        
+        """
+        
+        # Never published nor called: the batch did not happen
+        del self._unpublished[unpublished_size:]
+        del self._deferred[deferred_size:]
+        undo = self._undo[undo_size:]
+        del self._undo[undo_size:]
+        if not undo:
+            del self.records[records_size:]
+            return
+        if any(record is None for section, key, record in undo):
+            # Modified by the caller: only the stored database is known to be right
+            self.invalidate()
+            return
+        
+        for section, key, record in reversed(undo):
+            self._apply(record)
+        
+        if self.generation == generation:
+            # Nothing was written meanwhile: memory is back to what it was
+            del self.records[records_size:]
+            if not dirty:
+                self._clean()
+        else:
+            # Part of the batch was written (see flush): its undoing must be written too
+            for section, key, record in reversed(undo):
+                self.records.append(record)
+                self.changes.add((section, key))
+            self.dirty = True
+    
+    def set_write_behind(self, max_pending=None, max_delay=None, manual=False):
+        """Sets when pending modifications must be written to disk.
+        
+        Parameters
+        ----------
+        max_pending: write once that many modifications are pending, None for no limit (int)
+        max_delay: write once the oldest pending modification is that old, None for no limit (float)
+        manual: True to only write when commit() is called, whatever the limits (bool)
+        
+        Notes
+        -----
+        With both parameters set to None (default), modifications are written at
+        once outside batches.  Otherwise, they are also kept in memory after
+        their batch, so that long runs keep a bounded number of writes.  Limits
+        are checked at each modification outside batches and at the end of each
+        batch (never inside, so that batches are written whole): call flush()
+        to write pending modifications sooner.
+        
+        Modifications kept in memory outside batches are not protected by
+        the database lock: only use a write-behind policy when a single
+        process modifies the game.  With manual commits, the stored database
+        is not even checked for modifications of other processes anymore.
+        
+        Pending modifications are written when the program exits, whatever
+        the policy.
+        
+        """
+        
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.manual = manual
+        if manual or max_pending is not None or max_delay is not None:
+            _write_behind_sessions.add(self)
+
+
+# Sessions which may keep modifications in memory, written when the program exits
+_write_behind_sessions = weakref.WeakSet()
+
+
+def _commit_sessions():
+    """Writes the pending modifications of every session with a write-behind policy."""
+    
+    for session in list(_write_behind_sessions):
+        session.commit()
+
+
+_default_session = GameSession()
+
+# Session chosen with use_session, per thread
+_current = threading.local()
+
+
+def get_session():
+    """Returns the session used by the module-level functions.
+    
+    Returns
+    -------
+    session: session chosen with use_session in the current thread, the default one otherwise (GameSession)
+    
+    """
+    
+    session = getattr(_current, 'session', None)
+    
+    return session if session is not None else _default_session
+
+
+@contextlib.contextmanager
+def use_session(session):
+    """Makes the module-level functions use another session in a with statement.
+    
+    Parameters
+    ----------
+    session: session to use instead of the default one (GameSession)
+    
+    Notes
+    -----
+    Only the current thread uses the session: other threads keep theirs.
+    
+    """
+    
+    previous = getattr(_current, 'session', None)
+    _current.session = session
+    try:
+        yield session
+    finally:
+        _current.session = previous
+
+
+def get_rng():
+    """Returns where the random values of the game are drawn from.
+    
+    Returns
+    -------
+    rng: source of random values of the current session (GameRandom)
+    
+    """
+    
+    return get_session().rng
+
+
+def set_rng(rng):
+    """Changes where the random values of the game are drawn from.
+    
+    Parameters
+    ----------
+    rng: new source of random values, e.g. gaming_random.GameRandom(seed) (GameRandom)
+    
+    Notes
+    -----
+    Only the current session uses it: seed each game with its own one.
+    
+    """
+    
+    get_session().rng = rng
+
+
+def batch(action=None):
+    """Groups modifications of the game so that they are written to disk only once.
+    
+    Parameters
+    ----------
+    action: name and arguments of the API action run in the batch, recorded before its modifications (tuple)
+    
+    The batch is also a read-modify-write transaction: other threads and
+    processes can neither load nor modify the game until it ends.
+    
+    Examples
+    --------
+    >>> with batch():
+    ...     set_team_money(get_team_money() + 50)
+    ...     set_nb_defeated(get_nb_defeated() + 1)
+    
+    Notes
+    -----
+    Batches can be nested: only the end of the outermost one writes the game.
+    
+    """
+    
+    return get_session().batch(action)
+
+
+def after_batch(function, *args):
+    """Calls a function when the running batches of the game end.
+    
+    Parameters
+    ----------
+    function: function to call (function)
+    args: arguments of the function
+    
+    Notes
+    -----
+    The function is called once the game is written and unlocked, and
+    never if the batch is rolled back.  Outside a batch, it is called at once.
+    
+    """
+    
+    get_session().after_batch(function, *args)
+
+
+def flush():
+    """Writes pending modifications of the game to disk."""
+    
+    get_session().commit()
+
+
+def set_write_behind(max_pending=None, max_delay=None, manual=False):
+    """Sets when pending modifications of the game must be written to disk.
+    
+    Parameters
+    ----------
+    max_pending: write once that many modifications are pending, None for no limit (int)
+    max_delay: write once the oldest pending modification is that old, in seconds (float)
+    manual: True to only write when flush() is called, whatever the limits (bool)
+    
+    Notes
+    -----
+    Pending modifications are also written when the program exits.
+    
+    """
+    
+    get_session().set_write_behind(max_pending, max_delay, manual)
+
+
+def configure(backend=None, path=None):
+    """Chooses where the game is stored.
+    
+    Parameters
+    ----------
+    backend: 'binary', 'mmap', 'pickle', 'sqlite', 'journal' or 'memory', from the GAMING_STORAGE
+             environment variable if None (str)
+    path: path of the database file, from GAMING_DB or the backend default if None (str)
+    
+    Raises
+    ------
+    ValueError: if backend is not 'binary', 'mmap', 'pickle', 'sqlite', 'journal' or 'memory'
+    
+    Notes
+    -----
+    Pending modifications are written to the previous storage first.
     
     """
     
-    fd = open('game.db', 'wb')
-    pickle.dump(game_db, fd)
-    fd.close()
+    global _default_session
+    
+    new_session = GameSession(gaming_storage.open_backend(backend, path))
+    
+    _default_session.commit()
+    _default_session.backend.close()
+    _default_session = new_session
+
+
+atexit.register(_commit_sessions)
 
 
 # === team management functions ===
@@ -69,14 +885,15 @@ def set_team_money(money):
     
     """
     
-    game_db = _load_game_db()
+    session = get_session()
     
-    if money < 0:
-        raise ValueError('money cannot be negative (money = %d)' % money)
-    
-    game_db['team_money'] = money
-    
-    _dump_game_db(game_db)
+    with session.batch():
+        session.get_db()
+        
+        if money < 0:
+            raise ValueError('money cannot be negative (money = %d)' % money)
+        
+        session.changed('team_money', None, ('set_team_money', money))
 
 
 def get_team_money():
@@ -88,9 +905,9 @@ def get_team_money():
    
     """
     
-    game_db = _load_game_db()
+    session = get_session()
     
-    return game_db['team_money']
+    return session.get_counter('team_money')
 
 
 def set_nb_defeated(nb_defeated):
@@ -106,14 +923,15 @@ def set_nb_defeated(nb_defeated):
     
     """
     
-    game_db = _load_game_db()
+    session = get_session()
     
-    if nb_defeated < 0:
-        raise ValueError('cannot be negative (nb_defeated = %d)' % nb_defeated)
-    
-    game_db['nb_defeated'] = nb_defeated
-    
-    _dump_game_db(game_db)
+    with session.batch():
+        session.get_db()
+        
+        if nb_defeated < 0:
+            raise ValueError('cannot be negative (nb_defeated = %d)' % nb_defeated)
+        
+        session.changed('nb_defeated', None, ('set_nb_defeated', nb_defeated))
 
 
 def get_nb_defeated():
@@ -125,9 +943,33 @@ def get_nb_defeated():
    
     """
     
-    game_db = _load_game_db()
+    session = get_session()
+    
+    return session.get_counter('nb_defeated')
+
+
+def get_team_stats():
+    """Returns the aggregates of the team and of the creatures.
+    
+    Returns
+    -------
+    stats: team_money, nb_defeated, nb_characters, nb_alive_characters, nb_dead_characters,
+           total_life and total_strength of the characters, mean_character_life,
+           mean_character_strength, nb_creatures, total_creature_life, mean_creature_life and
+           mean_creature_strength (dict)
+    
+    Notes
+    -----
+    Aggregates are updated by every modification instead of being computed
+    from all the characters and creatures at each call.
+    
+    """
+    
+    session = get_session()
+    
+    game_db = session.get_db()
     
-    return game_db['nb_defeated']
+    return session.get_stats().summary(game_db['team_money'], game_db['nb_defeated'])
 
 
 # === character management functions ===
@@ -144,9 +986,62 @@ def character_exists(character):
     
     """
     
-    game_db = _load_game_db()
+    session = get_session()
+    
+    game_db = session.get_db()
     
     return character in game_db['characters']
+
+
+def can_store_character(character, variety):
+    """Tells whether the storage of the game can hold a character.
+    
+    Parameters
+    ----------
+    character: character name (str)
+    variety: character variety (str)
+    
+    Returns
+    -------
+    result: True if the character can be stored, False otherwise (bool)
+    
+    Notes
+    -----
+    Only the 'mmap' storage has limits: names of at most 50 bytes, and
+    the varieties of gaming_storage.VARIETIES (not those added to gaming_rules).
+    
+    """
+    
+    session = get_session()
+    
+    return session.backend.can_store(character, variety)
+
+
+def get_character(character):
+    """Returns everything about a character in one look-up.
+    
+    Parameters
+    ----------
+    character: character name (str)
+    
+    Returns
+    -------
+    stats: variety (str), reach (str), strength (int) and life (int) of the character,
+           None if it does not exist (tuple)
+    
+    """
+    
+    session = get_session()
+    
+    game_db = session.get_db()
+    
+    entity = game_db['characters'].get(character)
+    if entity is None:
+        return None
+    
+    return (gaming_storage.decode_variety(entity[gaming_storage.VARIETY]),
+            gaming_storage.decode_reach(entity[gaming_storage.REACH]),
+            entity[gaming_storage.STRENGTH], entity[gaming_storage.LIFE])
     
     
 def add_new_character(character, variety, reach, strength, life):
@@ -163,7 +1058,7 @@ def add_new_character(character, variety, reach, strength, life):
     Raises
     ------
     ValueError: if there already is a character with the same name
-    ValueError: if variety is neither 'dwarf', 'elf', 'healer', 'wizard' nor 'necromancer'
+    ValueError: if variety is not in gaming_rules.RULES
     ValueError: if reach is neither 'short' nor 'long'
     ValueError: if strength is strictly negative
     ValueError: if life is strictly negative
@@ -174,22 +1069,23 @@ def add_new_character(character, variety, reach, strength, life):
     
     """
     
-    game_db = _load_game_db()
+    session = get_session()
     
-    if character_exists(character):
-        raise ValueError('character %s already exists' % character)
-    if variety not in ('dwarf', 'elf', 'healer', 'wizard', 'necromancer'):
-        raise ValueError('variety %s is not valid' % variety)
-    if reach != 'short' and reach != 'long':
-        raise ValueError('reach %s is not valid' % reach)
-    if strength < 0:
-        raise ValueError('strength cannot be negative (strength = %d)' % strength)
-    if life < 0:
-        raise ValueError('life cannot be negative (life = %d)' % life)
-
-    game_db['characters'][character] = {'variety': variety, 'reach': reach, 'strength': strength, 'life': life}
-    
-    _dump_game_db(game_db)
+    with session.batch():
+        game_db = session.get_db()
+        
+        if character in game_db['characters']:
+            raise ValueError('character %s already exists' % character)
+        if variety not in gaming_rules.RULES:
+            raise ValueError('variety %s is not valid' % variety)
+        if reach != 'short' and reach != 'long':
+            raise ValueError('reach %s is not valid' % reach)
+        if strength < 0:
+            raise ValueError('strength cannot be negative (strength = %d)' % strength)
+        if life < 0:
+            raise ValueError('life cannot be negative (life = %d)' % life)
+    
+        session.changed('characters', character, ('add_new_character', character, variety, reach, strength, life))
 
 
 def get_character_variety(character):
@@ -209,12 +1105,14 @@ def get_character_variety(character):
     
     """
     
-    game_db = _load_game_db()
+    session = get_session()
+    
+    game_db = session.get_db()
     
-    if not character_exists(character):
+    if character not in game_db['characters']:
         raise ValueError('character %s does not exist' % character)
     
-    return game_db['characters'][character]['variety'] 
+    return gaming_storage.decode_variety(game_db['characters'][character][gaming_storage.VARIETY]) 
 
 
 def get_character_reach(character):
@@ -234,12 +1132,14 @@ def get_character_reach(character):
     
     """
     
-    game_db = _load_game_db()
+    session = get_session()
     
-    if not character_exists(character):
+    game_db = session.get_db()
+    
+    if character not in game_db['characters']:
         raise ValueError('character %s does not exist' % character)
     
-    return game_db['characters'][character]['reach'] 
+    return gaming_storage.decode_reach(game_db['characters'][character][gaming_storage.REACH]) 
 
 
 def set_character_strength(character, strength):
@@ -257,16 +1157,17 @@ def set_character_strength(character, strength):
      
     """
     
-    game_db = _load_game_db()
-    
-    if not character_exists(character):
-        raise ValueError('character %s does not exist' % character)
-    if strength < 0:
-        raise ValueError('strength cannot be negative (strength = %d)' % strength)
-    
-    game_db['characters'][character]['strength'] = strength
+    session = get_session()
     
-    _dump_game_db(game_db)
+    with session.batch():
+        game_db = session.get_db()
+        
+        if character not in game_db['characters']:
+            raise ValueError('character %s does not exist' % character)
+        if strength < 0:
+            raise ValueError('strength cannot be negative (strength = %d)' % strength)
+        
+        session.changed('characters', character, ('set_character_strength', character, strength))
 
 
 def get_character_strength(character):
@@ -286,12 +1187,14 @@ def get_character_strength(character):
     
     """
     
-    game_db = _load_game_db()
+    session = get_session()
+    
+    game_db = session.get_db()
     
-    if not character_exists(character):
+    if character not in game_db['characters']:
         raise ValueError('character %s does not exist' % character)
     
-    return game_db['characters'][character]['strength'] 
+    return game_db['characters'][character][gaming_storage.STRENGTH] 
     
     
 def set_character_life(character, life):
@@ -309,16 +1212,17 @@ def set_character_life(character, life):
      
     """
     
-    game_db = _load_game_db()
+    session = get_session()
     
-    if not character_exists(character):
-        raise ValueError('character %s does not exist' % character)
-    if life < 0:
-        raise ValueError('life cannot be negative (life = %d)' % life)
-    
-    game_db['characters'][character]['life'] = life
-    
-    _dump_game_db(game_db)
+    with session.batch():
+        game_db = session.get_db()
+        
+        if character not in game_db['characters']:
+            raise ValueError('character %s does not exist' % character)
+        if life < 0:
+            raise ValueError('life cannot be negative (life = %d)' % life)
+        
+        session.changed('characters', character, ('set_character_life', character, life))
 
         
 def get_character_life(character):
@@ -338,12 +1242,14 @@ def get_character_life(character):
     
     """
     
-    game_db = _load_game_db()
+    session = get_session()
+    
+    game_db = session.get_db()
     
-    if not character_exists(character):
+    if character not in game_db['characters']:
         raise ValueError('character %s does not exist' % character)
     
-    return game_db['characters'][character]['life'] 
+    return game_db['characters'][character][gaming_storage.LIFE] 
 
 
 # === creature management functions ===
@@ -360,11 +1266,38 @@ def creature_exists(creature):
     
     """
     
-    game_db = _load_game_db()
+    session = get_session()
+    
+    game_db = session.get_db()
     
     return creature in game_db['creatures']
 
 
+def get_creature(creature):
+    """Returns everything about a creature in one look-up.
+    
+    Parameters
+    ----------
+    creature: creature name (str)
+    
+    Returns
+    -------
+    stats: reach (str), strength (int) and life (int) of the creature, None if it does not exist (tuple)
+    
+    """
+    
+    session = get_session()
+    
+    game_db = session.get_db()
+    
+    entity = game_db['creatures'].get(creature)
+    if entity is None:
+        return None
+    
+    return (gaming_storage.decode_reach(entity[gaming_storage.REACH]),
+            entity[gaming_storage.STRENGTH], entity[gaming_storage.LIFE])
+
+
 def add_creature(creature, reach, strength, life):
     """Adds a creature in the game.
     
@@ -384,20 +1317,21 @@ def add_creature(creature, reach, strength, life):
 
     """
     
-    game_db = _load_game_db()
-    
-    if creature_exists(creature):
-        raise ValueError('creature %s already exists' % creature)
-    if reach != 'short' and reach != 'long':
-        raise ValueError('reach %s is not valid' % reach)
-    if strength < 0:
-        raise ValueError('strength cannot be negative (strength = %d)' % strength)
-    if life < 0:
-        raise ValueError('life cannot be negative (life = %d)' % life)
+    session = get_session()
     
-    game_db['creatures'][creature] = {'reach': reach, 'strength': strength, 'life': life}
-    
-    _dump_game_db(game_db)
+    with session.batch():
+        game_db = session.get_db()
+        
+        if creature in game_db['creatures']:
+            raise ValueError('creature %s already exists' % creature)
+        if reach != 'short' and reach != 'long':
+            raise ValueError('reach %s is not valid' % reach)
+        if strength < 0:
+            raise ValueError('strength cannot be negative (strength = %d)' % strength)
+        if life < 0:
+            raise ValueError('life cannot be negative (life = %d)' % life)
+        
+        session.changed('creatures', creature, ('add_creature', creature, reach, strength, life))
 
 
 def remove_creature(creature):
@@ -417,14 +1351,15 @@ def remove_creature(creature):
 
     """
     
-    game_db = _load_game_db()
-    
-    if not creature_exists(creature):
-        raise ValueError('creature %s does not exists' % creature)
-    
-    del game_db['creatures'][creature]
+    session = get_session()
     
-    _dump_game_db(game_db)
+    with session.batch():
+        game_db = session.get_db()
+        
+        if creature not in game_db['creatures']:
+            raise ValueError('creature %s does not exists' % creature)
+        
+        session.changed('creatures', creature, ('remove_creature', creature))
 
 
 def get_random_creature_name():
@@ -434,18 +1369,17 @@ def get_random_creature_name():
     -------
     creature: random, unique creature name (str)
     
-    """
-
-    game_db = _load_game_db()
+    Notes
+    -----
+    Names are never given twice by a session (see CreatureNames).  Suffixes
+    have 3 digits until they run short: set get_session().names.digits for
+    longer ones.
     
-    if get_nb_defeated() == 0 or random.randint(0, 2) == 0:
-        prefix = 'Python'
-    else:
-        prefix = ('Lieju', 'Raiden', 'Rinnees')[random.randint(0, 2)]
+    """
 
-    suffix = str(random.randint(100, 999))
+    session = get_session()
     
-    return prefix + '#' + suffix
+    return session.names.allocate(session.get_db(), session.rng)
 
 
 def get_creature_reach(creature):
@@ -465,12 +1399,14 @@ def get_creature_reach(creature):
     
     """
     
-    game_db = _load_game_db()
+    session = get_session()
     
-    if not creature_exists(creature):
+    game_db = session.get_db()
+    
+    if creature not in game_db['creatures']:
         raise ValueError('creature %s does not exist' % creature)
     
-    return game_db['creatures'][creature]['reach'] 
+    return gaming_storage.decode_reach(game_db['creatures'][creature][gaming_storage.REACH]) 
 
 
 def set_creature_strength(creature, strength):
@@ -488,16 +1424,17 @@ def set_creature_strength(creature, strength):
      
     """
     
-    game_db = _load_game_db()
-    
-    if not creature_exists(creature):
-        raise ValueError('creature %s does not exist' % creature)
-    if strength < 0:
-        raise ValueError('strength cannot be negative (strength = %d)' % strength)
-    
-    game_db['creatures'][creature]['strength']  = strength
+    session = get_session()
     
-    _dump_game_db(game_db)
+    with session.batch():
+        game_db = session.get_db()
+        
+        if creature not in game_db['creatures']:
+            raise ValueError('creature %s does not exist' % creature)
+        if strength < 0:
+            raise ValueError('strength cannot be negative (strength = %d)' % strength)
+        
+        session.changed('creatures', creature, ('set_creature_strength', creature, strength))
     
     
 def get_creature_strength(creature):
@@ -517,12 +1454,14 @@ def get_creature_strength(creature):
     
     """
     
-    game_db = _load_game_db()
+    session = get_session()
+    
+    game_db = session.get_db()
     
-    if not creature_exists(creature):
+    if creature not in game_db['creatures']:
         raise ValueError('creature %s does not exist' % creature)
     
-    return game_db['creatures'][creature]['strength'] 
+    return game_db['creatures'][creature][gaming_storage.STRENGTH] 
     
     
 def set_creature_life(creature, life):
@@ -540,16 +1479,17 @@ def set_creature_life(creature, life):
      
     """
     
-    game_db = _load_game_db()
+    session = get_session()
     
-    if not creature_exists(creature):
-        raise ValueError('creature %s does not exist' % creature)
-    if life < 0:
-        raise ValueError('life cannot be negative (life = %d)' % life)
-    
-    game_db['creatures'][creature]['life']  = life
-    
-    _dump_game_db(game_db)
+    with session.batch():
+        game_db = session.get_db()
+        
+        if creature not in game_db['creatures']:
+            raise ValueError('creature %s does not exist' % creature)
+        if life < 0:
+            raise ValueError('life cannot be negative (life = %d)' % life)
+        
+        session.changed('creatures', creature, ('set_creature_life', creature, life))
 
         
 def get_creature_life(creature):
@@ -569,9 +1509,201 @@ def get_creature_life(creature):
     
     """
     
-    game_db = _load_game_db()
+    session = get_session()
+    
+    game_db = session.get_db()
     
-    if not creature_exists(creature):
+    if creature not in game_db['creatures']:
         raise ValueError('creature %s does not exist' % creature)
     
-    return game_db['creatures'][creature]['life'] 
+    return game_db['creatures'][creature][gaming_storage.LIFE] 
+
+
+# === queries ===
+def find_characters(alive=None, variety=None, reach=None, min_life=None, max_life=None, min_strength=None,
+                    max_strength=None):
+    """Returns the characters matching a query.
+    
+    Parameters
+    ----------
+    alive: True for living characters only, False for dead ones only, None for both (bool)
+    variety: only characters of that variety (str)
+    reach: only characters of that reach (str)
+    min_life: only characters with at least that life (int)
+    max_life: only characters with at most that life (int)
+    min_strength: only characters with at least that strength (int)
+    max_strength: only characters with at most that strength (int)
+    
+    Returns
+    -------
+    characters: names of the matching characters, sorted (list)
+    
+    Notes
+    -----
+    Queries are answered from indexes kept up to date by every modification,
+    without going through all the characters.
+    
+    """
+    
+    session = get_session()
+    
+    return session.get_index().characters.find(alive, variety, reach, min_life, max_life, min_strength,
+                                                max_strength)
+
+
+def find_creatures(alive=None, reach=None, min_life=None, max_life=None, min_strength=None, max_strength=None):
+    """Returns the creatures matching a query.
+    
+    Parameters
+    ----------
+    alive: True for living creatures only, False for dead ones only, None for both (bool)
+    reach: only creatures of that reach (str)
+    min_life: only creatures with at least that life (int)
+    max_life: only creatures with at most that life (int)
+    min_strength: only creatures with at least that strength (int)
+    max_strength: only creatures with at most that strength (int)
+    
+    Returns
+    -------
+    creatures: names of the matching creatures, sorted (list)
+    
+    """
+    
+    session = get_session()
+    
+    return session.get_index().creatures.find(alive, None, reach, min_life, max_life, min_strength, max_strength)
+
+
+def top_characters(k, by='strength', lowest=False, alive=None, variety=None, reach=None):
+    """Returns the characters with the highest (or lowest) strength or life.
+    
+    Parameters
+    ----------
+    k: number of characters (int)
+    by: 'strength' or 'life' (str)
+    lowest: True for the lowest values instead of the highest (bool)
+    alive: True for living characters only, False for dead ones only, None for both (bool)
+    variety: only characters of that variety (str)
+    reach: only characters of that reach (str)
+    
+    Returns
+    -------
+    characters: names of at most k characters, best first (list)
+    
+    Raises
+    ------
+    ValueError: if by is neither 'strength' nor 'life'
+    
+    """
+    
+    session = get_session()
+    
+    return session.get_index().characters.top(k, by, lowest, alive, variety, reach)
+
+
+def top_creatures(k, by='strength', lowest=False, alive=None, reach=None):
+    """Returns the creatures with the highest (or lowest) strength or life.
+    
+    Parameters
+    ----------
+    k: number of creatures (int)
+    by: 'strength' or 'life' (str)
+    lowest: True for the lowest values instead of the highest (bool)
+    alive: True for living creatures only, False for dead ones only, None for both (bool)
+    reach: only creatures of that reach (str)
+    
+    Returns
+    -------
+    creatures: names of at most k creatures, best first (list)
+    
+    Raises
+    ------
+    ValueError: if by is neither 'strength' nor 'life'
+    
+    """
+    
+    session = get_session()
+    
+    return session.get_index().creatures.top(k, by, lowest, alive, None, reach)
+
+
+# === change feed ===
+def get_version():
+    """Returns the version of the last modification of the game.
+    
+    Returns
+    -------
+    version: number of modifications made by the current session (int)
+    
+    """
+    
+    session = get_session()
+    
+    return session.feed.version
+
+
+def changes_since(version):
+    """Returns the modifications of the game made after a version.
+    
+    Parameters
+    ----------
+    version: last version already seen, e.g. from get_version() (int)
+    
+    Returns
+    -------
+    changes: (version, record) pairs, oldest first, where record is the modifying
+             function name followed by its arguments (list)
+    
+    Raises
+    ------
+    ValueError: if some of these modifications are not kept anymore: the game must be read again
+    
+    Notes
+    -----
+    Versions count the modifications made by the current session: those
+    of other processes only appear as a ('reload',) record.
+    
+    """
+    
+    session = get_session()
+    
+    return session.feed.changes_since(version)
+
+
+def subscribe(callback):
+    """Calls a function at each modification of the game.
+    
+    Parameters
+    ----------
+    callback: function called with the version and record of each modification (function)
+    
+    Returns
+    -------
+    callback: the function, to unsubscribe it later (function)
+    
+    Notes
+    -----
+    The function is called in the thread making the modification, while
+    the game is locked: it should return quickly and not modify the game.
+    Modifications made in a batch are published when it ends, and never if
+    it is rolled back.
+    
+    """
+    
+    session = get_session()
+    
+    return session.feed.subscribe(callback)
+
+
+def unsubscribe(callback):
+    """Stops calling a function at each modification of the game.
+    
+    Parameters
+    ----------
+    callback: function given to subscribe (function)
+    
+    """
+    
+    session = get_session()
+    
+    session.feed.unsubscribe(callback)
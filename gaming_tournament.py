@@ -0,0 +1,327 @@
+"""This module runs tournaments between party compositions.  Each party
+plays many games with gaming_API_gr_16 (create_character, create_creature,
+attack, launch_spell and evolute), spread over a pool of processes:
+
+    python gaming_tournament.py --party dwarf,dwarf,healer --party elf,wizard,necromancer --games 10000
+
+Every game is played on its own in-memory database, so workers share no
+game file.  Game i is seeded from the tournament seed and i only, so that
+results do not depend on the number of workers, and every party meets the
+same random draws.  Workers send back running totals per party instead of
+the games themselves: memory does not grow with the number of games."""
+
+
+import argparse, concurrent.futures, json, os, sys, time
+
+import gaming_output, gaming_play, gaming_random, gaming_rules, gaming_storage, gaming_tools
+
+
+DEFAULT_CHUNK_SIZE = 100
+
+
+def _new_totals(party):
+    """Returns the totals of a party which played no game.
+
+    Parameters
+    ----------
+    party: variety of each character (list)
+
+    Returns
+    -------
+    totals: counts and sums over the games played (dict)
+
+    """
+
+    return {'games': 0, 'won': 0, 'lost': 0, 'stalled': 0, 'money': 0, 'defeated': 0,
+            'survivors': [0] * len(party)}
+
+
+def _merge_totals(totals, other):
+    """Adds the totals of other games to totals.
+
+    Parameters
+    ----------
+    totals: totals to update (dict)
+    other: totals to add (dict)
+
+    """
+
+    for key in ('games', 'won', 'lost', 'stalled', 'money', 'defeated'):
+        totals[key] += other[key]
+    totals['survivors'] = [total + count for total, count in zip(totals['survivors'], other['survivors'])]
+
+
+def play_seeded_game(party, policy, seed, game, nb_waves=10, max_turns=50):
+    """Plays one game on a new in-memory database.
+
+    Parameters
+    ----------
+    party: variety of each character (list)
+    policy: 'attack', 'support' or 'evolve' (str)
+    seed: seed of the tournament (int)
+    game: index of the game in the tournament (int)
+    nb_waves: number of creatures to defeat (int)
+    max_turns: number of turns after which the game is stalled (int)
+
+    Returns
+    -------
+    result: outcome, money, nb_defeated, lives and strengths at the end (tuple)
+
+    """
+
+    rng = gaming_random.GameRandom('%d/%d' % (seed, game))
+    session = gaming_tools.GameSession(gaming_storage.MemoryBackend(), rng)
+    with gaming_tools.use_session(session):
+        return gaming_play.play_game(party, policy, nb_waves, max_turns)
+
+
+def _play_chunk(party, policy, seed, start, stop, nb_waves, max_turns):
+    """Plays games start to stop - 1 of a party and sums their results up.
+
+    Parameters
+    ----------
+    party: variety of each character (list)
+    policy: 'attack', 'support' or 'evolve' (str)
+    seed: seed of the tournament (int)
+    start: index of the first game (int)
+    stop: index after the last game (int)
+    nb_waves: number of creatures to defeat (int)
+    max_turns: number of turns after which the game is stalled (int)
+
+    Returns
+    -------
+    totals: counts and sums over the games (dict)
+
+    """
+
+    totals = _new_totals(party)
+    with gaming_output.use_sink(gaming_output.NullSink()):
+        for game in range(start, stop):
+            outcome, money, nb_defeated, lives, strengths = play_seeded_game(party, policy, seed, game,
+                                                                             nb_waves, max_turns)
+            totals['games'] += 1
+            if outcome == gaming_play.WON:
+                totals['won'] += 1
+            elif outcome == gaming_play.LOST:
+                totals['lost'] += 1
+            else:
+                totals['stalled'] += 1
+            totals['money'] += money
+            totals['defeated'] += nb_defeated
+            for member, life in enumerate(lives):
+                totals['survivors'][member] += life > 0
+
+    return totals
+
+
+def _summarize(party, totals):
+    """Returns the statistics of a party from its totals.
+
+    Parameters
+    ----------
+    party: variety of each character (list)
+    totals: counts and sums over the games played (dict)
+
+    Returns
+    -------
+    stats: win, loss and stall rates, mean money, mean number of defeated
+           creatures and survival rate of each character (dict)
+
+    """
+
+    games = max(totals['games'], 1)
+
+    return {'party': list(party),
+            'games': totals['games'],
+            'win_rate': totals['won'] / games,
+            'loss_rate': totals['lost'] / games,
+            'stall_rate': totals['stalled'] / games,
+            'mean_money': totals['money'] / games,
+            'mean_defeated': totals['defeated'] / games,
+            'survival_rates': [survivors / games for survivors in totals['survivors']]}
+
+
+def _check_parties(parties, policy):
+    """Checks the parties and policy of a tournament.
+
+    Parameters
+    ----------
+    parties: variety of each character, per party (list)
+    policy: 'attack', 'support' or 'evolve' (str)
+
+    Raises
+    ------
+    ValueError: if a party is empty, or a variety or the policy is not valid
+
+    """
+
+    for party in parties:
+        if not party:
+            raise ValueError('a party needs at least one character')
+        for variety in party:
+            if variety not in gaming_rules.RULES:
+                raise ValueError('variety %s is not valid' % variety)
+    if policy not in gaming_play.POLICIES:
+        raise ValueError('policy %s is not valid' % policy)
+
+
+def run_tournament(parties, n, policy='support', seed=0, nb_waves=10, max_turns=50, workers=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE):
+    """Plays n games with each party and compares them.
+
+    Parameters
+    ----------
+    parties: variety of each character, per party, e.g. [['dwarf', 'dwarf', 'healer']] (list)
+    n: number of games per party (int)
+    policy: 'attack', 'support' or 'evolve', see gaming_play.play_game (str)
+    seed: seed of the tournament (int)
+    nb_waves: number of creatures to defeat (int)
+    max_turns: number of turns after which the game is stalled (int)
+    workers: number of worker processes, os.cpu_count() if None, 0 to play in this process (int)
+    chunk_size: number of games sent to a worker at once (int)
+
+    Returns
+    -------
+    stats: statistics of each party, in order (list of dicts, see _summarize)
+
+    Raises
+    ------
+    ValueError: if a party is empty, or a variety or the policy is not valid
+
+    Notes
+    -----
+    At most two chunks per worker are queued at once, and their results
+    are added up as soon as they arrive.
+
+    """
+
+    parties = [list(party) for party in parties]
+    _check_parties(parties, policy)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    chunks = ((index, start, min(start + chunk_size, n)) for index in range(len(parties))
+              for start in range(0, n, chunk_size))
+    totals = [_new_totals(party) for party in parties]
+
+    if workers == 0:
+        for index, start, stop in chunks:
+            _merge_totals(totals[index], _play_chunk(parties[index], policy, seed, start, stop, nb_waves, max_turns))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            running = {}
+            while True:
+                for index, start, stop in chunks:
+                    future = executor.submit(_play_chunk, parties[index], policy, seed, start, stop, nb_waves,
+                                             max_turns)
+                    running[future] = index
+                    if len(running) >= 2 * workers:
+                        break
+                if not running:
+                    break
+                done, pending = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    _merge_totals(totals[running.pop(future)], future.result())
+
+    return [_summarize(party, party_totals) for party, party_totals in zip(parties, totals)]
+
+
+def measure_speedup(parties, n, policy='support', seed=0, nb_waves=10, max_turns=50, workers=None,
+                    chunk_size=DEFAULT_CHUNK_SIZE):
+    """Times a tournament in this process and with pools of several sizes.
+
+    Parameters
+    ----------
+    parties: variety of each character, per party (list)
+    n: number of games per party (int)
+    policy: 'attack', 'support' or 'evolve' (str)
+    seed: seed of the tournament (int)
+    nb_waves: number of creatures to defeat (int)
+    max_turns: number of turns after which the game is stalled (int)
+    workers: pool sizes to time, powers of 2 up to os.cpu_count() (and it) if None (list)
+    chunk_size: number of games sent to a worker at once (int)
+
+    Returns
+    -------
+    timings: cpu_count, the time in this process ('serial_time'), for each pool size
+             its time, speedup and efficiency (speedup per worker), and the
+             statistics of the parties ('results') (dict)
+
+    Raises
+    ------
+    AssertionError: if a pool gives other results than this process
+
+    """
+
+    cpu_count = os.cpu_count() or 1
+    if workers is None:
+        workers = [size for size in (2 ** power for power in range(cpu_count.bit_length())) if size <= cpu_count]
+        if workers[-1] != cpu_count:
+            workers.append(cpu_count)
+
+    start = time.perf_counter()
+    expected = run_tournament(parties, n, policy, seed, nb_waves, max_turns, 0, chunk_size)
+    serial_time = time.perf_counter() - start
+
+    pools = []
+    for size in workers:
+        start = time.perf_counter()
+        stats = run_tournament(parties, n, policy, seed, nb_waves, max_turns, size, chunk_size)
+        elapsed = time.perf_counter() - start
+        if stats != expected:
+            raise AssertionError('%d workers give other results than this process' % size)
+        pools.append({'workers': size, 'time': elapsed, 'speedup': serial_time / elapsed,
+                      'efficiency': serial_time / elapsed / size})
+
+    return {'cpu_count': cpu_count, 'games': n * len(parties), 'serial_time': serial_time, 'pools': pools,
+            'results': expected}
+
+
+def main(argv=None):
+    """Runs a tournament from the command line and writes its JSON report.
+
+    Parameters
+    ----------
+    argv: command line arguments, sys.argv[1:] if None (list)
+
+    """
+
+    parser = argparse.ArgumentParser(description='Compare party compositions over many games.')
+    parser.add_argument('--party', action='append', required=True,
+                        help='comma separated varieties of a party (repeatable)')
+    parser.add_argument('--games', type=int, default=1000, help='number of games per party')
+    parser.add_argument('--policy', choices=gaming_play.POLICIES, default='support')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--waves', type=int, default=10, help='number of creatures to defeat')
+    parser.add_argument('--max-turns', type=int, default=50)
+    parser.add_argument('--workers', type=int, help='number of worker processes, one per core by default')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--speedup', action='store_true',
+                        help='also time the tournament in this process and with 1 to --workers processes')
+    parser.add_argument('--output', help='file to write the JSON report to, stdout by default')
+    args = parser.parse_args(argv)
+
+    parties = [party.split(',') for party in args.party]
+    report = {'policy': args.policy, 'seed': args.seed, 'games': args.games}
+    if args.speedup:
+        workers = None
+        if args.workers is not None:
+            workers = [size for size in (2 ** power for power in range(args.workers.bit_length()))
+                       if size < args.workers] + [args.workers]
+        report['speedup'] = measure_speedup(parties, args.games, args.policy, args.seed, args.waves,
+                                            args.max_turns, workers, args.chunk_size)
+        report['results'] = report['speedup'].pop('results')
+    else:
+        report['results'] = run_tournament(parties, args.games, args.policy, args.seed, args.waves,
+                                           args.max_turns, args.workers, args.chunk_size)
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
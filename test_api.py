@@ -0,0 +1,33 @@
+"""Checks the actions of gaming_API_gr_16 as run by the gaming_api command line.
+
+Run with: python -m pytest test_api.py"""
+
+
+import json, os, subprocess, sys
+
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _run(directory, *argv):
+    environment = dict(os.environ, PYTHONPATH=_HERE, GAMING_STORAGE='binary')
+    process = subprocess.run([sys.executable, '-m', 'gaming_api', '--json'] + list(argv), cwd=str(directory),
+                             env=environment, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert process.stderr == b''
+
+    return process.returncode, json.loads(process.stdout.decode())
+
+
+def test_kill_creature_checks_its_arguments(tmp_path):
+    status, result = _run(tmp_path, 'kill_creature', 'Bob', 'Python#1')
+    assert (status, result['error']) == (1, 'unknown_killer')
+
+    _run(tmp_path, 'create_character', 'Bob', 'elf')
+    status, result = _run(tmp_path, 'kill_creature', 'Bob', 'Python#1')
+    assert (status, result['error']) == (1, 'unknown_creature')
+
+    creature = _run(tmp_path, 'create_creature')[1]['name']
+    money = _run(tmp_path, 'money')[1]['money']
+    status, result = _run(tmp_path, 'kill_creature', 'Bob', creature)
+    assert status == 0 and result['killed'] and result['reward'] > 0
+    assert _run(tmp_path, 'money')[1]['money'] == money + result['reward']
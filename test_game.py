@@ -0,0 +1,52 @@
+"""Checks that games of gaming_game survive being closed by their cache.
+
+Run with: python -m pytest test_game.py"""
+
+
+import gaming_game, gaming_random
+
+
+def _draws(game, n):
+    creatures = [game.create_creature() for index in range(n)]
+    return [(creature.name, creature.strength, creature.life) for creature in creatures]
+
+
+def test_seeded_game_draws_go_on_after_eviction(tmp_path):
+    expected = gaming_game.Game('seeded', root=str(tmp_path / 'expected'), storage='binary',
+                                cache=gaming_game.GameCache())
+    expected.set_rng(gaming_random.GameRandom(7))
+
+    cache = gaming_game.GameCache(capacity=1)
+    game = gaming_game.Game('seeded', root=str(tmp_path), storage='binary', cache=cache)
+    other = gaming_game.Game('other', root=str(tmp_path), storage='binary', cache=cache)
+    game.set_rng(gaming_random.GameRandom(7))
+    rng = game.get_rng()
+
+    draws = _draws(game, 3)
+    other.create_creature()
+    assert game not in cache
+    draws += _draws(game, 3)
+
+    assert cache.nb_evicted >= 1
+    assert game.get_rng() is rng
+    assert draws == _draws(expected, 6)
+
+
+def test_subscriptions_survive_eviction(tmp_path):
+    cache = gaming_game.GameCache(capacity=1)
+    game = gaming_game.Game('followed', root=str(tmp_path), storage='binary', cache=cache)
+    other = gaming_game.Game('other', root=str(tmp_path), storage='binary', cache=cache)
+    records = []
+    callback = game.subscribe(lambda version, record: records.append(record))
+
+    game.set_team_money(10)
+    other.set_team_money(20)
+    assert game not in cache
+    game.set_team_money(30)
+    assert ('set_team_money', 30) in records
+
+    game.unsubscribe(callback)
+    other.set_team_money(40)
+    game.set_team_money(50)
+    assert ('set_team_money', 10) in records
+    assert ('set_team_money', 20) not in records and ('set_team_money', 50) not in records
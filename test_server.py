@@ -0,0 +1,62 @@
+"""Checks that gaming_client plays a game served by gaming_server in another process.
+
+Run with: python -m pytest test_server.py"""
+
+
+import json, os, socket, subprocess, sys
+
+import pytest
+
+import gaming_client, gaming_storage, gaming_tools
+
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def server(tmp_path):
+    if not hasattr(socket, 'AF_UNIX'):
+        pytest.skip('Unix sockets are not available')
+
+    path = str(tmp_path / 'game.db')
+    process = subprocess.Popen([sys.executable, '-m', 'gaming_server', '--socket', str(tmp_path / 'game.sock'),
+                                '--storage', 'binary', '--path', path], cwd=_HERE, stdout=subprocess.PIPE)
+    try:
+        address = json.loads(process.stdout.readline().decode())['address']
+        yield address, path, process
+    finally:
+        if process.poll() is None:
+            process.terminate()
+        process.wait(10)
+        process.stdout.close()
+
+
+def test_round_trip(server):
+    address, path, process = server
+    client = gaming_client.GameClient(address, timeout=10)
+    try:
+        created = client.create_character('Bob', 'elf')
+        assert created.ok and (created.name, created.variety) == ('Bob', 'elf')
+        assert client.create_character('Bob', 'dwarf').error == 'name_taken'
+
+        creature = client.create_creature().name
+        results = client.call_many([('attack', 'Bob', creature), ('character_info', 'Bob'), ('money',)])
+        assert [result.action for result in results] == ['attack', 'character_info', 'money']
+        assert results[0].ok and results[1].ok
+
+        changes = client.changes_since(0)
+        assert ('action', 'create_character', 'Bob', 'elf') in [record for version, record in changes]
+        assert client.changes_since(changes[-1][0]) == []
+
+        with pytest.raises(ValueError):
+            client.call('attack', 'Bob')
+        money = client.money().money
+    finally:
+        client.close()
+
+    # The server writes the game before it stops
+    process.terminate()
+    assert process.wait(10) == 0
+    with gaming_tools.use_session(gaming_tools.GameSession(gaming_storage.open_backend('binary', path))):
+        assert gaming_tools.character_exists('Bob')
+        assert gaming_tools.get_team_money() == money
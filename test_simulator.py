@@ -0,0 +1,72 @@
+"""Checks that gaming_simulator plays the games of gaming_API_gr_16.
+
+Run with: python -m pytest test_simulator.py"""
+
+
+import threading
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import gaming_API_gr_16, gaming_output, gaming_rules, gaming_simulator, gaming_storage, gaming_tools
+
+
+@pytest.mark.parametrize('policy', gaming_simulator.POLICIES)
+@pytest.mark.parametrize('party, seed', [(('dwarf', 'elf', 'healer', 'necromancer'), 0),
+                                         (('dwarf', 'wizard', 'necromancer'), 1)])
+def test_parity(party, policy, seed):
+    gaming_simulator.check_parity(party=party, policy=policy, seed=seed)
+
+
+def test_parity_in_threads():
+    # Replayed games only change the session and sink of their own thread
+    sink = gaming_output.ListSink()
+    errors = []
+
+    created = []
+    started = threading.Barrier(5)
+
+    def check(seed):
+        started.wait()
+        try:
+            for index in range(5):
+                gaming_simulator.check_parity(n=20, seed=seed + index)
+        except Exception as error:
+            errors.append(error)
+
+    def play(checks):
+        session = gaming_tools.GameSession(gaming_storage.MemoryBackend())
+        started.wait()
+        with gaming_tools.use_session(session):
+            # Plays for as long as the replays run
+            while any(check.is_alive() for check in checks):
+                name = 'Hero%d' % len(created)
+                gaming_API_gr_16.create_character(name, 'elf')
+                created.append(name)
+
+    previous = gaming_output.set_sink(sink)
+    try:
+        checks = [threading.Thread(target=check, args=(seed * 5,)) for seed in range(4)]
+        threads = checks + [threading.Thread(target=play, args=(checks,))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert gaming_output.get_sink() is sink
+        assert len(sink.events) == len(created) > 0
+    finally:
+        gaming_output.set_sink(previous)
+
+
+def test_varieties_of_rules():
+    gaming_rules.add_variety('cleric', (5, 15), (5, 15), 'long', 'heal', 3)
+    try:
+        gaming_simulator.check_parity(n=20, party=('cleric', 'dwarf'))
+    finally:
+        del gaming_rules.RULES['cleric']
+
+    with pytest.raises(ValueError):
+        gaming_simulator.run_battles(1, ['cleric'])
@@ -0,0 +1,107 @@
+"""Checks the storage backends as seen by sessions of several processes.
+
+Run with: python -m pytest test_storage.py"""
+
+
+import os, random, subprocess, sys
+
+import pytest
+
+import gaming_storage, gaming_tools
+
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Adds a character to a game from another process
+_ADD_CHARACTER = '''
+import sys
+import gaming_storage, gaming_tools
+session = gaming_tools.GameSession(gaming_storage.open_backend(sys.argv[1], sys.argv[2]))
+with gaming_tools.use_session(session):
+    gaming_tools.add_new_character(sys.argv[3], 'dwarf', 'short', 7, 9)
+session.backend.close()
+'''
+
+
+def _session(storage, path):
+    return gaming_tools.GameSession(gaming_storage.open_backend(storage, str(path)))
+
+
+@pytest.mark.parametrize('storage', sorted([name for name, backend_class in gaming_storage.BACKENDS.items()
+                                            if backend_class.default_path is not None]))
+def test_reload_after_another_process(tmp_path, storage):
+    path = str(tmp_path / gaming_storage.BACKENDS[storage].default_path)
+    session = _session(storage, path)
+
+    with gaming_tools.use_session(session):
+        gaming_tools.add_new_character('a', 'elf', 'long', 10, 10)
+        # Built before the other process writes, so that they must follow it
+        assert gaming_tools.find_characters() == ['a']
+        assert gaming_tools.get_team_stats()['nb_characters'] == 1
+
+        subprocess.check_call([sys.executable, '-c', _ADD_CHARACTER, storage, path, 'b'], cwd=_HERE)
+
+        assert gaming_tools.get_character('b') == ('dwarf', 'short', 7, 9)
+        assert gaming_tools.find_characters() == ['a', 'b']
+        assert gaming_tools.get_team_stats()['total_life'] == 19
+        gaming_tools.add_new_character('c', 'healer', 'long', 1, 1)
+    session.backend.close()
+
+    with gaming_tools.use_session(_session(storage, path)):
+        assert gaming_tools.find_characters() == ['a', 'b', 'c']
+
+
+def test_mmap_reopen_after_replace(tmp_path):
+    path = tmp_path / 'game.db'
+    first, second = _session('mmap', path), _session('mmap', path)
+
+    with gaming_tools.use_session(first):
+        gaming_tools.add_new_character('a', 'elf', 'long', 10, 10)
+    with gaming_tools.use_session(second):
+        gaming_tools.reset_game()
+        gaming_tools.add_new_character('b', 'dwarf', 'short', 10, 10)
+
+    # Same number of entities in the new file: its names must be read anyway
+    with gaming_tools.use_session(first):
+        assert gaming_tools.character_exists('b')
+        assert not gaming_tools.character_exists('a')
+        gaming_tools.add_new_character('c', 'elf', 'long', 5, 5)
+    with gaming_tools.use_session(second):
+        assert sorted(gaming_tools.get_session().get_db()['characters']) == ['b', 'c']
+
+
+def test_mmap_refuses_to_convert_long_names(tmp_path):
+    path = tmp_path / 'game.db'
+    name = 'x' * (gaming_storage.MAPPED_NAME_SIZE + 1)
+    with gaming_tools.use_session(_session('binary', path)):
+        gaming_tools.add_new_character(name, 'elf', 'long', 10, 10)
+
+    with pytest.raises(IOError, match=name):
+        gaming_storage.open_backend('mmap', str(path)).load()
+
+    # The file was left as it was
+    assert name in gaming_storage.open_backend('binary', str(path)).load()['characters']
+
+
+def test_mmap_random_changes_survive_reopening(tmp_path):
+    rng = random.Random(0)
+    path = tmp_path / 'game.db'
+    session = _session('mmap', path)
+    expected = {}
+
+    with gaming_tools.use_session(session):
+        for step in range(500):
+            name = 'c%d' % rng.randrange(40)
+            if name in expected and rng.random() < 0.5:
+                gaming_tools.remove_creature(name)
+                del expected[name]
+            elif name not in expected:
+                gaming_tools.add_creature(name, 'short', 1, step + 1)
+                expected[name] = step + 1
+            if step % 50 == 0:
+                session.backend.close()
+                session.invalidate()
+            assert dict([(name, gaming_tools.get_creature_life(name)) for name in expected]) == expected
+
+    reopened = _session('mmap', path).get_db()['creatures']
+    assert sorted(reopened) == sorted(expected)
@@ -0,0 +1,172 @@
+"""Checks the indexes, aggregates and change feed that gaming_tools keeps up to date.
+
+Run with: python -m pytest test_tools.py"""
+
+
+import random
+
+import pytest
+
+import gaming_feed, gaming_storage, gaming_tools
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _scan(section):
+    # Entities as get_character and get_creature give them, by name
+    names = gaming_tools.get_session().get_db()[section]
+    get = gaming_tools.get_character if section == 'characters' else gaming_tools.get_creature
+
+    return dict([(name, get(name)) for name in names])
+
+
+def _check_characters():
+    characters = _scan('characters')
+    for alive in (None, True, False):
+        for variety in (None,) + gaming_storage.VARIETIES:
+            for reach in (None,) + gaming_storage.REACHES:
+                expected = sorted([name for name, (entity_variety, entity_reach, strength, life) in characters.items()
+                                   if (alive is None or (life > 0) == alive)
+                                   and variety in (None, entity_variety) and reach in (None, entity_reach)])
+                assert gaming_tools.find_characters(alive, variety, reach) == expected
+    assert gaming_tools.find_characters(min_life=5, max_strength=10) == \
+        sorted([name for name, entity in characters.items() if entity[3] >= 5 and entity[2] <= 10])
+
+    for by, field in (('strength', 2), ('life', 3)):
+        pairs = sorted([(entity[field], name) for name, entity in characters.items()])
+        assert gaming_tools.top_characters(5, by, lowest=True) == [name for value, name in pairs[:5]]
+        assert gaming_tools.top_characters(5, by) == [name for value, name in pairs[::-1][:5]]
+        alive = [(value, name) for value, name in pairs if characters[name][3] > 0]
+        assert gaming_tools.top_characters(3, by, alive=True) == [name for value, name in alive[::-1][:3]]
+
+
+def _check_creatures():
+    creatures = _scan('creatures')
+    for alive in (None, True, False):
+        for reach in (None,) + gaming_storage.REACHES:
+            expected = sorted([name for name, (entity_reach, strength, life) in creatures.items()
+                               if (alive is None or (life > 0) == alive) and reach in (None, entity_reach)])
+            assert gaming_tools.find_creatures(alive, reach) == expected
+
+    pairs = sorted([(entity[1], name) for name, entity in creatures.items()])
+    assert gaming_tools.top_creatures(5, 'strength') == [name for value, name in pairs[::-1][:5]]
+
+
+def _check_stats():
+    characters, creatures = _scan('characters'), _scan('creatures')
+    stats = gaming_tools.get_team_stats()
+
+    assert stats['nb_characters'] == len(characters)
+    assert stats['nb_alive_characters'] == len([entity for entity in characters.values() if entity[3] > 0])
+    assert stats['nb_dead_characters'] == len([entity for entity in characters.values() if entity[3] <= 0])
+    assert stats['total_life'] == sum([entity[3] for entity in characters.values()])
+    assert stats['total_strength'] == sum([entity[2] for entity in characters.values()])
+    assert stats['nb_creatures'] == len(creatures)
+    assert stats['total_creature_life'] == sum([entity[2] for entity in creatures.values()])
+    assert stats['team_money'] == gaming_tools.get_team_money()
+    assert stats['nb_defeated'] == gaming_tools.get_nb_defeated()
+
+
+def _modify(rng, step):
+    characters = sorted(gaming_tools.get_session().get_db()['characters'])
+    creatures = sorted(gaming_tools.get_session().get_db()['creatures'])
+    choice = rng.randrange(8)
+
+    if choice == 0 or not characters:
+        gaming_tools.add_new_character('h%s' % step, rng.choice(gaming_storage.VARIETIES),
+                                       rng.choice(gaming_storage.REACHES), rng.randint(1, 20), rng.randint(0, 20))
+    elif choice == 1 or not creatures:
+        gaming_tools.add_creature('c%s' % step, rng.choice(gaming_storage.REACHES), rng.randint(1, 20),
+                                  rng.randint(0, 20))
+    elif choice == 2:
+        gaming_tools.set_character_life(rng.choice(characters), rng.randint(0, 20))
+    elif choice == 3:
+        gaming_tools.set_character_strength(rng.choice(characters), rng.randint(1, 20))
+    elif choice == 4:
+        gaming_tools.set_creature_life(rng.choice(creatures), rng.randint(0, 20))
+    elif choice == 5:
+        gaming_tools.set_creature_strength(rng.choice(creatures), rng.randint(1, 20))
+    elif choice == 6:
+        gaming_tools.remove_creature(rng.choice(creatures))
+    else:
+        gaming_tools.set_team_money(rng.randint(0, 500))
+        gaming_tools.set_nb_defeated(rng.randint(0, 50))
+
+
+@pytest.mark.parametrize('storage', ['memory', 'binary'])
+def test_indexes_and_stats_match_a_scan(tmp_path, storage):
+    rng = random.Random(1)
+    path = str(tmp_path / 'game.db') if storage != 'memory' else None
+    session = gaming_tools.GameSession(gaming_storage.open_backend(storage, path))
+
+    with gaming_tools.use_session(session):
+        # Built before the modifications, so that they are kept up to date rather than rebuilt
+        gaming_tools.find_characters()
+        gaming_tools.get_team_stats()
+
+        for step in range(300):
+            if rng.random() < 0.2:
+                with pytest.raises(_Rollback):
+                    with gaming_tools.batch():
+                        for index in range(rng.randint(1, 5)):
+                            _modify(rng, '%d.%d' % (step, index))
+                        raise _Rollback()
+            else:
+                _modify(rng, step)
+            if step % 10 == 0:
+                _check_characters()
+                _check_creatures()
+                _check_stats()
+
+        _check_characters()
+        _check_creatures()
+        _check_stats()
+
+
+def test_feed_versions_and_callbacks():
+    session = gaming_tools.GameSession(gaming_storage.MemoryBackend())
+    published = []
+
+    with gaming_tools.use_session(session):
+        start = gaming_tools.get_version()
+        callback = gaming_tools.subscribe(lambda version, record: published.append((version, record)))
+
+        gaming_tools.add_new_character('Bob', 'elf', 'long', 10, 10)
+        with gaming_tools.batch():
+            gaming_tools.set_character_life('Bob', 5)
+            # Published when the batch ends
+            assert published == gaming_tools.changes_since(start)[:1]
+            gaming_tools.set_character_strength('Bob', 12)
+        with pytest.raises(_Rollback):
+            with gaming_tools.batch():
+                gaming_tools.set_character_life('Bob', 1)
+                raise _Rollback()
+
+        changes = gaming_tools.changes_since(start)
+        assert [record for version, record in changes] == [('add_new_character', 'Bob', 'elf', 'long', 10, 10),
+                                                           ('set_character_life', 'Bob', 5),
+                                                           ('set_character_strength', 'Bob', 12)]
+        assert [version for version, record in changes] == list(range(start + 1, start + 4))
+        assert gaming_tools.get_version() == start + 3
+        assert published == changes
+        assert gaming_tools.changes_since(start + 2) == changes[2:]
+
+        gaming_tools.unsubscribe(callback)
+        gaming_tools.set_character_life('Bob', 7)
+        assert len(published) == 3
+        with pytest.raises(ValueError):
+            gaming_tools.changes_since(gaming_tools.get_version() + 1)
+
+
+def test_feed_forgets_old_changes():
+    feed = gaming_feed.ChangeFeed(capacity=3)
+    for life in range(5):
+        feed.publish(('set_team_money', life))
+
+    assert feed.changes_since(2) == [(3, ('set_team_money', 2)), (4, ('set_team_money', 3)),
+                                     (5, ('set_team_money', 4))]
+    assert feed.changes_since(5) == []
+    with pytest.raises(ValueError):
+        feed.changes_since(1)
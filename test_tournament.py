@@ -0,0 +1,23 @@
+"""Checks that gaming_tournament plays its games with gaming_API_gr_16 only.
+
+Run with: python -m pytest test_tournament.py"""
+
+
+import json, os, subprocess, sys
+
+import gaming_tournament
+
+
+_WITHOUT_NUMPY = '''
+import json, sys
+sys.modules['numpy'] = None
+import gaming_tournament
+print(json.dumps(gaming_tournament.run_tournament([['dwarf', 'healer']], 20, workers=0)))
+'''
+
+
+def test_tournament_without_numpy():
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.check_output([sys.executable, '-c', _WITHOUT_NUMPY], cwd=here)
+
+    assert json.loads(output.decode()) == gaming_tournament.run_tournament([['dwarf', 'healer']], 20, workers=0)